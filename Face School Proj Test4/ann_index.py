@@ -0,0 +1,173 @@
+import os, zlib
+import numpy as np
+from face_gallery import ExactSearch, squared_distances, top_two_from_squared, empty_top_two
+
+# approximate nearest neighbour search for big galleries (IVF = inverted file / coarse k-means buckets)
+# only the n_probe closest buckets get scanned -> higher n_probe = better recall, slower search
+
+INDEX_FORMAT_VERSION = 1
+ASSIGN_CHUNK_ROWS = 8192
+
+
+def default_index_path(db_file="attendance.db"):
+    # index lives next to the db file: attendance.db -> attendance.ivf.npz
+    return os.path.splitext(os.path.abspath(db_file))[0] + ".ivf.npz"
+
+
+def gallery_fingerprint(encodings):
+    # tells a saved index apart from a gallery that changed since it was built
+    encodings = np.ascontiguousarray(encodings, dtype=np.float32)
+    return np.array([len(encodings), zlib.crc32(encodings)], dtype=np.int64)
+
+
+def _assign_to_nearest(vectors, centroids):
+    # chunked so 100k x 1k distance matrices don't all sit in memory at once
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_CHUNK_ROWS):
+        chunk = vectors[start:start + ASSIGN_CHUNK_ROWS]
+        dists = squared_distances(chunk, centroids, centroid_norms)
+        assignment[start:start + len(chunk)] = np.argmin(dists, axis=1)
+    return assignment
+
+
+def train_kmeans(vectors, n_clusters, iterations, rng):
+    sample_size = min(len(vectors), max(64 * n_clusters, 10_000))
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, n_clusters, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignment = _assign_to_nearest(sample, centroids)
+        counts = np.bincount(assignment, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # empty bucket -> restart it on a random sample point
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(sample_size, len(empty), replace=False)]
+    return centroids
+
+
+class IVFSearch:
+    name = "ivf"
+
+    def __init__(self, n_lists=None, n_probe=16, training_iterations=10, seed=0):
+        self.n_lists_requested, self.n_probe = n_lists, n_probe
+        self.training_iterations, self.seed = training_iterations, seed
+        self.is_built = False
+
+    def build(self, encodings, squared_norms):
+        n = len(encodings)
+        n_lists = self.n_lists_requested or max(1, int(round(2 * np.sqrt(n))))
+        n_lists = max(1, min(n_lists, n))
+        rng = np.random.default_rng(self.seed)
+
+        self.centroids = train_kmeans(encodings, n_lists, self.training_iterations, rng)
+        self.centroid_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        return self._fill_lists(encodings, squared_norms, _assign_to_nearest(encodings, self.centroids))
+
+    def _fill_lists(self, encodings, squared_norms, assignment):
+        # bucket members stored back to back so a probe is a contiguous slice
+        order = np.argsort(assignment, kind="stable")
+        self.list_ids = order.astype(np.int64)
+        self.list_vectors = np.ascontiguousarray(encodings[order])
+        self.list_norms = squared_norms[order]
+        self.list_offsets = np.searchsorted(assignment[order], np.arange(len(self.centroids) + 1))
+        self.fingerprint = gallery_fingerprint(encodings)
+        self.is_built = True
+        return self
+
+    def updated(self, encodings, squared_norms, old_rows):
+        # index for a gallery that changed a little: same centroids (no k-means), rows that were already
+        # here (old_rows >= 0) stay in their bucket, new rows (-1) go to their nearest centroid
+        bucket_of = np.empty(len(self.list_ids), dtype=np.int64)
+        bucket_of[self.list_ids] = np.repeat(np.arange(len(self.centroids)), np.diff(self.list_offsets))
+        assignment = np.empty(len(encodings), dtype=np.int64)
+        kept = old_rows >= 0
+        assignment[kept] = bucket_of[old_rows[kept]]
+        if not kept.all():
+            assignment[~kept] = _assign_to_nearest(encodings[~kept], self.centroids)
+        index = IVFSearch(len(self.centroids), self.n_probe, self.training_iterations, self.seed)
+        index.centroids, index.centroid_norms = self.centroids, self.centroid_norms
+        return index._fill_lists(encodings, squared_norms, assignment)
+
+    def nearest_two(self, queries):
+        indices, distances = empty_top_two(len(queries))
+        if len(queries) == 0:
+            return indices, distances
+
+        n_lists = len(self.centroids)
+        n_probe = max(1, min(self.n_probe, n_lists))
+        centroid_dists = squared_distances(queries, self.centroids, self.centroid_norms)
+        if n_probe < n_lists:
+            probes = np.argpartition(centroid_dists, n_probe - 1, axis=1)[:, :n_probe]
+        else:
+            probes = np.broadcast_to(np.arange(n_lists), (len(queries), n_lists))
+
+        starts, ends = self.list_offsets[:-1], self.list_offsets[1:]
+        for i, lists in enumerate(probes):
+            rows = np.concatenate([np.arange(starts[l], ends[l]) for l in lists])
+            if len(rows) == 0:
+                continue
+            dists = squared_distances(queries[i:i + 1], self.list_vectors[rows], self.list_norms[rows])
+            found, found_dists = top_two_from_squared(dists, self.list_ids[rows])
+            indices[i], distances[i] = found[0], found_dists[0]
+        return indices, distances
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, version=INDEX_FORMAT_VERSION, fingerprint=self.fingerprint, centroids=self.centroids,
+                     list_ids=self.list_ids, list_vectors=self.list_vectors, list_norms=self.list_norms,
+                     list_offsets=self.list_offsets)
+        os.replace(tmp_path, path)  # never leave a half written index behind
+
+    @classmethod
+    def load(cls, path, expected_fingerprint=None, n_probe=16):
+        # returns None when the file is missing, from another version or built for a different gallery
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                if int(data["version"]) != INDEX_FORMAT_VERSION:
+                    return None
+                if expected_fingerprint is not None and not np.array_equal(data["fingerprint"], expected_fingerprint):
+                    return None
+                index = cls(n_lists=len(data["centroids"]), n_probe=n_probe)
+                index.fingerprint = data["fingerprint"]
+                index.centroids = data["centroids"]
+                index.list_ids, index.list_vectors = data["list_ids"], data["list_vectors"]
+                index.list_norms, index.list_offsets = data["list_norms"], data["list_offsets"]
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Couldn't load search index {path}: {e}")
+            return None
+        index.centroid_norms = np.einsum("ij,ij->i", index.centroids, index.centroids)
+        index.is_built = True
+        return index
+
+
+def load_or_build_ivf_index(gallery, index_path, n_probe=16):
+    fingerprint = gallery_fingerprint(gallery.encodings)
+    index = IVFSearch.load(index_path, fingerprint, n_probe=n_probe)
+    if index is None:
+        index = IVFSearch(n_probe=n_probe).build(gallery.encodings, gallery.squared_norms)
+        try:
+            index.save(index_path)
+        except OSError as e:
+            print(f"Couldn't save search index {index_path}: {e}")
+    return index
+
+
+def attach_search_backend(gallery, backend="auto", index_path=None, n_probe=16, min_gallery_size=20_000):
+    # backend: "exact", "ivf", or "auto" (ivf only once the gallery is big enough to need it)
+    if backend == "auto" or len(gallery) == 0:
+        backend = "ivf" if len(gallery) >= max(1, min_gallery_size) else "exact"
+    if backend == "exact":
+        gallery.use_search_backend(ExactSearch())
+    elif backend == "ivf":
+        gallery.use_search_backend(load_or_build_ivf_index(gallery, index_path or default_index_path(), n_probe))
+    else:
+        raise ValueError(f"Unknown gallery search backend: {backend}")
+    return gallery
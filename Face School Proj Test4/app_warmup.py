@@ -0,0 +1,100 @@
+import threading
+from startup_timing import startup_timing
+
+# everything the first attendance click would otherwise wait for, done on a background thread once the
+# main window is up: importing cv2 / dlib / face_recognition, a first inference through the detector and
+# encoder, loading the gallery and opening the camera (the first frames of most webcams are dark while
+# exposure settles, those are read and thrown away here). the gui takes the gallery and camera when it
+# needs them, and opens its own if the warm-up hasn't got there yet
+
+PREOPEN_CAMERA = True  # False leaves the camera (and its light) off until a button is clicked
+CAMERA_INDEX = 0
+CAMERA_WARMUP_FRAMES = 5
+CAMERA_WAIT_SECONDS = 5.0  # how long a click waits for a camera open that's already under way
+
+
+class BackgroundWarmup:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.gallery, self.camera = None, None
+        self.camera_settled = threading.Event()
+        self.camera_settled.set()  # nothing under way yet
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            if PREOPEN_CAMERA:
+                self.camera_settled.clear()
+            self.thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+            self.thread.start()
+        return self
+
+    def _run(self):
+        try:
+            import face_operations as face_op  # the slow part of startup, dlib loads its models here
+            startup_timing.mark("imports")
+            face_op.warm_up_models()
+            startup_timing.mark("models")
+            gallery = face_op.load_recognition_gallery()
+            with self.lock:
+                self.gallery = gallery
+            startup_timing.mark("gallery")
+            if PREOPEN_CAMERA:
+                self._open_camera()
+        except Exception as e:  # warm-up is only a head start, the buttons load what they need themselves
+            print(f"Background warm-up failed: {e}")
+        finally:
+            self.camera_settled.set()
+            import database_ops as db
+            db.close_thread_connections()
+
+    def _open_camera(self):
+        from frame_sources import CameraSource
+        camera = CameraSource(CAMERA_INDEX)
+        if not camera.is_opened():
+            camera.release()
+            return
+        for _ in range(CAMERA_WARMUP_FRAMES):
+            camera.read()
+        with self.lock:
+            if self.camera is not None:
+                self.camera.release()
+            self.camera = camera
+        startup_timing.mark_once("camera")
+
+    def reopen_camera(self):
+        # after a capture window released the camera, have it ready again for the next click
+        if not PREOPEN_CAMERA:
+            return
+        self.camera_settled.clear()
+
+        def open_in_background():
+            try:
+                self._open_camera()
+            finally:
+                self.camera_settled.set()
+
+        threading.Thread(target=open_in_background, name="camera-warmup", daemon=True).start()
+
+    def take_camera(self):
+        # the warmed camera, or None (the caller opens its own). two opens of one webcam fight on windows,
+        # so an open that's under way is waited for
+        self.camera_settled.wait(CAMERA_WAIT_SECONDS)
+        with self.lock:
+            camera, self.camera = self.camera, None
+        return camera
+
+    def take_gallery(self):
+        # the preloaded gallery once, later sessions load a fresh one
+        with self.lock:
+            gallery, self.gallery = self.gallery, None
+        return gallery
+
+    def release(self):
+        with self.lock:
+            if self.camera is not None:
+                self.camera.release()
+                self.camera = None
+
+
+app_warmup = BackgroundWarmup()
@@ -0,0 +1,406 @@
+import argparse, asyncio, base64, hashlib, json, struct, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from urllib.parse import parse_qs, urlsplit
+import database_ops as db
+import attendance_reports as reports
+from recognition_events import recognition_events
+
+# local http / websocket api for other systems (the SIS) instead of them opening attendance.db
+# one asyncio loop on its own thread handles every client, queries run on a few reader threads with
+# read-only connections (WAL, they never block the attendance writer), recognition events are fanned out
+# to websocket clients from the loop, the recognition thread only hands each event over. plain stdlib
+#
+#   GET /students?search=&after=&limit=                  {"students": [...], "next": cursor or null}
+#   GET /attendance?from=&to=&roll_no=&name=&after=&limit= records newest first, same paging
+#   GET /attendance/summary?from=&to=                    days present / school days / percent per student
+#   GET /attendance/daily?from=&to=                      students present per day
+#   GET /attendance/monthly?roll_no=                     one student's days present per month
+#   GET /health                                          counters
+#   GET /events  (websocket)                             live "recognized" / "marked" events as json text
+#
+# recognition_server.py --api-port 8765 or ATTENDANCE_API_PORT in main_app serve it next to recognition,
+# python attendance_api.py --db attendance.db serves the queries alone (no live events without a recognizer)
+
+API_HOST = "127.0.0.1"  # local only, there's no auth
+READER_THREADS = 4
+MAX_PAGE_SIZE = 1000
+CLIENT_EVENT_QUEUE = 256  # events a slow websocket client can fall behind before its oldest are dropped
+MAX_REQUEST_BYTES = 16384  # request line + headers
+MAX_CLIENT_FRAME_BYTES = 4096  # websocket clients only send close / ping
+IDLE_TIMEOUT_SECONDS = 30  # keep-alive connections with nothing going on are closed
+SOCKET_BACKLOG = 1024  # a few hundred clients connecting at once
+RESPONSE_CACHE_SECONDS = 1.0  # identical queries within this share one db read, 0 turns it off
+MAX_CACHED_RESPONSES = 1000
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               500: "Internal Server Error"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_bytes(payload):
+    return json.dumps(payload, separators=(",", ":")).encode()
+
+
+def _http_response(status, body, keep_alive=True, content_type="application/json"):
+    head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode() + body
+
+
+def _parse_head(head):
+    # b"GET /path?x=1 HTTP/1.1\r\nHeader: value\r\n\r\n" -> (method, target, {lowercase header: value})
+    try:
+        lines = head.decode("latin-1").split("\r\n")
+        method, target, _ = lines[0].split(" ")
+    except ValueError:
+        raise ApiError(400, "malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+    return method, target, headers
+
+
+def _ws_frame(payload, opcode=0x1):
+    # server -> client frames are never masked
+    length = len(payload)
+    if length < 126:
+        return bytes((0x80 | opcode, length)) + payload
+    if length < 65536:
+        return bytes((0x80 | opcode, 126)) + struct.pack("!H", length) + payload
+    return bytes((0x80 | opcode, 127)) + struct.pack("!Q", length) + payload
+
+
+def _query_value(query, name):
+    values = query.get(name)
+    return values[-1] if values else None
+
+
+def _query_int(query, name, default=None, low=None, high=None):
+    value = _query_value(query, name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ApiError(400, f"{name} must be a number")
+    if (low is not None and number < low) or (high is not None and number > high):
+        raise ApiError(400, f"{name} must be between {low} and {high}")
+    return number
+
+
+def _query_date(query, name):
+    value = _query_value(query, name)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ApiError(400, f"{name} must be YYYY-MM-DD")
+
+
+def _page_size(query):
+    return _query_int(query, "limit", db.REPORT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+
+
+# route handlers run on the reader threads and return the json body, they may raise ApiError
+
+def _students(query):
+    rows, cursor = db.fetch_student_page(_query_int(query, "after"), _page_size(query), _query_value(query, "search"))
+    return {"students": [{"roll_no": roll_no, "name": name} for roll_no, name in rows], "next": cursor}
+
+
+def _attendance(query):
+    after = _query_value(query, "after")
+    if after is not None:  # "date,record_id" as handed out in "next"
+        try:
+            after_date, record_id = after.split(",")
+            after = (date.fromisoformat(after_date).isoformat(), int(record_id))
+        except ValueError:
+            raise ApiError(400, "after must be a cursor from a previous page")
+    rows, cursor = db.fetch_attendance_report_page(after, _page_size(query), _query_date(query, "from"),
+                                                   _query_date(query, "to"), _query_int(query, "roll_no"),
+                                                   _query_value(query, "name"))
+    return {"records": [dict(zip(reports.RECORD_COLUMNS, row)) for row in rows],
+            "next": f"{cursor[0]},{cursor[1]}" if cursor else None}
+
+
+def _summary(query):
+    rows = reports.student_attendance_summary(_query_date(query, "from"), _query_date(query, "to"))
+    return {"students": [dict(zip(reports.SUMMARY_COLUMNS, row)) for row in rows]}
+
+
+def _daily(query):
+    rows = reports.daily_present_counts(_query_date(query, "from"), _query_date(query, "to"))
+    return {"days": [{"attendance_date": day, "present": present} for day, present in rows]}
+
+
+def _monthly(query):
+    roll_no = _query_int(query, "roll_no")
+    if roll_no is None:
+        raise ApiError(400, "roll_no is required")
+    rows = reports.student_monthly_history(roll_no)
+    return {"roll_no": roll_no, "months": [{"month": month, "days_present": days} for month, days in rows]}
+
+
+ROUTES = {"/students": _students, "/attendance": _attendance, "/attendance/summary": _summary,
+          "/attendance/daily": _daily, "/attendance/monthly": _monthly}
+
+
+def _run_route(handler, query):
+    # on a reader thread: query + json encoding both stay off the loop
+    try:
+        return 200, _json_bytes(handler(query))
+    except ApiError as e:
+        return e.status, _json_bytes({"error": str(e)})
+
+
+class EventClient:
+    def __init__(self):
+        self.queue = asyncio.Queue(CLIENT_EVENT_QUEUE)
+        self.dropped = 0
+
+
+class AttendanceAPI:
+    def __init__(self, port, host=API_HOST, readers=READER_THREADS):
+        self.host, self.port = host, port
+        self.readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="api-reader",
+                                          initializer=db.use_read_only_connections)
+        self.loop, self.server, self.thread = None, None, None
+        self.ready = threading.Event()
+        self.event_clients = set()
+        self.subscribed = False
+        self.responses = {}  # (path, query) -> (expires_at, future), only touched on the loop
+        self.stats_counts = {"connections": 0, "requests": 0, "errors": 0, "cached": 0, "events_published": 0,
+                             "events_dropped": 0}
+
+    def start(self):
+        # returns self once it's listening, None if the port couldn't be opened
+        self.thread = threading.Thread(target=self._run, name="attendance-api", daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        return self if self.server is not None else None
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(asyncio.start_server(
+                self._handle_connection, self.host, self.port, limit=MAX_REQUEST_BYTES, backlog=SOCKET_BACKLOG))
+            self.port = self.server.sockets[0].getsockname()[1]  # the real one when 0 was asked for
+        except OSError as e:
+            print(f"Attendance API couldn't listen on {self.host}:{self.port}: {e}")
+        finally:
+            self.ready.set()
+        if self.server is None:
+            self.loop.close()
+            return
+        try:
+            self.loop.run_forever()
+        finally:
+            self.server.close()
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self._set_subscribed(False)
+            self.loop.close()
+
+    def shutdown(self):
+        if self.loop is not None and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+        self.readers.shutdown(wait=True)
+
+    def stats(self):
+        return {**self.stats_counts, "event_clients": len(self.event_clients)}
+
+    async def _handle_connection(self, reader, writer):
+        self.stats_counts["connections"] += 1
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT_SECONDS)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    writer.write(_http_response(400, _json_bytes({"error": "request too large"}), False))
+                    return
+                try:
+                    method, target, headers = _parse_head(head)
+                except ApiError as e:
+                    writer.write(_http_response(e.status, _json_bytes({"error": str(e)}), False))
+                    return
+                self.stats_counts["requests"] += 1
+                url = urlsplit(target)
+                if method != "GET" or "content-length" in headers or "transfer-encoding" in headers:
+                    self.stats_counts["errors"] += 1
+                    writer.write(_http_response(405, _json_bytes({"error": "read-only api, GET only"}), False))
+                    return
+                if url.path == "/events":
+                    await self._serve_events(reader, writer, headers)
+                    return
+                status, body = await self._respond(url.path, parse_qs(url.query))
+                if status != 200:
+                    self.stats_counts["errors"] += 1
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(_http_response(status, body, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.CancelledError):
+            pass  # cancelled = shutting down, the task just ends (a re-raise is logged as an error by asyncio)
+        finally:
+            writer.close()
+
+    async def _respond(self, path, query):
+        if path == "/health":
+            return 200, _json_bytes({"ok": True, **self.stats()})
+        handler = ROUTES.get(path.rstrip("/") or "/")
+        if handler is None:
+            return 404, _json_bytes({"error": f"no such endpoint {path}", "endpoints": sorted(ROUTES) + ["/events"]})
+        try:
+            return await self._cached(path, query, handler)
+        except Exception as e:
+            print(f"Attendance API error on {path}: {e}")
+            return 500, _json_bytes({"error": "internal error"})
+
+    def _cached(self, path, query, handler):
+        # a few hundred clients polling the same thing cost one query a second, the ones that arrive while
+        # it's running wait for that one instead of starting their own
+        now = time.monotonic()
+        key = (path, tuple(sorted((name, tuple(values)) for name, values in query.items())))
+        cached = self.responses.get(key)
+        if cached is not None and cached[0] > now:
+            self.stats_counts["cached"] += 1
+            return asyncio.shield(cached[1])
+        if len(self.responses) >= MAX_CACHED_RESPONSES:
+            self.responses = {k: v for k, v in self.responses.items() if v[0] > now}
+        response = self.loop.run_in_executor(self.readers, _run_route, handler, query)
+        if RESPONSE_CACHE_SECONDS > 0:
+            self.responses[key] = (now + RESPONSE_CACHE_SECONDS, response)
+        return response
+
+    async def _serve_events(self, reader, writer, headers):
+        key = headers.get("sec-websocket-key")
+        if headers.get("upgrade", "").lower() != "websocket" or not key:
+            writer.write(_http_response(400, _json_bytes({"error": "/events is a websocket"}), False))
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        client = EventClient()
+        self.event_clients.add(client)
+        self._set_subscribed(True)
+        sender = asyncio.ensure_future(self._send_events(client, writer))
+        try:
+            await self._read_client_frames(reader, writer)
+        finally:
+            self.event_clients.discard(client)
+            self.stats_counts["events_dropped"] += client.dropped
+            if not self.event_clients:
+                self._set_subscribed(False)
+            sender.cancel()
+
+    async def _send_events(self, client, writer):
+        try:
+            while True:
+                frames = [await client.queue.get()]
+                while not client.queue.empty():  # whatever piled up goes out in one write
+                    frames.append(client.queue.get_nowait())
+                writer.write(b"".join(frames))
+                await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def _read_client_frames(self, reader, writer):
+        # until the client closes or goes away. pings are answered, anything else from the client is ignored
+        try:
+            while True:
+                head = await reader.readexactly(2)
+                opcode, length = head[0] & 0x0F, head[1] & 0x7F
+                if length == 126:
+                    length = struct.unpack("!H", await reader.readexactly(2))[0]
+                elif length == 127:
+                    length = struct.unpack("!Q", await reader.readexactly(8))[0]
+                if length > MAX_CLIENT_FRAME_BYTES:
+                    return
+                mask = await reader.readexactly(4) if head[1] & 0x80 else None
+                payload = await reader.readexactly(length)
+                if mask:
+                    payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+                if opcode == 0x8:
+                    writer.write(_ws_frame(payload[:2], 0x8))
+                    return
+                if opcode == 0x9:
+                    writer.write(_ws_frame(payload, 0xA))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+
+    def _set_subscribed(self, subscribed):
+        # only listen to the recognizer while somebody is connected to /events
+        if subscribed != self.subscribed:
+            self.subscribed = subscribed
+            if subscribed:
+                recognition_events.subscribe(self._on_event)
+            else:
+                recognition_events.unsubscribe(self._on_event)
+
+    def _on_event(self, event):
+        # recognition thread: hand over and return
+        try:
+            self.loop.call_soon_threadsafe(self._fan_out, event)
+        except RuntimeError:
+            pass  # loop already closed, shutting down
+
+    def _fan_out(self, event):
+        # encoded once, the same frame bytes go to every client
+        self.stats_counts["events_published"] += 1
+        frame = _ws_frame(_json_bytes(event))
+        for client in self.event_clients:
+            if client.queue.full():
+                client.queue.get_nowait()  # slow client, it loses its oldest event instead of holding us up
+                client.dropped += 1
+            client.queue.put_nowait(frame)
+
+
+def serve_attendance_api(port, host=API_HOST, readers=READER_THREADS):
+    # like pipeline_metrics.serve_metrics: runs in the background, call shutdown() on what comes back
+    return AttendanceAPI(port, host, readers).start()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Local attendance query / event API.")
+    parser.add_argument("--db", default=db.DB_FILE)
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--readers", type=int, default=READER_THREADS, help="threads running db queries")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    db.DB_FILE = args.db
+    api = serve_attendance_api(args.port, args.host, args.readers)
+    if api is None:
+        sys.exit(1)
+    print(f"Attendance API on http://{args.host}:{api.port} (queries only, events come from a running recognizer)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.shutdown()
+
+
+if __name__ == "__main__":
+    main()
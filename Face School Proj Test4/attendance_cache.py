@@ -0,0 +1,57 @@
+import threading
+from datetime import datetime
+import database_ops as db
+
+# who's already marked today, in memory so a student standing at a gate costs a set lookup per frame
+# instead of a db round trip. filled from attendance_records the first time it's used (so a restart
+# mid-day doesn't re-send everyone) and again when the date changes. one instance per process is shared
+# by every recognition session / camera
+
+
+class MarkedTodayCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.attendance_date, self.db_file = None, None
+        self.roll_nos = set()
+
+    def _load(self, attendance_date):
+        # caller holds the lock
+        marked = db.fetch_roll_nos_marked_on(attendance_date)
+        # db trouble -> start empty, the unique (roll_no, date) index still keeps the table right
+        self.roll_nos = marked if marked is not None else set()
+        self.attendance_date, self.db_file = attendance_date, db.DB_FILE
+
+    def warm(self, when=None):
+        # load the day up front, at startup, so the first sightings don't wait on the db
+        attendance_date = (when or datetime.now()).strftime("%Y-%m-%d")
+        with self.lock:
+            if attendance_date != self.attendance_date or db.DB_FILE != self.db_file:
+                self._load(attendance_date)
+        return len(self.roll_nos)
+
+    def mark(self, roll_no, when=None):
+        # True the first time roll_no is seen on when's date, the caller then writes the record
+        attendance_date = (when or datetime.now()).strftime("%Y-%m-%d")
+        with self.lock:
+            if attendance_date != self.attendance_date or db.DB_FILE != self.db_file:
+                self._load(attendance_date)  # midnight rollover, or pointed at another db
+            if roll_no in self.roll_nos:
+                return False
+            self.roll_nos.add(roll_no)
+            return True
+
+    def forget(self, roll_no, attendance_date):
+        # the write for roll_no never made it to the db, let the next sighting try again
+        with self.lock:
+            if attendance_date == self.attendance_date:
+                self.roll_nos.discard(roll_no)
+
+    def __contains__(self, roll_no):
+        with self.lock:
+            return self.attendance_date == datetime.now().strftime("%Y-%m-%d") and roll_no in self.roll_nos
+
+    def __len__(self):
+        return len(self.roll_nos)
+
+
+marked_today = MarkedTodayCache()
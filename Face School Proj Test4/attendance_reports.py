@@ -0,0 +1,151 @@
+import argparse, csv, json, sys, time
+import database_ops as db
+
+# attendance questions answered from the summary tables (attendance_daily / attendance_monthly, kept up
+# to date by triggers as attendance is logged) instead of scanning attendance_records, and exports that
+# stream rows a page at a time so memory stays flat however many years are in the db
+#
+#   python attendance_reports.py summary --from 2025-04-01 --to 2025-09-30 --out term1.csv
+#   python attendance_reports.py daily --from 2025-04-01
+#   python attendance_reports.py export attendance_2025.parquet --from 2025-01-01 --to 2025-12-31
+
+EXPORT_PAGE_ROWS = 5000  # rows per keyset page while streaming the raw records out
+PARQUET_BATCH_ROWS = 50000  # rows per parquet row group, what's held in memory at once
+
+RECORD_COLUMNS = ["roll_no", "name", "attendance_date", "attendance_time"]
+SUMMARY_COLUMNS = ["roll_no", "name", "days_present", "school_days", "percent"]
+
+
+def student_attendance_summary(date_from=None, date_to=None):
+    # one row per enrolled student: days present, school days (days anybody was present) and percent
+    days_present = db.fetch_days_present_per_student(date_from, date_to)
+    daily = db.fetch_daily_present_counts(date_from, date_to)
+    if days_present is None or daily is None:
+        return []
+    school_days, summary, cursor = len(daily), [], None
+    while True:  # names a page at a time, never the encodings
+        students, cursor = db.fetch_student_page(cursor, page_size=EXPORT_PAGE_ROWS)
+        for roll_no, name in students:
+            days = days_present.get(roll_no, 0)
+            summary.append((roll_no, name, days, school_days,
+                            round(100.0 * days / school_days, 1) if school_days else 0.0))
+        if cursor is None:
+            return summary
+
+
+def daily_present_counts(date_from=None, date_to=None):
+    return db.fetch_daily_present_counts(date_from, date_to) or []
+
+
+def student_monthly_history(roll_no):
+    return db.fetch_monthly_attendance(roll_no) or []
+
+
+def iter_attendance_records(date_from=None, date_to=None, roll_no=None):
+    # raw records, newest first, a keyset page at a time
+    return db.iter_attendance_report(EXPORT_PAGE_ROWS, date_from=date_from, date_to=date_to, roll_no=roll_no)
+
+
+def _write_csv(path, columns, rows):
+    written = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            written += 1
+    return written
+
+
+def _write_parquet(path, columns, rows):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export needs pyarrow (pip install pyarrow), or export to .csv instead")
+    written, batch, writer = 0, [], None
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= PARQUET_BATCH_ROWS:
+                writer = _write_parquet_batch(pa, pq, writer, path, columns, batch)
+                written, batch = written + len(batch), []
+        if batch or writer is None:
+            writer = _write_parquet_batch(pa, pq, writer, path, columns, batch)
+            written += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return written
+
+
+def _write_parquet_batch(pa, pq, writer, path, columns, batch):
+    table = pa.Table.from_pydict({name: [row[i] for row in batch] for i, name in enumerate(columns)})
+    if writer is None:
+        writer = pq.ParquetWriter(path, table.schema)
+    writer.write_table(table)
+    return writer
+
+
+def export_rows(path, columns, rows):
+    # .parquet -> parquet (pyarrow), anything else -> csv. rows can be any iterator, it's consumed once
+    # returns the number of rows written
+    if path.lower().endswith(".parquet"):
+        return _write_parquet(path, columns, rows)
+    return _write_csv(path, columns, rows)
+
+
+def export_attendance_records(path, date_from=None, date_to=None, roll_no=None):
+    return export_rows(path, RECORD_COLUMNS, iter_attendance_records(date_from, date_to, roll_no))
+
+
+def export_student_summary(path, date_from=None, date_to=None):
+    return export_rows(path, SUMMARY_COLUMNS, student_attendance_summary(date_from, date_to))
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Attendance summaries and exports.")
+    parser.add_argument("report", choices=["summary", "daily", "student", "export"])
+    parser.add_argument("out", nargs="?", help="export file (.csv or .parquet), summary/daily print if left out")
+    parser.add_argument("--db", default=db.DB_FILE)
+    parser.add_argument("--from", dest="date_from", help="YYYY-MM-DD")
+    parser.add_argument("--to", dest="date_to", help="YYYY-MM-DD")
+    parser.add_argument("--roll-no", type=int, help="student for 'student', filter for 'export'")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    db.DB_FILE = args.db
+    db.setup_database_tables_if_needed()  # older dbs get their summary tables filled here, once
+    start = time.perf_counter()
+    if args.report == "export":
+        if not args.out:
+            sys.exit("export needs an output file")
+        try:
+            written = export_attendance_records(args.out, args.date_from, args.date_to, args.roll_no)
+        except ImportError as e:
+            sys.exit(str(e))
+    else:
+        if args.report == "summary":
+            columns, rows = SUMMARY_COLUMNS, student_attendance_summary(args.date_from, args.date_to)
+        elif args.report == "daily":
+            columns, rows = ["attendance_date", "present"], daily_present_counts(args.date_from, args.date_to)
+        else:
+            if args.roll_no is None:
+                sys.exit("student needs --roll-no")
+            columns, rows = ["month", "days_present"], student_monthly_history(args.roll_no)
+        if args.out:
+            try:
+                written = export_rows(args.out, columns, rows)
+            except ImportError as e:
+                sys.exit(str(e))
+        else:
+            for row in rows:
+                print(json.dumps(dict(zip(columns, row))))
+            written = len(rows)
+    print(f"{written} rows in {(time.perf_counter() - start) * 1000:.0f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import queue, threading, time
+import database_ops as db
+from pipeline_metrics import recognition_metrics
+from attendance_cache import marked_today
+
+# write-behind queue for attendance, the recognizer pushes and moves on to the next frame
+# a writer thread flushes whatever piled up in one transaction (INSERT .. ON CONFLICT DO NOTHING)
+
+MAX_BATCH_SIZE = 256
+FLUSH_INTERVAL_SECONDS = 0.2
+RETRY_DELAY_SECONDS = 0.5
+MAX_FLUSH_ATTEMPTS = 5
+
+_STOP = object()
+
+
+class AttendanceWriteQueue:
+    def __init__(self, max_batch_size=MAX_BATCH_SIZE, flush_interval=FLUSH_INTERVAL_SECONDS, marked_cache=None):
+        self.max_batch_size, self.flush_interval = max_batch_size, flush_interval
+        self.marked_cache = marked_cache or marked_today  # told about rows that never reached the db
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {"pushed": 0, "written": 0, "already_marked": 0, "dropped": 0, "batches": 0,
+                       "last_flush_ms": 0.0, "max_flush_ms": 0.0, "total_flush_ms": 0.0}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="attendance-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def push(self, roll_no, when=None):
+        # timestamp is taken now, not whenever the writer gets to it
+        self._queue.put(db.attendance_row_for(roll_no, when))
+        with self._stats_lock:
+            self._stats["pushed"] += 1
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self.depth()
+        stats["avg_flush_ms"] = stats["total_flush_ms"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+    def stop(self, timeout=None):
+        # everything pushed before stop() is written before this returns
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _next_batch(self):
+        # blocks for the first row, then takes whatever else is already waiting
+        batch, stopping = [], False
+        try:
+            item = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return batch, stopping
+        while True:
+            if item is _STOP:
+                stopping = True
+            else:
+                batch.append(item)
+            if stopping or len(batch) >= self.max_batch_size:
+                return batch, stopping
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return batch, stopping
+
+    def _flush(self, batch):
+        for attempt in range(MAX_FLUSH_ATTEMPTS):
+            start = time.perf_counter()
+            written = db.log_attendance_batch(batch)
+            flush_ms = (time.perf_counter() - start) * 1000
+            if written is not None:
+                recognition_metrics.observe("db_write", flush_ms)
+                recognition_metrics.count("attendance_written", written)
+                with self._stats_lock:
+                    self._stats["written"] += written
+                    self._stats["already_marked"] += len(batch) - written
+                    self._stats["batches"] += 1
+                    self._stats["last_flush_ms"] = flush_ms
+                    self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], flush_ms)
+                    self._stats["total_flush_ms"] += flush_ms
+                return
+            time.sleep(RETRY_DELAY_SECONDS * (attempt + 1))
+        print(f"Gave up writing {len(batch)} attendance records.")
+        for roll_no, attendance_date, _ in batch:
+            self.marked_cache.forget(roll_no, attendance_date)
+        with self._stats_lock:
+            self._stats["dropped"] += len(batch)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if batch:
+                self._flush(batch)
+        db.close_thread_connections()
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+import cv2
+import dlib
+import numpy as np
+from face_recognition import api as face_api
+
+# encodes every face of a frame (or of several frames) in one dlib call
+# face_recognition.face_encodings runs landmarks + the resnet once per face from python. here landmarks
+# are found per face (cheap), the aligned 150x150 chips are cut out, and all chips go through
+# compute_face_descriptor together. same models, same 5 point alignment and padding as face_encodings
+# chips are kept per track: when a track is due for a re-check and its new chip looks the same as the
+# one it was encoded from, the old encoding is reused and the resnet is skipped
+
+CHIP_SIZE, CHIP_PADDING = 150, 0.25  # what face_recognition / dlib use for the encoder
+CHIP_REUSE_THRESHOLD = 6.0  # mean abs gray difference of 32x32 chip thumbnails, 0-255
+MAX_CACHED_CHIPS = 512
+
+
+def _rect_for(box):
+    top, right, bottom, left = box
+    return dlib.rectangle(int(left), int(top), int(right), int(bottom))
+
+
+def _chip_thumbnail(chip):
+    return cv2.resize(cv2.cvtColor(chip, cv2.COLOR_RGB2GRAY), (32, 32), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+class BatchFaceEncoder:
+    def __init__(self, reuse_threshold=CHIP_REUSE_THRESHOLD):
+        self.reuse_threshold = reuse_threshold
+        self.cached = OrderedDict()  # key -> (chip thumbnail, encoding)
+        self.chips_encoded = self.chips_reused = self.batches = 0
+
+    def face_chips(self, rgb_image, boxes):
+        if not boxes:
+            return []
+        shapes = dlib.full_object_detections()
+        for box in boxes:
+            shapes.append(face_api.pose_predictor_5_point(rgb_image, _rect_for(box)))
+        return dlib.get_face_chips(rgb_image, shapes, size=CHIP_SIZE, padding=CHIP_PADDING)
+
+    def encode_chips(self, chips):
+        if not chips:
+            return np.empty((0, 128))
+        self.batches += 1
+        self.chips_encoded += len(chips)
+        return np.array(face_api.face_encoder.compute_face_descriptor(chips))
+
+    def encode_many(self, frames):
+        # frames: [(rgb image, boxes, keys or None), ...] -> one encoding array per frame
+        # keys (e.g. track ids) turn on chip reuse for those faces
+        chips_per_frame = [self.face_chips(rgb_image, boxes) for rgb_image, boxes, _ in frames]
+        encodings = [np.empty((len(chips), 128)) for chips in chips_per_frame]
+        to_encode, thumbnails = [], {}
+        for f, ((_, _, keys), chips) in enumerate(zip(frames, chips_per_frame)):
+            for i, chip in enumerate(chips):
+                key = keys[i] if keys is not None else None
+                if key is not None:
+                    thumbnail = thumbnails[f, i] = _chip_thumbnail(chip)
+                    cached = self.cached.get(key)
+                    if cached is not None and np.mean(np.abs(thumbnail - cached[0])) < self.reuse_threshold:
+                        encodings[f][i] = cached[1]
+                        self.chips_reused += 1
+                        continue
+                to_encode.append((f, i))
+
+        # the one resnet call for everything that wasn't reused
+        computed = self.encode_chips([chips_per_frame[f][i] for f, i in to_encode])
+        for (f, i), encoding in zip(to_encode, computed):
+            encodings[f][i] = encoding
+            keys = frames[f][2]
+            if keys is not None and keys[i] is not None:
+                self.cached[keys[i]] = (thumbnails[f, i], encoding)
+                self.cached.move_to_end(keys[i])
+        while len(self.cached) > MAX_CACHED_CHIPS:
+            self.cached.popitem(last=False)
+        return encodings
+
+    def encode(self, rgb_image, boxes, keys=None):
+        # all faces of one frame -> (n, 128) array, in box order
+        return self.encode_many([(rgb_image, boxes, keys)])[0]
+
+    def stats(self):
+        return {"chips_encoded": self.chips_encoded, "chips_reused": self.chips_reused, "batches": self.batches,
+                "faces_per_batch": round(self.chips_encoded / self.batches, 2) if self.batches else 0.0}
@@ -0,0 +1,76 @@
+import os, sys, tempfile, time
+import numpy as np
+from face_gallery import FaceGallery, ENCODING_SIZE, DEFAULT_TOLERANCE
+from ann_index import IVFSearch, load_or_build_ivf_index
+
+# recall vs exact search for the IVF backend, and whether the 0.6 tolerance decision changes
+# usage: python bench_ann_index.py [gallery_size]
+
+N_PROBES = [1, 2, 4, 8, 16, 32]
+N_QUERIES = 2000
+FACES_PER_FRAME = 5
+
+
+def make_queries(known, rng):
+    # half are enrolled students seen again (small noise), half are strangers
+    half = N_QUERIES // 2
+    members = known[rng.choice(len(known), half, replace=False)]
+    members = members + rng.normal(0.0, 0.025, size=members.shape)
+    strangers = rng.normal(0.0, 0.09, size=(N_QUERIES - half, ENCODING_SIZE))
+    return np.vstack([members, strangers]).astype(np.float32)
+
+
+def in_frames(queries):
+    return [queries[i:i + FACES_PER_FRAME] for i in range(0, len(queries), FACES_PER_FRAME)]
+
+
+def nearest(gallery, queries):
+    return np.concatenate([gallery.nearest_two(frame)[0][:, 0] for frame in in_frames(queries)])
+
+
+def decisions(gallery, queries):
+    matches = [m for frame in in_frames(queries) for m in gallery.match_faces(frame, DEFAULT_TOLERANCE)]
+    return np.array([m.index if m.index is not None else -1 for m in matches])
+
+
+def per_frame_ms(gallery, queries):
+    frames = in_frames(queries)
+    start = time.perf_counter()
+    for frame in frames:
+        gallery.match_faces(frame)
+    return (time.perf_counter() - start) / len(frames) * 1000
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = np.random.default_rng(1)
+    known = rng.normal(0.0, 0.09, size=(size, ENCODING_SIZE)).astype(np.float32)
+    gallery = FaceGallery(known, [{"roll_no": i, "name": str(i)} for i in range(size)])
+    queries = make_queries(known, rng)
+
+    members = slice(0, N_QUERIES // 2)
+    exact_idx = nearest(gallery, queries)
+    exact_decisions = decisions(gallery, queries)
+    exact_ms = per_frame_ms(gallery, queries)
+
+    index_path = os.path.join(tempfile.mkdtemp(), "bench.ivf.npz")
+    start = time.perf_counter()
+    index = load_or_build_ivf_index(gallery, index_path)
+    build_s = time.perf_counter() - start
+    start = time.perf_counter()
+    IVFSearch.load(index_path)
+    load_s = time.perf_counter() - start
+
+    print(f"gallery: {size}, lists: {len(index.centroids)}, build: {build_s:.2f}s, load from disk: {load_s:.3f}s")
+    print(f"exact: {exact_ms:.3f} ms/frame ({FACES_PER_FRAME} faces)")
+    print(f"{'n_probe':>7} | {'ms/frame':>8} | {'member recall@1':>15} | {'same 0.6 decision':>17}")
+    gallery.use_search_backend(index)
+    for n_probe in N_PROBES:
+        index.n_probe = n_probe
+        recall = np.mean(nearest(gallery, queries)[members] == exact_idx[members])
+        agreement = np.mean(decisions(gallery, queries) == exact_decisions)
+        print(f"{n_probe:>7} | {per_frame_ms(gallery, queries):>8.3f} | {recall:>15.4f} | {agreement:>17.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import asyncio, base64, json, multiprocessing, os, random, sqlite3, sys, tempfile, time
+from datetime import datetime, timedelta
+import cv2
+import numpy as np
+import database_ops as db
+from attendance_api import serve_attendance_api
+from attendance_writer import AttendanceWriteQueue
+from face_gallery import FaceMatch
+from recognition_events import recognition_events
+
+# load test for attendance_api, all on localhost: a stand-in recognition loop (resize + gallery distances
+# per frame, publishing events and logging attendance like the real one) runs next to the api, first alone
+# and then while hundreds of websocket + http clients (in another process, so they don't share our GIL)
+# hammer it. prints the loop's fps and frame time both ways, request latency, event lag and writer flushes
+#
+#   python bench_attendance_api.py [ws_clients] [http_clients] [seconds]     (defaults: 200 100 10)
+#   python bench_attendance_api.py 200 100 10 --url 127.0.0.1:8765           clients only, against a running api
+
+N_STUDENTS, N_DAYS = 1000, 120
+LOOP_FPS = 25  # the stand-in recognition loop's pace, like a camera
+FACES_PER_FRAME = 3
+HTTP_CLIENT_RATE = 10  # requests/s per http client (a polling integration), 0 = back to back as fast as it goes
+HTTP_PATHS = ["/students?limit=100", "/attendance?limit=200", "/attendance/daily", "/attendance/monthly?roll_no=7",
+              "/attendance/summary?from=2024-01-15&to=2024-04-10", "/health"]
+
+
+def build_db(path):
+    db.DB_FILE = path
+    db.setup_database_tables_if_needed()
+    db.close_thread_connections()
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO students(roll_no, name, face_encoding) VALUES (?, ?, ?)",
+                     ((i, f"Student {i}", b"") for i in range(N_STUDENTS)))
+    rng, start = random.Random(0), datetime(2024, 1, 1)
+    for day in range(N_DAYS):
+        attendance_date = (start + timedelta(days=day)).strftime("%Y-%m-%d")
+        conn.executemany(db.INSERT_ATTENDANCE_SQL, [(i, attendance_date, "08:30:00") for i in range(N_STUDENTS)
+                                                    if rng.random() < 0.9])
+    conn.commit()
+    conn.close()
+
+
+def recognition_loop(seconds, first_day):
+    # stand-in for the attendance loop: a frame every 1/LOOP_FPS, some work on it, events + a db write
+    rng = np.random.default_rng(0)
+    gallery = rng.standard_normal((N_STUDENTS, 128)).astype(np.float32)
+    frame = rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    writer = AttendanceWriteQueue().start()
+    frame_ms, frames = [], 0
+    started = next_frame_at = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        work_started = time.perf_counter()
+        small = cv2.cvtColor(cv2.resize(frame, (0, 0), fx=0.25, fy=0.25), cv2.COLOR_BGR2RGB)
+        small = cv2.GaussianBlur(small, (5, 5), 0)
+        faces = gallery[rng.integers(0, N_STUDENTS, FACES_PER_FRAME)] + 0.01
+        distances = np.linalg.norm(gallery[None, :, :] - faces[:, None, :], axis=2)
+        matches = [FaceMatch(int(i), int(i), f"Student {i}", float(d[i]), 0.2)
+                   for i, d in zip(distances.argmin(axis=1), distances)]
+        marked = [matches[0].roll_no]  # one "first sighting" a frame, every one a real insert
+        writer.push(matches[0].roll_no, first_day + timedelta(days=frames))
+        recognition_events.matches_seen("bench", matches, marked)
+        frame_ms.append((time.perf_counter() - work_started) * 1000)
+        frames += 1
+        next_frame_at += 1.0 / LOOP_FPS
+        time.sleep(max(0.0, next_frame_at - time.perf_counter()))
+    elapsed = time.perf_counter() - started
+    writer.stop()
+    stats = writer.stats()
+    db.close_thread_connections()
+    return {"fps": frames / elapsed, "frame_p50_ms": float(np.percentile(frame_ms, 50)),
+            "frame_p99_ms": float(np.percentile(frame_ms, 99)), "flush_avg_ms": stats["avg_flush_ms"],
+            "flush_max_ms": stats["max_flush_ms"], "written": stats["written"]}
+
+
+async def http_client(host, port, seconds, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    deadline, i = time.perf_counter() + seconds, random.randrange(len(HTTP_PATHS))
+    next_request_at = time.perf_counter() + random.random() / max(HTTP_CLIENT_RATE, 1)  # spread the clients out
+    try:
+        while time.perf_counter() < deadline:
+            if HTTP_CLIENT_RATE:
+                await asyncio.sleep(max(0.0, next_request_at - time.perf_counter()))
+                next_request_at += 1.0 / HTTP_CLIENT_RATE
+            path = HTTP_PATHS[i % len(HTTP_PATHS)]
+            i += 1
+            sent = time.perf_counter()
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+            head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+            length = int(head.lower().split("content-length:")[1].split("\r\n")[0])
+            await reader.readexactly(length)
+            latencies.append((time.perf_counter() - sent) * 1000)
+            if not head.startswith("HTTP/1.1 200"):
+                errors.append(head.split("\r\n")[0])
+    finally:
+        writer.close()
+
+
+async def event_client(host, port, seconds, lags, counts):
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(os.urandom(16)).decode()
+    writer.write((f"GET /events HTTP/1.1\r\nHost: {host}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                  f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode())
+    await reader.readuntil(b"\r\n\r\n")
+    received, deadline = 0, time.perf_counter() + seconds
+    try:
+        while True:
+            head = await asyncio.wait_for(reader.readexactly(2), max(0.01, deadline - time.perf_counter()))
+            length = head[1] & 0x7F
+            if length == 126:
+                length = int.from_bytes(await reader.readexactly(2), "big")
+            elif length == 127:
+                length = int.from_bytes(await reader.readexactly(8), "big")
+            event = json.loads(await reader.readexactly(length))
+            received += 1
+            if received % 10 == 0:  # a sample is enough, parsing every timestamp would slow the client
+                lags.append((datetime.now() - datetime.fromisoformat(event["at"])).total_seconds() * 1000)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        counts.append(received)
+        writer.close()
+
+
+def run_clients(host, port, ws_clients, http_clients, seconds, results):
+    # in its own process
+    async def run():
+        latencies, errors, lags, counts = [], [], [], []
+        tasks = [event_client(host, port, seconds, lags, counts) for _ in range(ws_clients)]
+        tasks += [http_client(host, port, seconds, latencies, errors) for _ in range(http_clients)]
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+        failed = [repr(o) for o in outcomes if isinstance(o, Exception)]
+        return {"requests": len(latencies), "errors": len(errors) + len(failed), "first_error": (errors + failed)[:1],
+                "latency_p50_ms": float(np.percentile(latencies, 50)) if latencies else 0.0,
+                "latency_p99_ms": float(np.percentile(latencies, 99)) if latencies else 0.0,
+                "events_per_client": float(np.mean(counts)) if counts else 0.0,
+                "event_lag_p50_ms": float(np.percentile(lags, 50)) if lags else 0.0,
+                "event_lag_p99_ms": float(np.percentile(lags, 99)) if lags else 0.0}
+    results.put(asyncio.run(run()))
+
+
+def start_clients(host, port, ws_clients, http_clients, seconds):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=run_clients, args=(host, port, ws_clients, http_clients, seconds, results))
+    process.start()
+    return process, results
+
+
+def print_clients(stats, seconds):
+    print(f"  http: {stats['requests'] / seconds:,.0f} req/s, p50 {stats['latency_p50_ms']:.1f} ms, "
+          f"p99 {stats['latency_p99_ms']:.1f} ms, {stats['errors']} errors {stats['first_error'] or ''}")
+    print(f"  events: {stats['events_per_client']:.0f} per client, lag p50 {stats['event_lag_p50_ms']:.1f} ms, "
+          f"p99 {stats['event_lag_p99_ms']:.1f} ms")
+
+
+def print_loop(label, stats):
+    print(f"  {label:>8}: {stats['fps']:5.1f} fps, frame p50 {stats['frame_p50_ms']:.2f} ms, "
+          f"p99 {stats['frame_p99_ms']:.2f} ms, writer flush avg {stats['flush_avg_ms']:.2f} ms "
+          f"max {stats['flush_max_ms']:.1f} ms ({stats['written']} rows)")
+
+
+def main():
+    positional = [a for a in sys.argv[1:] if not a.startswith("--")]
+    ws_clients = int(positional[0]) if len(positional) > 0 else 200
+    http_clients = int(positional[1]) if len(positional) > 1 else 100
+    seconds = float(positional[2]) if len(positional) > 2 else 10.0
+    if "--url" in sys.argv:
+        host, port = sys.argv[sys.argv.index("--url") + 1].rsplit(":", 1)
+        process, results = start_clients(host, int(port), ws_clients, http_clients, seconds)
+        stats = results.get()
+        process.join()
+        print(f"{ws_clients} websocket + {http_clients} http clients against {host}:{port} for {seconds:.0f} s")
+        print_clients(stats, seconds)
+        return
+
+    folder = tempfile.mkdtemp()
+    build_db(os.path.join(folder, "attendance.db"))
+    api = serve_attendance_api(0)
+    print(f"{N_STUDENTS} students, {N_DAYS} days of attendance, api on 127.0.0.1:{api.port}")
+    print(f"recognition loop at {LOOP_FPS} fps target:")
+    print_loop("alone", recognition_loop(seconds, datetime(2030, 1, 1)))
+    process, results = start_clients("127.0.0.1", api.port, ws_clients, http_clients, seconds + 1)
+    time.sleep(1.0)  # clients connected before the loop starts counting
+    loaded = recognition_loop(seconds, datetime(2060, 1, 1))
+    stats = results.get()
+    process.join()
+    print_loop("loaded", loaded)
+    print(f"{ws_clients} websocket + {http_clients} http clients:")
+    print_clients(stats, seconds + 1)
+    print(f"  api: {api.stats()}")
+    api.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import os, random, sqlite3, sys, tempfile, time, tracemalloc
+from datetime import date, timedelta
+import database_ops as db
+import attendance_reports as reports
+
+# summary tables vs scanning attendance_records, on a synthetic multi-year db
+# school days are weekdays outside a june break, each student is present ~92% of them
+# also checks both ways give the same numbers, and the peak memory of a streamed export vs fetchall
+# usage: python bench_attendance_reports.py [n_students] [n_years]   (defaults: 2000 x 3 ~ 1.4M rows)
+
+PRESENT_RATE = 0.92
+
+
+def school_days(n_years):
+    start = date(2022, 1, 3)
+    days, day = [], start
+    while day < start.replace(year=start.year + n_years):
+        if day.weekday() < 5 and day.month != 6:
+            days.append(day.isoformat())
+        day += timedelta(days=1)
+    return days
+
+
+def build_db(path, n_students, days):
+    db.DB_FILE = path
+    db.setup_database_tables_if_needed()
+    db.close_thread_connections()
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.executemany("INSERT INTO students(roll_no, name, face_encoding) VALUES (?, ?, ?)",
+                     ((i, f"Student {i}", b"") for i in range(n_students)))
+    rng = random.Random(0)
+    start = time.perf_counter()
+    rows = 0
+    for day in days:  # a day per transaction, like the attendance writer's batches
+        present = [(roll_no, day, "08:30:00") for roll_no in range(n_students) if rng.random() < PRESENT_RATE]
+        conn.executemany(db.INSERT_ATTENDANCE_SQL, present)
+        conn.commit()
+        rows += len(present)
+    seconds = time.perf_counter() - start
+    conn.execute("ANALYZE")
+    conn.close()
+    return rows, seconds
+
+
+def timed(label, func, repeats=3):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:>44}: {best * 1000:>9.1f} ms")
+    return result
+
+
+def scan_summary(date_from, date_to):
+    # what the summary used to cost: group the raw records
+    conn = db.get_connection_to_database()
+    school_days = conn.execute("SELECT COUNT(DISTINCT attendance_date) FROM attendance_records "
+                               "WHERE attendance_date BETWEEN ? AND ?", (date_from, date_to)).fetchone()[0]
+    days = dict(conn.execute("SELECT roll_no, COUNT(*) FROM attendance_records WHERE attendance_date BETWEEN ? AND ? "
+                             "GROUP BY roll_no", (date_from, date_to)).fetchall())
+    rows = conn.execute("SELECT roll_no, name FROM students ORDER BY roll_no").fetchall()
+    return [(roll_no, name, days.get(roll_no, 0), school_days,
+             round(100.0 * days.get(roll_no, 0) / school_days, 1) if school_days else 0.0) for roll_no, name in rows]
+
+
+def scan_daily(date_from, date_to):
+    conn = db.get_connection_to_database()
+    return conn.execute("SELECT attendance_date, COUNT(*) FROM attendance_records WHERE attendance_date BETWEEN ? AND ? "
+                        "GROUP BY attendance_date ORDER BY attendance_date", (date_from, date_to)).fetchall()
+
+
+def scan_monthly(roll_no):
+    conn = db.get_connection_to_database()
+    return conn.execute("SELECT substr(attendance_date, 1, 7), COUNT(*) FROM attendance_records WHERE roll_no = ? "
+                        "GROUP BY 1 ORDER BY 1", (roll_no,)).fetchall()
+
+
+def peak_memory_mib(func):
+    tracemalloc.start()
+    result = func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, peak / 2 ** 20
+
+
+def main():
+    n_students = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    n_years = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    folder = tempfile.mkdtemp()
+    path = os.path.join(folder, "attendance.db")
+    days = school_days(n_years)
+    rows, seconds = build_db(path, n_students, days)
+    print(f"{rows} attendance rows over {len(days)} school days, logged at {rows / seconds:,.0f} rows/s "
+          f"with the summary triggers, {os.path.getsize(path) / 2 ** 20:.0f} MiB")
+
+    year = ("2023-01-01", "2023-12-31")
+    term = ("2023-01-16", "2023-05-19")  # partial months at both ends are still counted from the records
+    for label, (date_from, date_to) in [("school year", year), ("term", term)]:
+        print(f"\n{label} attendance % per student")
+        scanned = timed("scan attendance_records", lambda: scan_summary(date_from, date_to))
+        summary = timed("summary tables", lambda: reports.student_attendance_summary(date_from, date_to))
+        print(f"{'same result':>44}: {scanned == summary}")
+    print("\ndaily present count, one year")
+    scanned = timed("scan attendance_records", lambda: scan_daily(*year))
+    daily = timed("summary tables", lambda: reports.daily_present_counts(*year))
+    print(f"{'same result':>44}: {scanned == daily}")
+    print("\none student's months, all years")
+    scanned = timed("scan attendance_records", lambda: scan_monthly(n_students // 2))
+    monthly = timed("summary tables", lambda: reports.student_monthly_history(n_students // 2))
+    print(f"{'same result':>44}: {scanned == monthly}")
+
+    print("\nexport every record to csv")
+    out = os.path.join(folder, "export.csv")
+    _, peak = peak_memory_mib(db.fetch_full_attendance_report)
+    print(f"{'fetchall (old report)':>44}: peak {peak:7.1f} MiB")
+    start = time.perf_counter()
+    written, peak = peak_memory_mib(lambda: reports.export_attendance_records(out))
+    seconds = time.perf_counter() - start
+    print(f"{'streamed export':>44}: peak {peak:7.1f} MiB, {written / seconds:,.0f} rows/s (traced)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import argparse, time
+import cv2
+import face_recognition
+import numpy as np
+from batch_encoder import BatchFaceEncoder
+
+# faces/sec of the per face encoder (face_recognition.face_encodings) vs one batched dlib call per frame,
+# and of a re-check pass where every face keeps its track key and the cached encodings are reused
+# one face photo is tiled into a grid, n copies per frame, so the faces and boxes are identical each run
+# usage: python bench_batch_encoder.py <face photo> [--faces 1,10,40] [--repeat 5]
+
+
+def tiled_frame(face_rgb, box, n):
+    # n copies of the photo in a near square grid -> (frame, one box per copy)
+    columns = int(np.ceil(np.sqrt(n)))
+    rows = int(np.ceil(n / columns))
+    height, width = face_rgb.shape[:2]
+    frame = np.zeros((rows * height, columns * width, 3), dtype=np.uint8)
+    top, right, bottom, left = box
+    boxes = []
+    for i in range(n):
+        y0, x0 = (i // columns) * height, (i % columns) * width
+        frame[y0:y0 + height, x0:x0 + width] = face_rgb
+        boxes.append((top + y0, right + x0, bottom + y0, left + x0))
+    return frame, boxes
+
+
+def faces_per_second(encode, frame, boxes, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        encodings = encode(frame, boxes)
+    return len(boxes) * repeat / (time.perf_counter() - start), encodings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("photo", help="a photo with one face, it's shrunk to ~160 px wide")
+    parser.add_argument("--faces", default="1,10,40")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    photo = cv2.cvtColor(cv2.imread(args.photo), cv2.COLOR_BGR2RGB)
+    photo = cv2.resize(photo, (160, int(photo.shape[0] * 160 / photo.shape[1])), interpolation=cv2.INTER_AREA)
+    boxes = face_recognition.face_locations(photo, number_of_times_to_upsample=1)
+    if not boxes:
+        print("No face found in the photo")
+        return
+    face_rgb = np.ascontiguousarray(photo)
+
+    for n in (int(x) for x in args.faces.split(",")):
+        frame, frame_boxes = tiled_frame(face_rgb, boxes[0], n)
+        per_face, reference = faces_per_second(face_recognition.face_encodings, frame, frame_boxes, args.repeat)
+        encoder = BatchFaceEncoder()
+        batched, encodings = faces_per_second(encoder.encode, frame, frame_boxes, args.repeat)
+        keys = list(range(n))
+        encoder.encode(frame, frame_boxes, keys)  # fill the chip cache once
+        reused, _ = faces_per_second(lambda f, b: encoder.encode(f, b, keys), frame, frame_boxes, args.repeat)
+        drift = float(np.max(np.abs(np.array(reference) - encodings)))
+        print(f"{n:>3} faces/frame: per face {per_face:7.1f}  batched {batched:7.1f}  "
+              f"re-check with reuse {reused:8.1f} faces/s  (max diff vs face_encodings {drift:.2e})")
+
+
+if __name__ == "__main__":
+    main()
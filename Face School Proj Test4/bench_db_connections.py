@@ -0,0 +1,98 @@
+import os, sqlite3, sys, tempfile, time
+from datetime import date, datetime, timedelta
+import database_ops as db
+
+# attendance inserts/sec and report query latency: open-per-call (old) vs pooled WAL connections
+# usage: python bench_db_connections.py [n_inserts]
+
+REPORT_STUDENTS, REPORT_RECORDS, REPORT_REPEATS = 500, 20_000, 20
+
+
+def old_log_student_attendance(path, roll_no):
+    # the pre-pool version: fresh connection, rollback journal, full fsync on every commit
+    conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES)
+    now = datetime.now()
+    today_date_str, current_time_str = now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S")
+    try:
+        c = conn.cursor()
+        c.execute("SELECT * FROM attendance_records WHERE roll_no = ? AND attendance_date = ?",
+                  (roll_no, today_date_str))
+        if c.fetchone() is None:
+            c.execute("INSERT INTO attendance_records(roll_no, attendance_date, attendance_time) VALUES (?, ?, ?)",
+                      (roll_no, today_date_str, current_time_str))
+            conn.commit()
+            return True
+        return False
+    finally:
+        conn.close()
+
+
+def old_fetch_report(path):
+    conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES)
+    try:
+        return conn.execute("""SELECT ar.roll_no, s.name, ar.attendance_date, ar.attendance_time
+                               FROM attendance_records ar JOIN students s ON ar.roll_no = s.roll_no
+                               ORDER BY ar.record_id DESC""").fetchall()
+    finally:
+        conn.close()
+
+
+def fresh_db(folder, name, wal):
+    path = os.path.join(folder, name)
+    db.DB_FILE = path
+    db.setup_database_tables_if_needed()
+    if not wal:
+        db.close_thread_connections()
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.close()
+    return path
+
+
+def fill_report_data(path):
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO students(roll_no, name, face_encoding) VALUES (?, ?, ?)",
+                     ((i, f"student {i}", b"") for i in range(REPORT_STUDENTS)))
+    conn.executemany("INSERT INTO attendance_records(roll_no, attendance_date, attendance_time) VALUES (?, ?, ?)",
+                     ((roll_no, (date(2025, 1, 1) + timedelta(days=day)).isoformat(), "08:00:00")
+                      for day in range(REPORT_RECORDS // REPORT_STUDENTS)  # one record per student per day
+                      for roll_no in range(REPORT_STUDENTS)))
+    conn.commit()
+    conn.close()
+
+
+def per_second(func, count):
+    start = time.perf_counter()
+    for i in range(count):
+        func(i)
+    return count / (time.perf_counter() - start)
+
+
+def ms_per_call(func, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    n_inserts = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    folder = tempfile.mkdtemp()
+
+    old_path = fresh_db(folder, "old.db", wal=False)
+    old_rate = per_second(lambda i: old_log_student_attendance(old_path, i), n_inserts)
+    fresh_db(folder, "new.db", wal=True)
+    new_rate = per_second(db.log_student_attendance, n_inserts)
+    print(f"attendance inserts/sec: open-per-call {old_rate:.0f}, pooled WAL {new_rate:.0f}")
+
+    old_path = fresh_db(folder, "old_report.db", wal=False)
+    fill_report_data(old_path)
+    new_path = fresh_db(folder, "new_report.db", wal=True)
+    fill_report_data(new_path)
+    old_ms = ms_per_call(lambda: old_fetch_report(old_path), REPORT_REPEATS)
+    new_ms = ms_per_call(db.fetch_full_attendance_report, REPORT_REPEATS)
+    print(f"report query ({REPORT_RECORDS} rows): open-per-call {old_ms:.1f} ms, pooled WAL {new_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import os, pickle, sqlite3, sys, tempfile, time
+import numpy as np
+import database_ops as db
+
+# db size and gallery load time: old pickled float64 blobs vs the binary float32/float16 format
+# usage: python bench_encoding_storage.py [n_students]
+
+CREATE_STUDENTS = "CREATE TABLE students (roll_no INTEGER PRIMARY KEY, name TEXT NOT NULL, face_encoding array NOT NULL)"
+
+
+def make_db(path, encodings, encode_blob):
+    conn = sqlite3.connect(path)
+    conn.execute(CREATE_STUDENTS)
+    conn.executemany("INSERT INTO students VALUES (?, ?, ?)",
+                     ((i, f"student {i}", encode_blob(enc)) for i, enc in enumerate(encodings)))
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+
+
+def old_load(path):
+    # what load_all_registered_students_from_db + the old gallery build did: unpickle row by row
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT roll_no, name, face_encoding FROM students").fetchall()
+    conn.close()
+    students = [{"roll_no": r[0], "name": r[1], "face_encoding": pickle.loads(r[2])} for r in rows]
+    return np.asarray([s["face_encoding"] for s in students], dtype=np.float32)
+
+
+def new_load(path):
+    db.DB_FILE = path
+    return db.load_student_encoding_matrix_from_db()[1]
+
+
+def best_of(func, path, repeats=5):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(path)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    encodings = np.random.default_rng(0).normal(0.0, 0.09, size=(n, db.ENCODING_SIZE))
+    folder = tempfile.mkdtemp()
+    paths = {"pickle float64 (old)": os.path.join(folder, "old.db"),
+             "binary float32": os.path.join(folder, "f32.db"),
+             "binary float16": os.path.join(folder, "f16.db")}
+    make_db(paths["pickle float64 (old)"], encodings, pickle.dumps)
+    make_db(paths["binary float32"], encodings, lambda e: db.adapt_array(e, "<f4"))
+    make_db(paths["binary float16"], encodings, lambda e: db.adapt_array(e, "<f2"))
+
+    print(f"students: {n}")
+    print(f"{'format':>21} | {'db size KiB':>11} | {'load ms':>8}")
+    for label, path in paths.items():
+        loader = old_load if "old" in label else new_load
+        print(f"{label:>21} | {os.path.getsize(path) / 1024:>11.0f} | {best_of(loader, path):>8.1f}")
+
+    # one-time migration cost of an existing db
+    migrate_path = os.path.join(folder, "migrate.db")
+    make_db(migrate_path, encodings, pickle.dumps)
+    db.DB_FILE = migrate_path
+    start = time.perf_counter()
+    db.setup_database_tables_if_needed()
+    print(f"migrating the old db took {time.perf_counter() - start:.2f}s, "
+          f"size now {os.path.getsize(migrate_path) / 1024:.0f} KiB")
+    assert np.allclose(new_load(migrate_path), encodings.astype(np.float32))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import os, sys, tempfile, time
+import numpy as np
+import database_ops as db
+import encoding_store
+from face_gallery import FaceGallery
+
+# recognition startup: gallery from sqlite vs gallery from the memory-mapped sidecar
+# usage: python bench_encoding_store.py
+
+SIZES = [1_000, 10_000, 100_000]
+
+
+def make_db(path, n, rng):
+    db.DB_FILE = path
+    db.setup_database_tables_if_needed()
+    conn = db.get_connection_to_database()
+    encodings = rng.normal(0.0, 0.09, size=(n, db.ENCODING_SIZE))
+    conn.executemany("INSERT INTO students(roll_no, name, face_encoding) VALUES (?, ?, ?)",
+                     ((i, f"student {i}", enc) for i, enc in enumerate(encodings)))
+    conn.commit()
+    db.release_connection(conn)
+
+
+def startup_ms(use_sidecar, repeats=5):
+    db.USE_ENCODING_SIDECAR = use_sidecar
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        gallery = FaceGallery.load_from_db()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000, gallery
+
+
+def shares_memmap(array):
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+    return False
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'students':>8} | {'sqlite ms':>9} | {'sidecar ms':>10} | {'sidecar copied?':>15}")
+    for n in SIZES:
+        path = os.path.join(tempfile.mkdtemp(), "attendance.db")
+        make_db(path, n, rng)
+        db_ms, _ = startup_ms(False)
+        encoding_store.rebuild_encoding_store(path, *db.load_student_encoding_matrix_from_db())
+        sidecar_ms, gallery = startup_ms(True)
+        copied = not shares_memmap(gallery.encodings)
+        print(f"{n:>8} | {db_ms:>9.1f} | {sidecar_ms:>10.1f} | {str(copied):>15}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import argparse, glob, os, time
+import cv2
+import face_recognition
+import numpy as np
+from face_detection import DETECTION_MODES, make_face_detector
+from face_tracker import box_iou
+
+# fps and recall of the detection modes on recorded frames
+# ground truth is HOG on the full size frame with one upsampling pass (too slow to run live)
+# distance is simulated by shrinking each frame onto a same size canvas, 0.5 = faces half as big
+# usage: python bench_face_detection.py <frames with faces> [--empty <frames without faces>] [--distances 1,0.5,0.35]
+
+MATCH_IOU = 0.4
+
+
+def load_frames(folder):
+    paths = sorted(p for ext in ("*.jpg", "*.jpeg", "*.png") for p in glob.glob(os.path.join(folder, ext)))
+    return [f for f in (cv2.imread(p) for p in paths) if f is not None]
+
+
+def reference_boxes(frame):
+    return face_recognition.face_locations(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), number_of_times_to_upsample=1)
+
+
+def at_distance(frame, boxes, distance):
+    # frame shrunk by distance and centred on a canvas of the original size, boxes moved along with it
+    if distance == 1.0:
+        return frame, boxes
+    height, width = frame.shape[:2]
+    small = cv2.resize(frame, (0, 0), fx=distance, fy=distance, interpolation=cv2.INTER_AREA)
+    y0, x0 = (height - small.shape[0]) // 2, (width - small.shape[1]) // 2
+    canvas = np.full_like(frame, 127)
+    canvas[y0:y0 + small.shape[0], x0:x0 + small.shape[1]] = small
+    moved = [(int(t * distance) + y0, int(r * distance) + x0, int(b * distance) + y0, int(l * distance) + x0)
+             for t, r, b, l in boxes]
+    return canvas, moved
+
+
+def recall_of(found, expected):
+    hits = 0
+    for box in expected:
+        if any(box_iou(box, other) >= MATCH_IOU for other in found):
+            hits += 1
+    return hits
+
+
+def run_mode(mode, frames, expected_per_frame):
+    detector = make_face_detector(mode)
+    hits = expected = extra = 0
+    start = time.perf_counter()
+    found_per_frame = [detector.detect(frame) for frame in frames]
+    seconds = time.perf_counter() - start
+    for found, boxes in zip(found_per_frame, expected_per_frame):
+        frame_hits = recall_of(found, boxes)
+        hits, expected = hits + frame_hits, expected + len(boxes)
+        extra += max(0, len(found) - frame_hits)
+    return len(frames) / seconds, (hits / expected if expected else float("nan")), extra
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("frames")
+    parser.add_argument("--empty", help="frames with nobody in them, for the no-face throughput")
+    parser.add_argument("--distances", default="1,0.5,0.35")
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames)
+    print(f"{len(frames)} frames, finding reference faces at full size...")
+    references = [reference_boxes(frame) for frame in frames]
+    print(f"{sum(map(len, references))} reference faces")
+
+    for distance in (float(d) for d in args.distances.split(",")):
+        moved = [at_distance(frame, boxes, distance) for frame, boxes in zip(frames, references)]
+        print(f"\ndistance {distance:.2f} (faces ~{distance:.0%} of recorded size)")
+        for mode in DETECTION_MODES:
+            fps, recall, extra = run_mode(mode, [m[0] for m in moved], [m[1] for m in moved])
+            print(f"  {mode:>16}: {fps:7.1f} fps, recall {recall:6.1%}, {extra} extra boxes")
+
+    if args.empty:
+        empty_frames = load_frames(args.empty)
+        print(f"\n{len(empty_frames)} frames without faces")
+        for mode in DETECTION_MODES:
+            fps, _, extra = run_mode(mode, empty_frames, [[] for _ in empty_frames])
+            print(f"  {mode:>16}: {fps:7.1f} fps, {extra} false boxes")
+
+
+if __name__ == "__main__":
+    main()
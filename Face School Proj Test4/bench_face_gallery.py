@@ -0,0 +1,67 @@
+import time
+import numpy as np
+from face_gallery import FaceGallery, ENCODING_SIZE
+
+# per-frame match latency, old per-face scan vs FaceGallery
+# usage: python bench_face_gallery.py
+
+GALLERY_SIZES = [100, 1_000, 10_000, 100_000]
+FACES_PER_FRAME = 5
+REPEATS = 20
+
+
+def make_fake_encodings(count, rng):
+    # dlib descriptors are roughly unit length, this is close enough for timing
+    return rng.normal(0.0, 0.09, size=(count, ENCODING_SIZE))
+
+
+def old_face_distance(face_encodings, face_to_compare):
+    # same as face_recognition.face_distance, list gets converted to array on every call
+    return np.linalg.norm(np.array(face_encodings) - face_to_compare, axis=1)
+
+
+def old_match_frame(known_encodings_list, frame_encodings, tolerance=0.6):
+    results = []
+    for encoding in frame_encodings:
+        matches = list(old_face_distance(known_encodings_list, encoding) <= tolerance)  # compare_faces
+        face_distances = old_face_distance(known_encodings_list, encoding)
+        best_match_index = np.argmin(face_distances)
+        results.append(best_match_index if matches[best_match_index] else None)
+    return results
+
+
+def time_it(func, repeats):
+    func()  # warm up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"faces per frame: {FACES_PER_FRAME}")
+    print(f"{'gallery':>9} | {'old ms/frame':>12} | {'gallery ms/frame':>16} | {'speedup':>7}")
+    for size in GALLERY_SIZES:
+        known = make_fake_encodings(size, rng)
+        known_list = list(known)
+        info = [{"roll_no": i, "name": f"student {i}"} for i in range(size)]
+        gallery = FaceGallery(known, info)
+
+        # queries near real gallery entries so some of them match
+        picks = rng.choice(size, FACES_PER_FRAME, replace=False)
+        frame_encodings = list(known[picks] + rng.normal(0.0, 0.01, size=(FACES_PER_FRAME, ENCODING_SIZE)))
+
+        repeats = max(3, REPEATS // (size // 10_000 + 1))
+        old_ms = time_it(lambda: old_match_frame(known_list, frame_encodings), repeats)
+        new_ms = time_it(lambda: gallery.match_faces(frame_encodings), repeats)
+
+        old_result = old_match_frame(known_list, frame_encodings)
+        new_result = [m.index for m in gallery.match_faces(frame_encodings)]
+        assert old_result == new_result, "gallery gave different matches than the old scan"
+
+        print(f"{size:>9} | {old_ms:>12.3f} | {new_ms:>16.3f} | {old_ms / new_ms:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import glob, os, sys, time
+import cv2
+import face_recognition
+import numpy as np
+import registration_pipeline as rp
+from frame_quality import DiverseFrameSelector
+from face_operations import CAPTURE_DETECTION_SCALE
+
+# enrollment cost and match quality: first 100 frames + mean (old) vs quality/diversity sampling + trimmed mean
+# usage: python bench_frame_sampling.py <enrollment frames folder> <probe frames folder> [other people folder]
+# the folders are recorded webcam frames, enrollment and probe of the same student from different sessions
+
+OLD_FRAME_COUNT = 100
+
+
+def load_frames(folder):
+    paths = sorted(p for ext in ("*.jpg", "*.jpeg", "*.png") for p in glob.glob(os.path.join(folder, ext)))
+    return [f for f in (cv2.imread(p) for p in paths) if f is not None]
+
+
+def old_enrollment(frames):
+    captured = []
+    for frame in frames:
+        if len(captured) == OLD_FRAME_COUNT:
+            break
+        locations = face_recognition.face_locations(frame)
+        if len(locations) == 1:
+            captured.append(rp.CapturedFrame(frame, locations[0]))
+    encodings = [e for e in rp.encode_captured_frames_serially(captured) if e is not None]
+    return np.mean(encodings, axis=0), len(captured)
+
+
+def new_enrollment(frames):
+    selector = DiverseFrameSelector()
+    for frame in frames:
+        if selector.is_done():
+            break
+        small = cv2.resize(frame, (0, 0), fx=CAPTURE_DETECTION_SCALE, fy=CAPTURE_DETECTION_SCALE)
+        locations = [tuple(int(v / CAPTURE_DETECTION_SCALE) for v in loc) for loc in face_recognition.face_locations(small)]
+        if len(locations) == 1:
+            selector.offer(frame, locations[0])
+    encodings = [e for e in rp.encode_captured_frames_serially(selector.kept) if e is not None]
+    return rp.aggregate_encodings(encodings), len(selector.kept)
+
+
+def encode_all(frames):
+    encodings = []
+    for frame in frames:
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        encodings.extend(face_recognition.face_encodings(rgb))
+    return np.array(encodings)
+
+
+def report(label, enrollment, frames, seconds, probes, others):
+    genuine = np.linalg.norm(probes - enrollment, axis=1)
+    line = (f"{label:>5}: {seconds:6.2f}s, {frames:3d} frames encoded, probe distance mean {genuine.mean():.3f} "
+            f"max {genuine.max():.3f}, probes matched at 0.6: {np.mean(genuine <= 0.6):.1%}")
+    if len(others):
+        line += f", closest stranger {np.linalg.norm(others - enrollment, axis=1).min():.3f}"
+    print(line)
+
+
+def main():
+    if len(sys.argv) < 3:
+        sys.exit("usage: python bench_frame_sampling.py <enrollment frames> <probe frames> [other people frames]")
+    enrollment_frames = load_frames(sys.argv[1])
+    probes = encode_all(load_frames(sys.argv[2]))
+    others = encode_all(load_frames(sys.argv[3])) if len(sys.argv) > 3 else np.empty((0, 128))
+    print(f"{len(enrollment_frames)} recorded enrollment frames, {len(probes)} probe faces, {len(others)} strangers")
+
+    start = time.perf_counter()
+    old_encoding, old_frames = old_enrollment(enrollment_frames)
+    report("old", old_encoding, old_frames, time.perf_counter() - start, probes, others)
+
+    start = time.perf_counter()
+    new_encoding, new_frames = new_enrollment(enrollment_frames)
+    report("new", new_encoding, new_frames, time.perf_counter() - start, probes, others)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import glob, os, sys, time
+import cv2
+import face_recognition
+import numpy as np
+import registration_pipeline as rp
+
+# 100-frame enrollment: old serial detect+encode on full frames vs reused boxes + crops + process pool
+# usage: python bench_registration_encoding.py <folder of frames with one face each>
+
+FRAMES_PER_ENROLLMENT = 100
+
+
+def load_frames(folder):
+    paths = sorted(p for ext in ("*.jpg", "*.jpeg", "*.png") for p in glob.glob(os.path.join(folder, ext)))
+    frames = [cv2.imread(p) for p in paths]
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        sys.exit(f"No images found in {folder}")
+    return [frames[i % len(frames)] for i in range(FRAMES_PER_ENROLLMENT)]
+
+
+def old_process(frames):
+    # what process_captured_images_and_save used to do on the tk thread
+    encodings = []
+    for frame in frames:
+        face_locations = face_recognition.face_locations(frame)
+        if face_locations:
+            encodings.append(face_recognition.face_encodings(frame, face_locations)[0])
+    return encodings
+
+
+def main():
+    if len(sys.argv) < 2:
+        sys.exit("usage: python bench_registration_encoding.py <frames folder>")
+    frames = load_frames(sys.argv[1])
+
+    # capture already ran detection, so boxes come for free in the new flow
+    captured = []
+    for frame in frames:
+        locations = face_recognition.face_locations(frame)
+        if len(locations) == 1:
+            captured.append(rp.CapturedFrame(frame, locations[0]))
+    print(f"{len(frames)} frames, {len(captured)} with exactly one face")
+
+    start = time.perf_counter()
+    old_encodings = old_process(frames)
+    old_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    crop_encodings = rp.encode_captured_frames_serially(captured)
+    crop_s = time.perf_counter() - start
+
+    for job in rp.submit_encoding_jobs(captured[:1]):  # spin the workers up, the app keeps them warm
+        rp.job_result(job)
+    start = time.perf_counter()
+    pool_encodings = [rp.job_result(job) for job in rp.submit_encoding_jobs(captured)]
+    pool_s = time.perf_counter() - start
+
+    old_mean = np.mean(old_encodings, axis=0)
+    new_mean = np.mean([e for e in pool_encodings if e is not None], axis=0)
+    print(f"old serial full frames : {old_s:6.2f}s")
+    print(f"serial crops, no detect: {crop_s:6.2f}s")
+    print(f"process pool crops     : {pool_s:6.2f}s ({rp.get_encoding_pool()._max_workers} workers)")
+    crop_mean = np.mean([e for e in crop_encodings if e is not None], axis=0)
+    print(f"distance between old and new averaged encoding: {np.linalg.norm(old_mean - new_mean):.4f}")
+    print(f"serial and pool crops agree: {np.allclose(crop_mean, new_mean)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import os, sqlite3, sys, tempfile, time
+from datetime import date, timedelta
+import database_ops as db
+
+# report latency on a synthetic db: full dump (old report window) vs keyset pages with filters
+# usage: python bench_report_queries.py [n_students] [n_days]   (defaults: 5000 x 400 = 2M rows)
+
+FIRST_NAMES = ["Aarav", "Diya", "Ishaan", "Kavya", "Rohan", "Sara", "Vihaan", "Zoya", "Arjun", "Meera"]
+
+
+def build_db(path, n_students, n_days):
+    db.DB_FILE = path
+    db.setup_database_tables_if_needed()
+    db.close_thread_connections()
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.executemany("INSERT INTO students(roll_no, name, face_encoding) VALUES (?, ?, ?)",
+                     ((i, f"{FIRST_NAMES[i % len(FIRST_NAMES)]} {i}", b"") for i in range(n_students)))
+    start = date(2022, 1, 1)
+    days = [(start + timedelta(days=d)).isoformat() for d in range(n_days)]
+    conn.executemany("INSERT INTO attendance_records(roll_no, attendance_date, attendance_time) VALUES (?, ?, ?)",
+                     ((roll_no, day, "08:30:00") for day in days for roll_no in range(n_students)))
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    return days
+
+
+def timed(label, func, repeats=3):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:>44}: {best * 1000:>9.1f} ms")
+    return result
+
+
+def walk_pages(count, **filters):
+    cursor = None
+    for _ in range(count):
+        rows, cursor = db.fetch_attendance_report_page(cursor, **filters)
+        if cursor is None:
+            break
+    return rows
+
+
+def main():
+    n_students = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_days = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    if n_students < 1 or n_days < 1:
+        sys.exit("need at least one student and one day")
+    path = os.path.join(tempfile.mkdtemp(), "attendance.db")
+    start = time.perf_counter()
+    days = build_db(path, n_students, n_days)
+    print(f"{n_students * n_days} attendance rows, built in {time.perf_counter() - start:.1f}s, "
+          f"{os.path.getsize(path) / 2 ** 20:.0f} MiB")
+
+    timed("full report fetchall (old window)", db.fetch_full_attendance_report, repeats=1)
+    timed("first page", lambda: db.fetch_attendance_report_page())
+    timed("page 100 (walking the cursor)", lambda: walk_pages(100))
+    timed("one student, first page", lambda: db.fetch_attendance_report_page(roll_no=1234))
+    week = days[max(0, len(days) // 2 - 3):][:7]  # the middle 7 days, or all of them on a short run
+    old_week = days[:7]
+    timed("one week, first page", lambda: db.fetch_attendance_report_page(date_from=week[0], date_to=week[-1]))
+    timed("old week, page 10", lambda: walk_pages(10, date_from=old_week[0], date_to=old_week[-1]))
+    timed("name prefix 'meera 12', first page", lambda: db.fetch_attendance_report_page(name_prefix="meera 12"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import argparse, csv, json, os, re, sys, time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+import face_recognition
+import database_ops as db
+import registration_pipeline
+
+# enroll a whole school from photos instead of the webcam flow
+# students come from a folder (one sub folder per student, "<roll_no>_<name>", any number of photos in
+# it) or a csv (roll_no, name, image paths - several paths split by ';', or one row per photo). every
+# student is one job on a process pool: detect, crop, encode each photo, then the same trimmed average
+# the webcam registration uses. results are written in batches with one executemany per batch
+# students already in the db are skipped, so an import that was interrupted just gets run again
+#
+#   python bulk_import.py photos/ --workers 6 --report import_report.json
+#   python bulk_import.py students.csv --db attendance.db --update
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+DETECTION_MAX_SIDE = 800  # photos are downscaled to this for HOG, the encoder still gets a full res crop
+WRITE_BATCH_SIZE = 200
+PROGRESS_EVERY = 100
+
+ImportEntry = namedtuple("ImportEntry", ["roll_no", "name", "image_paths"])
+# encoding is None when no photo gave a usable face, failures = [(path, reason)]
+EncodedStudent = namedtuple("EncodedStudent", ["roll_no", "name", "encoding", "images_used", "failures"])
+
+
+def _image_paths_in(folder):
+    return sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def entries_from_folder(folder):
+    # photos/1042_Asha Verma/*.jpg -> ImportEntry(1042, "Asha Verma", [...]), (entries, problems)
+    entries, problems = [], []
+    for sub in sorted(os.listdir(folder)):
+        path = os.path.join(folder, sub)
+        if not os.path.isdir(path):
+            continue
+        match = re.match(r"^(\d+)[_ -]+(.+)$", sub)
+        if not match:
+            problems.append((sub, "folder name is not <roll_no>_<name>"))
+            continue
+        entries.append(ImportEntry(int(match.group(1)), match.group(2).replace("_", " ").strip(),
+                                   _image_paths_in(path)))
+    return entries, problems
+
+
+def entries_from_csv(csv_path):
+    # rows of roll_no, name, path[;path...][, more paths] - relative paths are relative to the csv
+    # the same roll_no on several rows collects all their photos
+    base = os.path.dirname(os.path.abspath(csv_path))
+    by_roll_no, problems = {}, []
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        for line_no, row in enumerate(csv.reader(f), start=1):
+            if not row or not "".join(row).strip():
+                continue
+            try:
+                roll_no = int(row[0])
+            except ValueError:
+                if line_no > 1:  # first row is allowed to be a header
+                    problems.append((f"line {line_no}", f"roll number {row[0]!r} is not a number"))
+                continue
+            if len(row) < 3:
+                problems.append((f"line {line_no}", "need roll_no, name and at least one image path"))
+                continue
+            paths = [p.strip() for cell in row[2:] for p in cell.split(";") if p.strip()]
+            entry = by_roll_no.setdefault(roll_no, ImportEntry(roll_no, row[1].strip(), []))
+            entry.image_paths.extend(os.path.join(base, p) for p in paths)
+    return list(by_roll_no.values()), problems
+
+
+def load_import_entries(source):
+    return entries_from_csv(source) if source.lower().endswith(".csv") else entries_from_folder(source)
+
+
+def find_single_face(image):
+    # BGR photo -> face box in full size coords, or (None, reason)
+    scale = min(1.0, DETECTION_MAX_SIDE / max(image.shape[:2]))
+    small = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else image
+    boxes = face_recognition.face_locations(cv2.cvtColor(small, cv2.COLOR_BGR2RGB))
+    if not boxes:
+        return None, "no face found"
+    if len(boxes) > 1:
+        return None, f"{len(boxes)} faces, expected one"
+    return tuple(int(round(v / scale)) for v in boxes[0]), None
+
+
+def encode_student(entry):
+    # runs in a pool worker, one student per job so a bad photo only costs itself
+    encodings, failures = [], []
+    for path in entry.image_paths:
+        image = cv2.imread(path)
+        if image is None:
+            failures.append((path, "can't read image"))
+            continue
+        face_location, reason = find_single_face(image)
+        if face_location is None:
+            failures.append((path, reason))
+            continue
+        encoding = registration_pipeline.encode_face_crop(
+            *registration_pipeline.crop_face_for_encoding(image, face_location))
+        if encoding is None:
+            failures.append((path, "encoder found no face in the crop"))
+        else:
+            encodings.append(encoding)
+    average = registration_pipeline.aggregate_encodings(encodings) if encodings else None
+    return EncodedStudent(entry.roll_no, entry.name, average, len(encodings), failures)
+
+
+def import_students(entries, workers=None, replace_existing=False, batch_size=WRITE_BATCH_SIZE, on_progress=None):
+    # the api behind the command: encodes entries on a process pool and writes them in batches
+    # on_progress(done, total) is called from this thread. returns the report dict
+    started = time.perf_counter()
+    report = {"students": len(entries), "imported": 0, "skipped_existing": 0, "failed_students": 0,
+              "images": 0, "images_used": 0, "failures": []}
+
+    existing = db.fetch_registered_roll_nos()
+    if existing is None:
+        report["failures"].append({"roll_no": None, "path": db.DB_FILE, "reason": "can't read students"})
+        return report
+    if not replace_existing:
+        todo = [e for e in entries if e.roll_no not in existing]
+        report["skipped_existing"] = len(entries) - len(todo)
+        entries = todo
+    no_images = [e for e in entries if not e.image_paths]
+    for entry in no_images:
+        report["failures"].append({"roll_no": entry.roll_no, "path": None, "reason": "no images"})
+    report["failed_students"] += len(no_images)
+    entries = [e for e in entries if e.image_paths]
+
+    pending_rows = []
+
+    def flush():
+        if pending_rows:
+            written = db.save_students_batch(pending_rows, replace_existing)
+            if written is None:  # batch rolled back, next run picks these students up again
+                report["failures"].extend({"roll_no": row[0], "path": None, "reason": "db write failed"}
+                                          for row in pending_rows)
+                report["failed_students"] += len(pending_rows)
+            else:
+                report["imported"] += written
+            pending_rows.clear()
+
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = [pool.submit(encode_student, entry) for entry in entries]
+        try:
+            for done, job in enumerate(as_completed(jobs), start=1):
+                try:
+                    student = job.result()
+                except Exception as e:  # a crashed worker only costs that student
+                    print(f"Import job failed: {e}")
+                    report["failed_students"] += 1
+                    report["failures"].append({"roll_no": None, "path": None, "reason": f"worker error: {e}"})
+                    continue
+                report["images"] += student.images_used + len(student.failures)
+                report["images_used"] += student.images_used
+                report["failures"].extend({"roll_no": student.roll_no, "path": path, "reason": reason}
+                                          for path, reason in student.failures)
+                if student.encoding is None:
+                    report["failed_students"] += 1
+                else:
+                    pending_rows.append((student.roll_no, student.name, student.encoding))
+                    if len(pending_rows) >= batch_size:
+                        flush()
+                if on_progress:
+                    on_progress(done, len(jobs))
+        except KeyboardInterrupt:
+            # keep what's encoded, the rest is picked up by the next run
+            for job in jobs:
+                job.cancel()
+            report["interrupted"] = True
+        finally:
+            flush()
+
+    wall_seconds = max(time.perf_counter() - started, 1e-9)
+    report.update({"wall_seconds": round(wall_seconds, 2), "workers": workers,
+                   "students_per_second": round((report["imported"] + report["failed_students"]) / wall_seconds, 2),
+                   "images_per_second": round(report["images"] / wall_seconds, 2)})
+    return report
+
+
+def write_report(report, path):
+    # .csv -> the failures only, anything else -> the whole report as json
+    if path.lower().endswith(".csv"):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["roll_no", "path", "reason"])
+            for failure in report["failures"]:
+                writer.writerow([failure["roll_no"], failure["path"], failure["reason"]])
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Enroll students from a folder of photos or a csv.")
+    parser.add_argument("source", help="folder with one <roll_no>_<name> sub folder per student, or a csv")
+    parser.add_argument("--db", default=db.DB_FILE, help="attendance db to enroll into")
+    parser.add_argument("--workers", type=int, default=0, help="encoding processes (0 = cores - 1)")
+    parser.add_argument("--update", action="store_true", help="re-encode students that are already enrolled")
+    parser.add_argument("--batch-size", type=int, default=WRITE_BATCH_SIZE, help="students per db transaction")
+    parser.add_argument("--report", help="write the report here (.json, or .csv for just the failures)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    db.DB_FILE = args.db
+    db.setup_database_tables_if_needed()
+    if not os.path.exists(args.source):
+        sys.exit(f"Could not find {args.source}")
+
+    entries, problems = load_import_entries(args.source)
+    print(f"{len(entries)} students in {args.source}")
+
+    def show_progress(done, total):
+        if done % PROGRESS_EVERY == 0 or done == total:
+            print(f"  {done}/{total} encoded")
+
+    report = import_students(entries, args.workers or None, args.update, args.batch_size, show_progress)
+    report["failures"][:0] = [{"roll_no": None, "path": where, "reason": reason} for where, reason in problems]
+    failures = report.pop("failures")
+    print(json.dumps(report, indent=2))
+    for failure in failures[:20]:
+        print(f"  {failure['roll_no']}  {failure['path']}: {failure['reason']}")
+    if len(failures) > 20:
+        print(f"  ... {len(failures) - 20} more failures")
+    report["failures"] = failures
+    if args.report:
+        write_report(report, args.report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+import pytest
+import database_ops as db
+
+# python -m pytest -q   (from this folder)
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_FILE", str(tmp_path / "attendance.db"))
+    db.setup_database_tables_if_needed()
+    yield db.DB_FILE
+    db.close_thread_connections()
@@ -1,31 +1,164 @@
 import sqlite3
 import numpy as np
-import pickle, warnings
-from datetime import datetime
+import pickle, threading, warnings
+from datetime import date, datetime, timedelta
+import encoding_store
+import running_encodings
+from db_connection import ConnectionManager, READ_ONLY_PRAGMAS
+
+DB_FILE = "attendance.db"
+SCHEMA_VERSION = 7
+REPORT_PAGE_SIZE = 200
+USE_ENCODING_SIDECAR = True  # keep attendance.encodings.* next to the db for instant recognition startup
+STUDENT_CHANGES_KEPT = 10000  # change feed rows kept, a recognizer further behind than that reloads everything
+
+# face encodings are stored as a small header + raw little endian floats (no pickle)
+# header: b"FE", format version, dtype code (b"f" float32 / b"e" float16)
+ENCODING_SIZE = 128
+ENCODING_MAGIC, ENCODING_FORMAT_VERSION, ENCODING_HEADER_SIZE = b"FE", 1, 4
+ENCODING_STORAGE_DTYPE = np.dtype("<f4")  # np.dtype("<f2") halves the size again, at a small precision cost
+_DTYPE_CODES = {b"f": np.dtype("<f4"), b"e": np.dtype("<f2")}
+_CODES_FOR_DTYPE = {dtype: code for code, dtype in _DTYPE_CODES.items()}
 
 
 # functions fr numpy arrays fr db
-def adapt_array(arr):
-    return pickle.dumps(arr)
+def adapt_array(arr, dtype=None):
+    dtype = ENCODING_STORAGE_DTYPE if dtype is None else np.dtype(dtype)
+    header = ENCODING_MAGIC + bytes([ENCODING_FORMAT_VERSION]) + _CODES_FOR_DTYPE[dtype]
+    return header + np.ascontiguousarray(arr, dtype=dtype).tobytes()
+
 
+def _encoding_dtype_from_header(blob):
+    if blob[:2] != ENCODING_MAGIC or blob[2] != ENCODING_FORMAT_VERSION or bytes(blob[3:4]) not in _DTYPE_CODES:
+        raise ValueError("Unknown face encoding format, run setup_database_tables_if_needed to migrate.")
+    return _DTYPE_CODES[bytes(blob[3:4])]
 
-def convert_array(text):
-    return pickle.loads(text)
+
+def convert_array(blob):
+    dtype = _encoding_dtype_from_header(blob)
+    return np.frombuffer(blob, dtype=dtype, offset=ENCODING_HEADER_SIZE).astype(np.float64)
 
 sqlite3.register_adapter(np.ndarray, adapt_array)
 sqlite3.register_converter("array", convert_array)
 
 
-def get_connection_to_database(db_file="attendance.db"):
+connection_manager = ConnectionManager()
+# threads that called use_read_only_connections() get these instead, same functions, mode=ro connections
+read_only_connection_manager = ConnectionManager(READ_ONLY_PRAGMAS, read_only=True)
+_thread_mode = threading.local()
+
+
+def use_read_only_connections():
+    # for reader threads (attendance_api), every fetch_* on this thread goes through a read-only connection
+    _thread_mode.read_only = True
+
+
+def get_connection_to_database(db_file=None):
+    # persistent per-thread connection (WAL), don't close it, hand it back with release_connection
     conn = None
     try:
-        conn = sqlite3.connect(db_file, detect_types=sqlite3.PARSE_DECLTYPES)
+        manager = read_only_connection_manager if getattr(_thread_mode, "read_only", False) else connection_manager
+        conn = manager.get(db_file or DB_FILE)
         return conn
     except sqlite3.Error as e:
         print(f"Database connection error: {e}")
     return conn
 
 
+def release_connection(conn):
+    connection_manager.release(conn)
+
+
+def close_thread_connections():
+    connection_manager.close_thread_connections()
+    read_only_connection_manager.close_thread_connections()
+
+
+def _migrate_pickled_encodings_to_binary(c):
+    # v1 dbs kept pickled float64 arrays, only ever unpickled here for the one-time conversion
+    rows = c.execute("SELECT roll_no, CAST(face_encoding AS BLOB) FROM students").fetchall()
+    converted = [(adapt_array(np.asarray(pickle.loads(blob), dtype=np.float64)), roll_no)
+                 for roll_no, blob in rows if blob[:2] != ENCODING_MAGIC]
+    c.executemany("UPDATE students SET face_encoding = ? WHERE roll_no = ?", converted)
+    return len(converted)
+
+
+def _add_unique_attendance_per_day(c):
+    # one record per student per day, keeps the earliest if older dbs logged duplicates
+    c.execute("""DELETE FROM attendance_records WHERE record_id NOT IN
+                 (SELECT MIN(record_id) FROM attendance_records GROUP BY roll_no, attendance_date)""")
+    c.execute("""CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_roll_no_date
+                 ON attendance_records(roll_no, attendance_date)""")
+
+
+def _add_report_indexes(c):
+    # date range paging walks this one, roll_no filters use the unique (roll_no, date) index,
+    # NOCASE so LIKE 'prefix%' name searches can use the index too
+    c.execute("CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance_records(attendance_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_students_name ON students(name COLLATE NOCASE)")
+
+
+def _add_student_change_feed(c):
+    # every insert / update / delete on students bumps the feed, whoever made it (gui, another process,
+    # sqlite shell). a running recognizer asks for the roll numbers changed since the id it last saw and
+    # re-reads only those rows
+    c.execute("""CREATE TABLE IF NOT EXISTS student_changes
+                 (change_id INTEGER PRIMARY KEY AUTOINCREMENT, roll_no INTEGER NOT NULL)""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS students_inserted AFTER INSERT ON students BEGIN
+                 INSERT INTO student_changes(roll_no) VALUES (NEW.roll_no); END""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS students_updated AFTER UPDATE ON students BEGIN
+                 INSERT INTO student_changes(roll_no) SELECT OLD.roll_no WHERE OLD.roll_no != NEW.roll_no;
+                 INSERT INTO student_changes(roll_no) VALUES (NEW.roll_no); END""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS students_deleted AFTER DELETE ON students BEGIN
+                 INSERT INTO student_changes(roll_no) VALUES (OLD.roll_no); END""")
+
+
+def _add_encoding_stats(c):
+    # running stats behind students.face_encoding (which stays the mean), see running_encodings.py
+    # students registered before this have no row, their encoding counts as INITIAL_SAMPLE_COUNT samples
+    c.execute("""CREATE TABLE IF NOT EXISTS student_encoding_stats
+                 (roll_no INTEGER PRIMARY KEY, sample_count INTEGER NOT NULL, prototypes BLOB,
+                  updated_at TEXT NOT NULL)""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS students_deleted_stats AFTER DELETE ON students BEGIN
+                 DELETE FROM student_encoding_stats WHERE roll_no = OLD.roll_no; END""")
+
+
+def _add_attendance_summaries(c):
+    # present count per day and days present per student per month, kept up to date by triggers so
+    # "attendance % this term" / "daily present count" never scan attendance_records
+    c.execute("""CREATE TABLE IF NOT EXISTS attendance_daily
+                 (attendance_date TEXT PRIMARY KEY, present INTEGER NOT NULL) WITHOUT ROWID""")
+    c.execute("""CREATE TABLE IF NOT EXISTS attendance_monthly
+                 (roll_no INTEGER NOT NULL, month TEXT NOT NULL, days_present INTEGER NOT NULL,
+                  PRIMARY KEY (month, roll_no)) WITHOUT ROWID""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_attendance_monthly_roll_no ON attendance_monthly(roll_no, month)")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS attendance_added AFTER INSERT ON attendance_records BEGIN
+                 INSERT INTO attendance_daily VALUES (NEW.attendance_date, 1)
+                     ON CONFLICT(attendance_date) DO UPDATE SET present = present + 1;
+                 INSERT INTO attendance_monthly VALUES (NEW.roll_no, substr(NEW.attendance_date, 1, 7), 1)
+                     ON CONFLICT(month, roll_no) DO UPDATE SET days_present = days_present + 1; END""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS attendance_removed AFTER DELETE ON attendance_records BEGIN
+                 UPDATE attendance_daily SET present = present - 1 WHERE attendance_date = OLD.attendance_date;
+                 UPDATE attendance_monthly SET days_present = days_present - 1
+                     WHERE month = substr(OLD.attendance_date, 1, 7) AND roll_no = OLD.roll_no; END""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS attendance_moved AFTER UPDATE OF roll_no, attendance_date
+                 ON attendance_records BEGIN
+                 UPDATE attendance_daily SET present = present - 1 WHERE attendance_date = OLD.attendance_date;
+                 UPDATE attendance_monthly SET days_present = days_present - 1
+                     WHERE month = substr(OLD.attendance_date, 1, 7) AND roll_no = OLD.roll_no;
+                 INSERT INTO attendance_daily VALUES (NEW.attendance_date, 1)
+                     ON CONFLICT(attendance_date) DO UPDATE SET present = present + 1;
+                 INSERT INTO attendance_monthly VALUES (NEW.roll_no, substr(NEW.attendance_date, 1, 7), 1)
+                     ON CONFLICT(month, roll_no) DO UPDATE SET days_present = days_present + 1; END""")
+    # what's already logged, once
+    c.execute("DELETE FROM attendance_daily")
+    c.execute("DELETE FROM attendance_monthly")
+    c.execute("""INSERT INTO attendance_daily SELECT attendance_date, COUNT(*) FROM attendance_records
+                 GROUP BY attendance_date""")
+    c.execute("""INSERT INTO attendance_monthly SELECT roll_no, substr(attendance_date, 1, 7), COUNT(*)
+                 FROM attendance_records GROUP BY 1, 2""")
+
+
 def setup_database_tables_if_needed():
     #setup table
     conn = get_connection_to_database()
@@ -79,34 +212,150 @@ def setup_database_tables_if_needed():
                          ) ON DELETE CASCADE
                 );""")
 
-            c.execute("PRAGMA user_version = 1")
             c.execute("PRAGMA user_version")
             db_version = c.fetchone()[0]
+            if db_version > SCHEMA_VERSION:
+                warnings.warn("Database was made by a newer version of this app.", UserWarning)
+
+            migrated_rows = 0
             if db_version < 2:
-                warnings.warn("Database schema might be outdated. Consider running migrations.", UserWarning)
+                migrated_rows = _migrate_pickled_encodings_to_binary(c)
+            if db_version < 3:
+                _add_unique_attendance_per_day(c)
+            if db_version < 4:
+                _add_report_indexes(c)
+            if db_version < 5:
+                _add_student_change_feed(c)
+            if db_version < 6:
+                _add_encoding_stats(c)
+            if db_version < 7:
+                _add_attendance_summaries(c)
+            # AUTOINCREMENT never hands out a trimmed id again, so a gap tells a recognizer it fell behind
+            c.execute("""DELETE FROM student_changes
+                         WHERE change_id <= (SELECT MAX(change_id) FROM student_changes) - ?""",
+                      (STUDENT_CHANGES_KEPT,))
+            c.execute(f"PRAGMA user_version = {max(db_version, SCHEMA_VERSION)}")
 
             conn.commit()
-        except sqlite3.Error as e:
+            if migrated_rows:
+                c.execute("VACUUM")  # give back the space the pickles used
+        except (sqlite3.Error, pickle.UnpicklingError, ValueError) as e:
             print(f"Error creating tables: {e}")
         finally:
-            conn.close()
+            release_connection(conn)
+
+
+def _sidecar_change_id_after(roll_no):
+    # feed id the sidecar reflects once roll_no's change is written into it, None when the sidecar was
+    # already behind on somebody else (an edit made outside this module) and has to be rebuilt instead
+    table = encoding_store.read_table(DB_FILE)
+    if table is None or table.get("change_id") is None:
+        return None
+    conn = get_connection_to_database()
+    try:
+        latest, others, oldest = conn.execute("""SELECT MAX(change_id), COUNT(NULLIF(roll_no, ?)),
+                                                        (SELECT MIN(change_id) FROM student_changes)
+                                                 FROM student_changes WHERE change_id > ?""",
+                                              (roll_no, table["change_id"])).fetchone()
+    finally:
+        release_connection(conn)
+    if others or (oldest is not None and oldest > table["change_id"] + 1):  # trimmed past it, can't tell
+        return None
+    return latest if latest is not None else table["change_id"]
+
 
+def _sync_encoding_sidecar(change, roll_no, *args):
+    if not USE_ENCODING_SIDECAR:
+        return
+    try:
+        change_id = _sidecar_change_id_after(roll_no)
+        if change_id is None:
+            encoding_store.discard_encoding_store(DB_FILE)  # rebuilt from the db on next recognition start
+            return
+        change(DB_FILE, roll_no, *args, change_id=change_id)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        # db already committed, drop the sidecar so it gets rebuilt instead of going stale
+        print(f"Couldn't update encoding store: {e}")
+        encoding_store.discard_encoding_store(DB_FILE)
+
+
+UPSERT_ENCODING_STATS_SQL = ''' INSERT INTO student_encoding_stats(roll_no, sample_count, prototypes, updated_at) \
+                               VALUES (?, ?, ?, ?) \
+                               ON CONFLICT(roll_no) DO UPDATE SET sample_count = excluded.sample_count, \
+                                   prototypes = excluded.prototypes, updated_at = excluded.updated_at '''
+
+
+def _encoding_stats_row(roll_no, stats):
+    return roll_no, stats.sample_count, adapt_array(stats.prototypes), datetime.now().isoformat(timespec="seconds")
 
-def save_new_student_to_db(roll_no, name, face_encoding):
+
+def _decode_prototypes(blob):
+    if blob is None:
+        return np.empty((0, ENCODING_SIZE))
+    dtype = _encoding_dtype_from_header(blob)
+    return np.frombuffer(blob, dtype=dtype, offset=ENCODING_HEADER_SIZE).astype(np.float64).reshape(-1, ENCODING_SIZE)
+
+
+def save_new_student_to_db(roll_no, name, face_encoding, sample_encodings=None):
+    # sample_encodings: the frames face_encoding was averaged from, they start the student's running stats
     conn = get_connection_to_database()
     sql = ''' INSERT INTO students(roll_no, name, face_encoding) \
               VALUES (?, ?, ?) '''
     try:
         c = conn.cursor()
         c.execute(sql, (roll_no, name, face_encoding))
+        if sample_encodings is not None and len(sample_encodings):
+            stats = running_encodings.stats_from_samples(sample_encodings, face_encoding)
+            c.execute(UPSERT_ENCODING_STATS_SQL, _encoding_stats_row(roll_no, stats))
         conn.commit()
+        _sync_encoding_sidecar(encoding_store.add_student, roll_no, name, face_encoding)
         return True
     except sqlite3.Error:
         # integrity error chk
         return False
     finally:
-        if conn:
-            conn.close()
+        release_connection(conn)
+
+
+def save_students_batch(students, replace_existing=False):
+    # bulk enrollment: [(roll_no, name, face_encoding)] in one transaction -> rows written, None on error
+    # roll numbers that already exist are left alone unless replace_existing
+    conn = get_connection_to_database()
+    on_conflict = "DO UPDATE SET name = excluded.name, face_encoding = excluded.face_encoding" \
+        if replace_existing else "DO NOTHING"
+    students = list(students)
+    try:
+        c = conn.cursor()
+        c.executemany(f"INSERT INTO students(roll_no, name, face_encoding) VALUES (?, ?, ?) "
+                      f"ON CONFLICT(roll_no) {on_conflict}", students)
+        written = c.rowcount
+        if replace_existing:
+            # replaced encodings start over, like update_face_data_for_student, not folded into old stats
+            c.executemany("DELETE FROM student_encoding_stats WHERE roll_no = ?",
+                          [(student[0],) for student in students])
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"Error saving students: {e}")
+        return None
+    finally:
+        release_connection(conn)
+    if USE_ENCODING_SIDECAR and written:
+        # one rebuild on next recognition start beats rewriting the sidecar per student
+        encoding_store.discard_encoding_store(DB_FILE)
+    return written
+
+
+def fetch_registered_roll_nos():
+    # set of every enrolled roll number, None on error
+    conn = get_connection_to_database()
+    try:
+        return {row[0] for row in conn.execute("SELECT roll_no FROM students")}
+    except sqlite3.Error as e:
+        print(f"Couldn't load roll numbers: {e}")
+        return None
+    finally:
+        release_connection(conn)
 
 
 def update_face_data_for_student(roll_no, face_encoding):
@@ -118,14 +367,53 @@ def update_face_data_for_student(roll_no, face_encoding):
     try:
         c = conn.cursor()
         c.execute(sql, (face_encoding, roll_no))
+        c.execute("DELETE FROM student_encoding_stats WHERE roll_no = ?", (roll_no,))  # replaced, not folded in
         conn.commit()
+        _sync_encoding_sidecar(encoding_store.update_student, roll_no, face_encoding)
         return True
     except sqlite3.Error as e:
         print(f"Error updating student face data: {e}")
         return False
     finally:
-        if conn:
-            conn.close()
+        release_connection(conn)
+
+
+def fold_encodings_into_students(samples_by_roll_no, restart_if_far=True):
+    # {roll_no: [new encodings]} folded into each student's running stats, one transaction for all
+    # -> number of students updated, None on error. only the stored mean and stats are read, never old frames
+    conn = get_connection_to_database()
+    updated = []
+    try:
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")  # read and write under one lock, two folds can't lose each other's samples
+        for roll_no, encodings in samples_by_roll_no.items():
+            if not len(encodings):
+                continue
+            row = c.execute("""SELECT CAST(s.face_encoding AS BLOB), st.sample_count, st.prototypes
+                               FROM students s LEFT JOIN student_encoding_stats st ON st.roll_no = s.roll_no
+                               WHERE s.roll_no = ?""", (roll_no,)).fetchone()
+            if row is None:
+                continue  # deleted since the samples were taken
+            mean = convert_array(row[0])
+            prototypes = _decode_prototypes(row[2]) if row[2] is not None else mean[None, :]
+            stats = running_encodings.EncodingStats(row[1] or running_encodings.INITIAL_SAMPLE_COUNT, mean,
+                                                    prototypes)
+            stats = running_encodings.fold_in(stats, encodings, restart_if_far)
+            c.execute("UPDATE students SET face_encoding = ? WHERE roll_no = ?", (stats.mean, roll_no))
+            c.execute(UPSERT_ENCODING_STATS_SQL, _encoding_stats_row(roll_no, stats))
+            updated.append((roll_no, stats.mean))
+        conn.commit()
+    except (sqlite3.Error, ValueError) as e:
+        conn.rollback()
+        print(f"Error updating student encodings: {e}")
+        return None
+    finally:
+        release_connection(conn)
+    if len(updated) == 1:
+        _sync_encoding_sidecar(encoding_store.update_student, *updated[0])
+    elif updated and USE_ENCODING_SIDECAR:
+        encoding_store.discard_encoding_store(DB_FILE)  # one rebuild instead of a new generation per student
+    return len(updated)
 
 
 def delete_student_from_db(roll_no):
@@ -135,13 +423,31 @@ def delete_student_from_db(roll_no):
         c = conn.cursor()
         c.execute(sql, (roll_no,))
         conn.commit()
+        _sync_encoding_sidecar(encoding_store.remove_student, roll_no)
         return True
     except sqlite3.Error as e:
         print(f"Error deleting student: {e}")
         return False
     finally:
-        if conn:
-            conn.close()
+        release_connection(conn)
+
+
+def delete_students_from_db(roll_nos):
+    # multi-select delete, one transaction for all of them -> rows deleted, None on error
+    conn = get_connection_to_database()
+    try:
+        c = conn.cursor()
+        c.executemany("DELETE FROM students WHERE roll_no = ?", [(roll_no,) for roll_no in roll_nos])
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"Error deleting students: {e}")
+        return None
+    finally:
+        release_connection(conn)
+    if USE_ENCODING_SIDECAR and c.rowcount:
+        encoding_store.discard_encoding_store(DB_FILE)  # rebuilt once on next recognition start
+    return c.rowcount
 
 
 def load_all_registered_students_from_db():
@@ -156,34 +462,172 @@ def load_all_registered_students_from_db():
     except sqlite3.Error as e:
         print(f"Couldn't load students from DB: {e}")
     finally:
-        if conn:
-            conn.close()
+        release_connection(conn)
     return students_data
 
 
-def log_student_attendance(roll_no):
+def _decode_encoding_blobs(blobs, out):
+    if not blobs:
+        return out
+    dtype = _encoding_dtype_from_header(blobs[0])
+    row_size = ENCODING_HEADER_SIZE + ENCODING_SIZE * dtype.itemsize
+    packed = b"".join(blobs)
+    if len(packed) == row_size * len(blobs):
+        # usual case, every row has the same header -> one strided view over all of them
+        headers = np.ndarray((len(blobs), ENCODING_HEADER_SIZE), np.uint8, packed, 0, (row_size, 1))
+        if (headers == headers[0]).all():
+            out[:] = np.ndarray(out.shape, dtype, packed, ENCODING_HEADER_SIZE, (row_size, dtype.itemsize))
+            return out
+    for i, blob in enumerate(blobs):  # mixed float16 / float32 rows
+        out[i] = np.frombuffer(blob, dtype=_encoding_dtype_from_header(blob), offset=ENCODING_HEADER_SIZE)
+    return out
+
+
+def load_student_encoding_matrix_from_db(dtype=np.float32):
+    # bulk load for recognition: (info list, (n, 128) matrix), blobs copied straight into one array
     conn = get_connection_to_database()
-    now = datetime.now()
-    today_date_str, current_time_str = now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S")
+    student_info, encodings = [], np.empty((0, ENCODING_SIZE), dtype=dtype)
+    try:
+        c = conn.cursor()
+        rows = c.execute("SELECT roll_no, name, CAST(face_encoding AS BLOB) FROM students").fetchall()
+        encodings = np.empty((len(rows), ENCODING_SIZE), dtype=dtype)
+        _decode_encoding_blobs([row[2] for row in rows], encodings)
+        student_info = [{"roll_no": row[0], "name": row[1]} for row in rows]
+    except (sqlite3.Error, ValueError) as e:
+        print(f"Couldn't load students from DB: {e}")
+        student_info, encodings = [], np.empty((0, ENCODING_SIZE), dtype=dtype)
+    finally:
+        release_connection(conn)
+    return student_info, encodings
+
 
+def fetch_student_change_range():
+    # (oldest, latest) change id still in the feed, (None, None) while it's empty, None on error
+    conn = get_connection_to_database()
+    try:
+        return tuple(conn.execute("SELECT MIN(change_id), MAX(change_id) FROM student_changes").fetchone())
+    except sqlite3.Error as e:
+        print(f"Couldn't read student changes: {e}")
+        return None
+    finally:
+        release_connection(conn)
+
+
+def fetch_student_changes(after_id, up_to_id):
+    # current state of every student changed in (after_id, up_to_id]: [(roll_no, name, encoding)],
+    # name and encoding are None for students that no longer exist. None on error
+    conn = get_connection_to_database()
+    try:
+        rows = conn.execute("""SELECT changed.roll_no, s.name, CAST(s.face_encoding AS BLOB)
+                               FROM (SELECT DISTINCT roll_no FROM student_changes
+                                     WHERE change_id > ? AND change_id <= ?) changed
+                               LEFT JOIN students s ON s.roll_no = changed.roll_no""",
+                            (after_id, up_to_id)).fetchall()
+        present = [row for row in rows if row[2] is not None]
+        encodings = _decode_encoding_blobs([row[2] for row in present],
+                                           np.empty((len(present), ENCODING_SIZE), dtype=np.float32))
+        changes = [(row[0], row[1], encoding) for row, encoding in zip(present, encodings)]
+        return changes + [(row[0], None, None) for row in rows if row[2] is None]
+    except (sqlite3.Error, ValueError) as e:
+        print(f"Couldn't read student changes: {e}")
+        return None
+    finally:
+        release_connection(conn)
+
+
+def count_registered_students():
+    conn = get_connection_to_database()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM students").fetchone()[0]
+    except sqlite3.Error as e:
+        print(f"Couldn't count students: {e}")
+        return 0
+    finally:
+        release_connection(conn)
+
+
+def load_student_encodings_with_change_id():
+    # (info list, encodings, change id) straight from the db, the id is read first so a change landing
+    # during the load is replayed by the gallery watcher rather than missed. id None if the feed is unreadable
+    change_range = fetch_student_change_range()
+    student_info, encodings = load_student_encoding_matrix_from_db()
+    return student_info, encodings, (change_range[1] or 0) if change_range is not None else None
+
+
+def load_student_encodings_from_sidecar():
+    # zero-copy (info list, read-only memmap, change id), rebuilt from the db if missing or out of sync
+    # in sync = stamped with the newest student_changes id, so edits made outside this module (same row
+    # count, different encodings / names) are caught too. the id is read before the rebuild loads the
+    # students, a change landing in between leaves the store looking behind and it's rebuilt next time.
+    # the change id returned is the one the encodings were checked against (the gallery watcher's start)
+    change_range = fetch_student_change_range()
+    if change_range is None:
+        return load_student_encodings_with_change_id()
+    latest = change_range[1] or 0
+    table = encoding_store.read_table(DB_FILE)
+    if table is None or table.get("change_id") != latest:
+        try:
+            encoding_store.rebuild_encoding_store(DB_FILE, *load_student_encoding_matrix_from_db(), change_id=latest)
+        except OSError as e:
+            print(f"Couldn't write encoding store, loading from db instead: {e}")
+            return load_student_encodings_with_change_id()
+        table = encoding_store.read_table(DB_FILE)
+    store = encoding_store.open_encoding_store(DB_FILE, table) if table is not None else None
+    if store is None:
+        return load_student_encodings_with_change_id()
+    return store[0], store[1], table.get("change_id")
+
+
+INSERT_ATTENDANCE_SQL = ''' INSERT INTO attendance_records(roll_no, attendance_date, attendance_time) \
+                           VALUES (?, ?, ?) ON CONFLICT(roll_no, attendance_date) DO NOTHING '''
+
+
+def attendance_row_for(roll_no, when=None):
+    when = when or datetime.now()
+    return roll_no, when.strftime("%Y-%m-%d"), when.strftime("%H:%M:%S")
+
+
+def log_student_attendance(roll_no):
+    conn = get_connection_to_database()
     try:
         c = conn.cursor()
-        c.execute("SELECT * FROM attendance_records WHERE roll_no = ? AND attendance_date = ?",
-                  (roll_no, today_date_str))
-        if c.fetchone() is None:
-            #ins new record
-            sql = ''' INSERT INTO attendance_records(roll_no, attendance_date, attendance_time) \
-                      VALUES (?, ?, ?) '''
-            c.execute(sql, (roll_no, today_date_str, current_time_str))
-            conn.commit()
-            return True
-        else:
-            return False
+        # unique (roll_no, date) index does the already-marked check
+        c.execute(INSERT_ATTENDANCE_SQL, attendance_row_for(roll_no))
+        conn.commit()
+        return c.rowcount == 1
     except sqlite3.Error as e:
         print(f"Error logging attendance: {e}")
     finally:
-        if conn:
-            conn.close()
+        release_connection(conn)
+
+
+def log_attendance_batch(attendance_rows):
+    # [(roll_no, date, time), ...] in one transaction, returns how many were new
+    conn = get_connection_to_database()
+    try:
+        # rowcount, not total_changes: the summary triggers' writes would count too
+        c = conn.executemany(INSERT_ATTENDANCE_SQL, attendance_rows)
+        conn.commit()
+        return c.rowcount
+    except sqlite3.Error as e:
+        print(f"Error logging attendance batch: {e}")
+        return None
+    finally:
+        release_connection(conn)
+
+
+def fetch_roll_nos_marked_on(attendance_date):
+    # set of roll numbers with a record on attendance_date ("YYYY-MM-DD"), None on error
+    conn = get_connection_to_database()
+    try:
+        c = conn.cursor()
+        c.execute("SELECT roll_no FROM attendance_records WHERE attendance_date = ?", (attendance_date,))
+        return {row[0] for row in c.fetchall()}
+    except sqlite3.Error as e:
+        print(f"Couldn't load today's attendance: {e}")
+        return None
+    finally:
+        release_connection(conn)
 
 
 def fetch_full_attendance_report():
@@ -201,5 +645,178 @@ def fetch_full_attendance_report():
         print(f"Error fetching report: {e}")
         return []
     finally:
-        if conn:
-            conn.close()
\ No newline at end of file
+        release_connection(conn)
+
+
+def _escape_like(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def fetch_attendance_report_page(after=None, page_size=REPORT_PAGE_SIZE, date_from=None, date_to=None, roll_no=None,
+                                 name_prefix=None):
+    # newest first, keyset paged: pass the returned cursor back as `after` for the next page
+    # returns (rows, cursor), cursor is None once there is nothing left
+    conditions, params = [], []
+    if after is not None:
+        conditions.append("(ar.attendance_date, ar.record_id) < (?, ?)")
+        params.extend(after)
+    if date_from:
+        conditions.append("ar.attendance_date >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append("ar.attendance_date <= ?")
+        params.append(date_to)
+    if roll_no is not None:
+        conditions.append("ar.roll_no = ?")
+        params.append(roll_no)
+    if name_prefix:
+        conditions.append("s.name LIKE ? ESCAPE '\\'")
+        params.append(_escape_like(name_prefix) + "%")
+
+    sql = f"""SELECT ar.record_id, ar.roll_no, s.name, ar.attendance_date, ar.attendance_time
+              FROM attendance_records ar
+                       JOIN students s ON ar.roll_no = s.roll_no
+              {"WHERE " + " AND ".join(conditions) if conditions else ""}
+              ORDER BY ar.attendance_date DESC, ar.record_id DESC
+              LIMIT ?"""
+    conn = get_connection_to_database()
+    try:
+        rows = conn.execute(sql, params + [page_size]).fetchall()
+    except sqlite3.Error as e:
+        print(f"Error fetching report page: {e}")
+        return [], None
+    finally:
+        release_connection(conn)
+
+    cursor = (rows[-1][3], rows[-1][0]) if len(rows) == page_size else None
+    return [row[1:] for row in rows], cursor
+
+
+def fetch_student_page(after=None, page_size=REPORT_PAGE_SIZE, search=None):
+    # roll_no + name only, encodings are never read. roll_no order, keyset paged like the report
+    # search: a number finds that roll_no, anything else is a name prefix (idx_students_name, NOCASE)
+    # returns (rows, cursor), cursor is None once there is nothing left
+    conditions, params = [], []
+    if after is not None:
+        conditions.append("roll_no > ?")
+        params.append(after)
+    search = (search or "").strip()
+    if search.isdigit():
+        conditions.append("roll_no = ?")
+        params.append(int(search))
+    elif search:
+        conditions.append("name LIKE ? ESCAPE '\\'")
+        params.append(_escape_like(search) + "%")
+
+    sql = f"""SELECT roll_no, name FROM students
+              {"WHERE " + " AND ".join(conditions) if conditions else ""}
+              ORDER BY roll_no
+              LIMIT ?"""
+    conn = get_connection_to_database()
+    try:
+        rows = conn.execute(sql, params + [page_size]).fetchall()
+    except sqlite3.Error as e:
+        print(f"Error fetching students: {e}")
+        return [], None
+    finally:
+        release_connection(conn)
+    return rows, (rows[-1][0] if len(rows) == page_size else None)
+
+
+def _summary_split(date_from, date_to):
+    # date range -> (first, last) whole month covered ("YYYY-MM", None = open end) or None, plus the
+    # leftover day ranges at the edges that have to be counted from attendance_records
+    start = date.fromisoformat(date_from) if date_from else None
+    end = date.fromisoformat(date_to) if date_to else None
+    first_whole = start if start is None or start.day == 1 else \
+        (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    last_whole_end = end if end is None or (end + timedelta(days=1)).day == 1 else \
+        end.replace(day=1) - timedelta(days=1)
+    if first_whole is not None and last_whole_end is not None and first_whole > last_whole_end:
+        return None, [(date_from, date_to)]
+    edges = []
+    if start is not None and start < first_whole:
+        edges.append((date_from, (first_whole - timedelta(days=1)).isoformat()))
+    if end is not None and last_whole_end < end:
+        edges.append(((last_whole_end + timedelta(days=1)).isoformat(), date_to))
+    months = (first_whole.strftime("%Y-%m") if first_whole else None,
+              last_whole_end.strftime("%Y-%m") if last_whole_end else None)
+    return months, edges
+
+
+def _range_condition(column, low, high, *extra):
+    # WHERE clause for low <= column <= high (either end may be None) plus any extra conditions
+    # extra conditions go last, after the range's params, so their own params can simply be appended
+    conditions, params = [], []
+    if low is not None:
+        conditions.append(f"{column} >= ?")
+        params.append(low)
+    if high is not None:
+        conditions.append(f"{column} <= ?")
+        params.append(high)
+    conditions.extend(extra)
+    return ("WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+
+def fetch_days_present_per_student(date_from=None, date_to=None, roll_no=None):
+    # {roll_no: days present} in [date_from, date_to] ("YYYY-MM-DD", None = open), None on error
+    # whole months come from attendance_monthly, only the partial months at the edges touch the records
+    months, edges = _summary_split(date_from, date_to)
+    student_filter = " AND roll_no = ?" if roll_no is not None else ""
+    student_param = [roll_no] if roll_no is not None else []
+    conn = get_connection_to_database()
+    days_present = {}
+    try:
+        if months is not None:
+            where, params = _range_condition("month", *months, *(["roll_no = ?"] if roll_no is not None else []))
+            for student, days in conn.execute(f"SELECT roll_no, SUM(days_present) FROM attendance_monthly {where} "
+                                              f"GROUP BY roll_no", params + student_param):
+                days_present[student] = days
+        for low, high in edges:
+            for student, days in conn.execute(f"""SELECT roll_no, COUNT(*) FROM attendance_records
+                                                  WHERE attendance_date BETWEEN ? AND ?{student_filter}
+                                                  GROUP BY roll_no""", [low, high] + student_param):
+                days_present[student] = days_present.get(student, 0) + days
+        return {student: days for student, days in days_present.items() if days > 0}
+    except sqlite3.Error as e:
+        print(f"Error fetching attendance summary: {e}")
+        return None
+    finally:
+        release_connection(conn)
+
+
+def fetch_daily_present_counts(date_from=None, date_to=None):
+    # [(date, students present)] oldest first, days nobody came in are left out. None on error
+    where, params = _range_condition("attendance_date", date_from, date_to, "present > 0")
+    conn = get_connection_to_database()
+    try:
+        return conn.execute(f"SELECT attendance_date, present FROM attendance_daily {where} ORDER BY attendance_date",
+                            params).fetchall()
+    except sqlite3.Error as e:
+        print(f"Error fetching daily counts: {e}")
+        return None
+    finally:
+        release_connection(conn)
+
+
+def fetch_monthly_attendance(roll_no):
+    # [(month, days present)] for one student, oldest first. None on error
+    conn = get_connection_to_database()
+    try:
+        return conn.execute("""SELECT month, days_present FROM attendance_monthly
+                               WHERE roll_no = ? AND days_present > 0 ORDER BY month""", (roll_no,)).fetchall()
+    except sqlite3.Error as e:
+        print(f"Error fetching monthly attendance: {e}")
+        return None
+    finally:
+        release_connection(conn)
+
+
+def iter_attendance_report(page_size=REPORT_PAGE_SIZE, **filters):
+    # streams the whole (filtered) report one page at a time, memory stays at one page
+    cursor = None
+    while True:
+        rows, cursor = fetch_attendance_report_page(cursor, page_size, **filters)
+        yield from rows
+        if cursor is None:
+            return
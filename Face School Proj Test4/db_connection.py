@@ -0,0 +1,59 @@
+import os, sqlite3, threading
+from urllib.request import pathname2url
+
+# persistent sqlite connections, one per thread per db file
+# sqlite connections can't be shared between threads, so the gui thread and the recognition
+# worker each get their own, and WAL lets the worker write while the gui is reading
+
+DEFAULT_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",  # safe with WAL, only fsyncs on checkpoint
+    "PRAGMA cache_size = -16000",  # ~16 MB page cache per connection
+    "PRAGMA temp_store = MEMORY",
+)
+# readers (the local api) open the file with mode=ro, a bug there can't touch attendance. WAL lets them
+# read while the recognizer writes, they never take the write lock
+READ_ONLY_PRAGMAS = (
+    "PRAGMA query_only = ON",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA temp_store = MEMORY",
+)
+BUSY_TIMEOUT_SECONDS = 10
+
+
+class ConnectionManager:
+    def __init__(self, pragmas=DEFAULT_PRAGMAS, detect_types=sqlite3.PARSE_DECLTYPES, read_only=False):
+        self.pragmas, self.detect_types, self.read_only = pragmas, detect_types, read_only
+        self._local = threading.local()
+
+    def _thread_connections(self):
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        return connections
+
+    def get(self, db_file):
+        path = os.path.abspath(db_file)
+        connections = self._thread_connections()
+        conn = connections.get(path)
+        if conn is None:
+            if self.read_only:
+                conn = sqlite3.connect(f"file:{pathname2url(path)}?mode=ro", uri=True, detect_types=self.detect_types,
+                                       timeout=BUSY_TIMEOUT_SECONDS)
+            else:
+                conn = sqlite3.connect(path, detect_types=self.detect_types, timeout=BUSY_TIMEOUT_SECONDS)
+            for pragma in self.pragmas:
+                conn.execute(pragma)
+            connections[path] = conn
+        return conn
+
+    def release(self, conn):
+        # called after every db op instead of close(), drops whatever the op didn't commit
+        if conn is not None and conn.in_transaction:
+            conn.rollback()
+
+    def close_thread_connections(self):
+        # worker threads call this before they exit
+        for conn in self._thread_connections().values():
+            conn.close()
+        self._local.connections = {}
@@ -0,0 +1,255 @@
+import glob, json, os, re, threading
+from collections.abc import Sequence
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+    import msvcrt
+
+# sidecar copy of every student's encoding next to the db, opened zero-copy with np.memmap
+#   attendance.encodings.json                   -> format, generation, count, change_id
+#   attendance.encodings.<generation>.npy       -> float32 (capacity, 128) encodings
+#   attendance.encodings.<generation>.info.npy  -> (roll_no, name) per encoding row
+# rows past count are spare. new students go into spare rows in place, updates/deletes write a
+# new generation so a recognizer that already mapped the old files keeps a consistent snapshot
+# (windows can't replace a file while it's mapped anyway). generation numbers are never reused, not
+# even after a discard, and a generation's files are written under a temp name and moved in place
+# writers hold attendance.encodings.lock, so two processes (server workers, a bulk import) take turns
+# change_id is the db's student_changes id the store reflects, database_ops rebuilds the store when the
+# feed has moved past it in ways it didn't write itself (an UPDATE from another tool, a restored db)
+
+STORE_FORMAT_VERSION = 1
+ENCODING_SIZE = 128
+MIN_CAPACITY = 64
+NAME_BYTES = 96  # names are display only here, the full name stays in the db
+INFO_DTYPE = np.dtype([("roll_no", "<i8"), ("name", f"S{NAME_BYTES}")])
+
+_store_lock = threading.Lock()  # our own threads wait here instead of polling the file lock
+
+
+class StudentInfoTable(Sequence):
+    # {"roll_no", "name"} per row, decoded from the mapped table only when a row is looked at
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return StudentInfoTable(self.rows[index])
+        row = self.rows[index]
+        return {"roll_no": int(row["roll_no"]), "name": row["name"].decode("utf-8", "ignore")}
+
+
+def _base_path(db_file):
+    return os.path.splitext(os.path.abspath(db_file))[0] + ".encodings"
+
+
+def _table_path(db_file):
+    return _base_path(db_file) + ".json"
+
+
+def _matrix_path(db_file, generation):
+    return f"{_base_path(db_file)}.{generation}.npy"
+
+
+def _info_path(db_file, generation):
+    return f"{_base_path(db_file)}.{generation}.info.npy"
+
+
+def _lock_path(db_file):
+    return _base_path(db_file) + ".lock"
+
+
+@contextmanager
+def _writer_lock(db_file):
+    # one writer at a time across threads and processes, released when the file is closed
+    with _store_lock, open(_lock_path(db_file), "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            yield
+            return
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # gives up after ~10 s, so try again
+                break
+            except OSError:
+                pass
+        try:
+            yield
+        finally:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def read_table(db_file):
+    try:
+        with open(_table_path(db_file), "r", encoding="utf-8") as f:
+            table = json.load(f)
+    except (OSError, ValueError):
+        return None
+    generation = table.get("generation")
+    if table.get("format") != STORE_FORMAT_VERSION or not os.path.exists(_info_path(db_file, generation)):
+        return None
+    return table
+
+
+def _write_table(db_file, table):
+    tmp_path = _table_path(db_file) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(table, f)
+    os.replace(tmp_path, _table_path(db_file))
+
+
+def _next_generation(db_file, old_table):
+    # past both the table and every generation still on disk, a discard deletes the table but a
+    # recognizer may still have the files of the generation it pointed at mapped
+    generations = [(old_table or {}).get("generation", 0)]
+    for path in glob.glob(_base_path(db_file) + ".*.npy"):
+        match = re.search(r"\.(\d+)\.npy$", path)
+        if match:
+            generations.append(int(match.group(1)))
+    return max(generations) + 1
+
+
+def _write_new_file(path, dtype, shape, rows):
+    # written under a temp name and moved in place, an existing file is never opened for writing
+    tmp_path = path + ".tmp"
+    array = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+    array[:len(rows)] = rows
+    array.flush()
+    del array
+    os.replace(tmp_path, path)
+
+
+def _remove_old_generations(db_file, current_generation):
+    keep = {_matrix_path(db_file, current_generation), _info_path(db_file, current_generation)}
+    for path in glob.glob(_base_path(db_file) + ".*.npy"):
+        if os.path.abspath(path) not in keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # still mapped by a running recognizer, next write cleans it up
+
+
+def _info_rows(roll_nos, names):
+    rows = np.zeros(len(roll_nos), dtype=INFO_DTYPE)
+    rows["roll_no"] = roll_nos
+    rows["name"] = [_name_bytes(name) for name in names]
+    return rows
+
+
+def _name_bytes(name):
+    # cut on a character boundary so decoding never fails
+    return name.encode("utf-8")[:NAME_BYTES].decode("utf-8", "ignore").encode("utf-8")
+
+
+def _write_generation(db_file, old_table, info_rows, encodings, capacity, change_id):
+    generation = _next_generation(db_file, old_table)
+    capacity = max(capacity, len(encodings), MIN_CAPACITY)
+    _write_new_file(_matrix_path(db_file, generation), np.float32, (capacity, ENCODING_SIZE), encodings)
+    _write_new_file(_info_path(db_file, generation), INFO_DTYPE, (capacity,), info_rows)
+    # table goes last, until it's replaced everyone still sees the previous generation
+    _write_table(db_file, {"format": STORE_FORMAT_VERSION, "generation": generation, "count": len(info_rows),
+                           "change_id": change_id})
+    _remove_old_generations(db_file, generation)
+
+
+def _open_generation(db_file, table, mode="r"):
+    matrix = np.load(_matrix_path(db_file, table["generation"]), mmap_mode=mode)
+    info = np.load(_info_path(db_file, table["generation"]), mmap_mode=mode)
+    return matrix, info
+
+
+def open_encoding_store(db_file, table=None):
+    # (StudentInfoTable, read-only (count, 128) memmap) or None if there is no usable sidecar
+    # table: one read_table already returned, so the caller opens exactly the generation it checked
+    table = table or read_table(db_file)
+    if table is None:
+        return None
+    try:
+        matrix, info = _open_generation(db_file, table)
+    except (OSError, ValueError) as e:
+        print(f"Couldn't open encoding store: {e}")
+        return None
+    return StudentInfoTable(info[:table["count"]]), matrix[:table["count"]]
+
+
+def rebuild_encoding_store(db_file, student_info, encodings, change_id=None):
+    with _writer_lock(db_file):
+        info_rows = _info_rows([s["roll_no"] for s in student_info], [s["name"] for s in student_info])
+        _write_generation(db_file, read_table(db_file), info_rows, encodings, len(encodings) + len(encodings) // 4,
+                          change_id)
+
+
+# add / update / remove: change_id is the feed id the store reflects once this change is in
+
+def add_student(db_file, roll_no, name, encoding, change_id=None):
+    with _writer_lock(db_file):
+        table = read_table(db_file)
+        if table is None:
+            return False  # no sidecar yet, it gets built from the db on next recognition start
+        count = table["count"]
+        matrix, info = _open_generation(db_file, table, mode="r+")
+        if count < len(matrix):
+            # spare row past everyone's count, safe to fill in place
+            matrix[count] = encoding
+            info[count] = _info_rows([roll_no], [name])[0]
+            matrix.flush()
+            info.flush()
+            del matrix, info
+            table["count"], table["change_id"] = count + 1, change_id
+            _write_table(db_file, table)
+        else:
+            encodings = np.vstack([matrix[:count], np.asarray(encoding, dtype=np.float32)[None, :]])
+            info_rows = np.concatenate([info[:count], _info_rows([roll_no], [name])])
+            del matrix, info
+            _write_generation(db_file, table, info_rows, encodings, 2 * len(encodings), change_id)
+        return True
+
+
+def _copy_current_generation(db_file, table, roll_no):
+    # (encodings copy, info copy, row of roll_no) or None if the student isn't in the store
+    matrix, info = _open_generation(db_file, table)
+    rows = np.flatnonzero(info["roll_no"][:table["count"]] == roll_no)
+    if len(rows) == 0:
+        return None
+    return np.array(matrix[:table["count"]]), np.array(info[:table["count"]]), rows[0]
+
+
+def update_student(db_file, roll_no, encoding, change_id=None):
+    with _writer_lock(db_file):
+        table = read_table(db_file)
+        current = _copy_current_generation(db_file, table, roll_no) if table else None
+        if current is None:
+            return False
+        encodings, info_rows, row = current
+        encodings[row] = encoding
+        _write_generation(db_file, table, info_rows, encodings, len(encodings) * 5 // 4, change_id)
+        return True
+
+
+def remove_student(db_file, roll_no, change_id=None):
+    with _writer_lock(db_file):
+        table = read_table(db_file)
+        current = _copy_current_generation(db_file, table, roll_no) if table else None
+        if current is None:
+            return False
+        encodings, info_rows, row = current
+        _write_generation(db_file, table, np.delete(info_rows, row), np.delete(encodings, row, axis=0),
+                          len(encodings) * 5 // 4, change_id)
+        return True
+
+
+def discard_encoding_store(db_file):
+    # used when the sidecar can't be kept in sync, forces a rebuild on next open
+    with _writer_lock(db_file):
+        try:
+            os.remove(_table_path(db_file))
+        except OSError:
+            pass
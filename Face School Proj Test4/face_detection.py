@@ -0,0 +1,127 @@
+import os
+import cv2
+import face_recognition
+from pipeline_metrics import recognition_metrics
+
+# detection stage for recognition, all detectors take a full size BGR frame and return
+# (top, right, bottom, left) boxes in full frame coordinates
+#   hog             - dlib HOG on the whole frame downscaled (what recognition always did)
+#   cascade-gate    - haar cascade on a half size gray frame first, HOG only runs when it sees a face
+#   cascade-regions - haar proposals are cropped out of the full frame and HOG runs on each crop at a
+#                     resolution where the face is big enough, so far away faces aren't lost to the 0.25x
+#                     downscale and empty frames cost one cascade pass
+
+CASCADE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "haarcascade_frontalface_default.xml")
+DETECTION_MODES = ("hog", "cascade-gate", "cascade-regions")
+
+CASCADE_SCALE = 0.5  # the cascade runs on a half size frame
+CASCADE_MIN_FACE = 20  # px in the cascade frame, 40 px at full size
+REGION_MARGIN = 0.6  # room around a proposal, cascade boxes are tight and a bit off centre
+REGION_FACE_SIZE = 100  # px a proposed face is resized to before HOG, HOG needs ~80
+MAX_REGION_UPSCALE = 2.5
+
+_cascade = None
+
+
+def load_cascade(path=CASCADE_PATH):
+    # one classifier per process
+    global _cascade
+    if _cascade is None:
+        if not hasattr(cv2, "CascadeClassifier"):  # dropped from the main opencv package in 5.x
+            raise ImportError("The cascade detectors need opencv 4.x (cv2.CascadeClassifier)")
+        _cascade = cv2.CascadeClassifier(path)
+        if _cascade.empty():
+            raise IOError(f"Could not load the face cascade from {path}")
+    return _cascade
+
+
+def scale_box(box, scale, offset=(0, 0)):
+    top, right, bottom, left = box
+    y0, x0 = offset
+    return (int(top / scale) + y0, int(right / scale) + x0, int(bottom / scale) + y0, int(left / scale) + x0)
+
+
+class HogDetector:
+    name = "hog"
+
+    def __init__(self, scale=0.25):
+        self.scale = scale
+
+    def detect(self, frame):
+        with recognition_metrics.stage("prepare"):
+            small_frame = cv2.resize(frame, (0, 0), fx=self.scale, fy=self.scale)
+            rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+        with recognition_metrics.stage("detect"):
+            face_locations = face_recognition.face_locations(rgb_small_frame)
+        return [scale_box(box, self.scale) for box in face_locations]
+
+
+class CascadeGatedDetector:
+    def __init__(self, scale=0.25, propose_regions=True, cascade_scale=CASCADE_SCALE):
+        self.scale, self.propose_regions, self.cascade_scale = scale, propose_regions, cascade_scale
+        self.name = "cascade-regions" if propose_regions else "cascade-gate"
+        self.cascade = load_cascade()
+        self.frames = self.frames_gated = 0
+
+    def proposals(self, frame):
+        # cascade boxes in full frame coords as (top, right, bottom, left)
+        with recognition_metrics.stage("cascade"):
+            return self._proposals(frame)
+
+    def _proposals(self, frame):
+        small_gray = cv2.cvtColor(cv2.resize(frame, (0, 0), fx=self.cascade_scale, fy=self.cascade_scale),
+                                  cv2.COLOR_BGR2GRAY)
+        small_gray = cv2.equalizeHist(small_gray)
+        rects = self.cascade.detectMultiScale(small_gray, scaleFactor=1.1, minNeighbors=3,
+                                              minSize=(CASCADE_MIN_FACE, CASCADE_MIN_FACE))
+        return [scale_box((y, x + w, y + h, x), self.cascade_scale) for (x, y, w, h) in rects]
+
+    def regions_for(self, proposals, frame_shape):
+        # grow each proposal and merge the ones that overlap, so a face is only searched once
+        height, width = frame_shape[:2]
+        regions = []
+        for top, right, bottom, left in proposals:
+            margin = int(max(bottom - top, right - left) * REGION_MARGIN)
+            region = [max(0, top - margin), min(width, right + margin), min(height, bottom + margin),
+                      max(0, left - margin), bottom - top]
+            for other in regions:
+                if region[0] < other[2] and other[0] < region[2] and region[3] < other[1] and other[3] < region[1]:
+                    other[0], other[1] = min(other[0], region[0]), max(other[1], region[1])
+                    other[2], other[3] = max(other[2], region[2]), min(other[3], region[3])
+                    other[4] = min(other[4], region[4])  # size the merged crop for the smaller face
+                    break
+            else:
+                regions.append(region)
+        return regions
+
+    def detect(self, frame):
+        self.frames += 1
+        proposals = self.proposals(frame)
+        if not proposals:
+            self.frames_gated += 1
+            recognition_metrics.count("frames_gated")
+            return []
+        if not self.propose_regions:
+            return HogDetector(self.scale).detect(frame)
+
+        face_boxes = []
+        with recognition_metrics.stage("detect"):
+            self._detect_in_regions(frame, proposals, face_boxes)
+        return face_boxes
+
+    def _detect_in_regions(self, frame, proposals, face_boxes):
+        for top, right, bottom, left, face_size in self.regions_for(proposals, frame.shape):
+            region_scale = min(MAX_REGION_UPSCALE, REGION_FACE_SIZE / max(face_size, 1))
+            crop = cv2.resize(frame[top:bottom, left:right], (0, 0), fx=region_scale, fy=region_scale)
+            rgb_crop = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+            # the crop is already sized for HOG, no upsampling pass needed
+            for box in face_recognition.face_locations(rgb_crop, number_of_times_to_upsample=0):
+                face_boxes.append(scale_box(box, region_scale, (top, left)))
+
+
+def make_face_detector(mode="hog", scale=0.25):
+    if mode == "hog":
+        return HogDetector(scale)
+    if mode in ("cascade-gate", "cascade-regions"):
+        return CascadeGatedDetector(scale, propose_regions=(mode == "cascade-regions"))
+    raise ValueError(f"Unknown detection mode {mode}, expected one of {DETECTION_MODES}")
@@ -0,0 +1,157 @@
+import numpy as np
+from collections import namedtuple
+from collections.abc import Sequence
+
+ENCODING_SIZE = 128
+DEFAULT_TOLERANCE = 0.6
+
+# one result per query face, index/roll_no/name are None when nothing is within tolerance
+FaceMatch = namedtuple("FaceMatch", ["index", "roll_no", "name", "distance", "margin"])
+
+
+def json_distance(distance, digits=3):
+    # distance / margin for a JSON payload, inf (empty gallery, no runner-up) becomes null
+    return round(float(distance), digits) if np.isfinite(distance) else None
+
+
+def as_query_matrix(query_encodings):
+    return np.asarray(query_encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+
+
+def squared_distances(queries, encodings, squared_norms):
+    # |q - e|^2 = |q|^2 + |e|^2 - 2 q.e  -> one matmul for every face in the frame
+    query_norms = np.einsum("ij,ij->i", queries, queries)
+    dists = queries @ encodings.T
+    dists *= -2.0
+    dists += query_norms[:, None]
+    dists += squared_norms[None, :]
+    np.maximum(dists, 0.0, out=dists)  # float rounding can go slightly negative
+    return dists
+
+
+def empty_top_two(n_queries):
+    indices = np.full((n_queries, 2), -1, dtype=np.int64)
+    distances = np.full((n_queries, 2), np.inf, dtype=np.float32)
+    return indices, distances
+
+
+def top_two_from_squared(dists, candidate_ids=None):
+    # best two columns per row of a squared distance matrix, as (ids, euclidean distances)
+    n_queries, n_candidates = dists.shape
+    indices, distances = empty_top_two(n_queries)
+    if n_candidates == 0:
+        return indices, distances
+
+    keep = min(2, n_candidates)
+    rows = np.arange(n_queries)[:, None]
+    if n_candidates > 2:
+        top = np.argpartition(dists, 1, axis=1)[:, :2]
+    else:
+        top = np.broadcast_to(np.arange(n_candidates), (n_queries, n_candidates))
+    top_dists = dists[rows, top]
+    order = np.argsort(top_dists, axis=1)
+    top = top[rows, order]
+    indices[:, :keep] = top if candidate_ids is None else candidate_ids[top]
+    distances[:, :keep] = np.sqrt(top_dists[rows, order])
+    return indices, distances
+
+
+class ExactSearch:
+    # brute force over the whole gallery, always right, cost grows with enrollment
+    name = "exact"
+
+    def build(self, encodings, squared_norms):
+        self.encodings, self.squared_norms = encodings, squared_norms
+        return self
+
+    def nearest_two(self, queries):
+        if len(queries) == 0:
+            return empty_top_two(0)
+        return top_two_from_squared(squared_distances(queries, self.encodings, self.squared_norms))
+
+    def updated(self, encodings, squared_norms, old_rows):
+        return ExactSearch().build(encodings, squared_norms)
+
+
+class FaceGallery:
+    # all known encodings in one contiguous float32 matrix so a whole frame is matched in one go
+
+    def __init__(self, encodings, student_info, search_backend=None):
+        self.encodings = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE))
+        self.squared_norms = np.einsum("ij,ij->i", self.encodings, self.encodings)
+        # any sequence works, the memmapped store hands over a lazy table instead of a list
+        self.student_info = student_info if isinstance(student_info, Sequence) else list(student_info)
+        if len(self.student_info) != len(self.encodings):
+            raise ValueError("Need exactly one student info entry per encoding.")
+        self.search_backend = None
+        self.change_id = None  # last student change feed id this gallery reflects, see gallery_sync.py
+        self.use_search_backend(search_backend if search_backend is not None else ExactSearch())
+
+    @classmethod
+    def from_students(cls, students, search_backend=None):
+        # students = rows from database_ops.load_all_registered_students_from_db
+        encodings = np.empty((len(students), ENCODING_SIZE), dtype=np.float32)
+        for i, student in enumerate(students):
+            encodings[i] = student["face_encoding"]
+        info = [{"roll_no": s["roll_no"], "name": s["name"]} for s in students]
+        return cls(encodings, info, search_backend)
+
+    @classmethod
+    def load_from_db(cls, search_backend=None):
+        import database_ops as db
+        if db.USE_ENCODING_SIDECAR:
+            student_info, encodings, change_id = db.load_student_encodings_from_sidecar()  # memmap, no copy
+        else:
+            student_info, encodings, change_id = db.load_student_encodings_with_change_id()
+        gallery = cls(encodings, student_info, search_backend)
+        gallery.change_id = change_id  # the feed id these encodings are known to reflect
+        return gallery
+
+    def use_search_backend(self, search_backend):
+        # backends that were loaded from disk come in already built
+        if not getattr(search_backend, "is_built", False):
+            search_backend.build(self.encodings, self.squared_norms)
+        self.search_backend = search_backend
+
+    def with_changes(self, changes, change_id=None):
+        # changes = database_ops.fetch_student_changes rows -> new gallery with those students replaced,
+        # added or (encoding None) dropped. self isn't touched, frames being matched keep their snapshot
+        changed = np.array([roll_no for roll_no, _, _ in changes], dtype=np.int64)
+        roll_nos = np.fromiter((info["roll_no"] for info in self.student_info), dtype=np.int64, count=len(self))
+        kept = np.flatnonzero(~np.isin(roll_nos, changed))
+        present = [(roll_no, name, encoding) for roll_no, name, encoding in changes if encoding is not None]
+
+        encodings = np.empty((len(kept) + len(present), ENCODING_SIZE), dtype=np.float32)
+        encodings[:len(kept)] = self.encodings[kept]
+        for i, (_, _, encoding) in enumerate(present, start=len(kept)):
+            encodings[i] = encoding
+        student_info = [self.student_info[i] for i in kept] + \
+                       [{"roll_no": roll_no, "name": name} for roll_no, name, _ in present]
+        # unchanged rows keep their place in the search backend, only the new ones get placed
+        old_rows = np.concatenate([kept, np.full(len(present), -1, dtype=np.int64)])
+        squared_norms = np.einsum("ij,ij->i", encodings, encodings)
+        gallery = FaceGallery(encodings, student_info, self.search_backend.updated(encodings, squared_norms, old_rows))
+        gallery.change_id = change_id
+        return gallery
+
+    def __len__(self):
+        return len(self.encodings)
+
+    def nearest_two(self, query_encodings):
+        # returns (indices, distances), both shaped (n_queries, 2), second column -1 / inf if only one face known
+        queries = as_query_matrix(query_encodings)
+        if len(self) == 0:
+            return empty_top_two(len(queries))
+        return self.search_backend.nearest_two(queries)
+
+    def match_faces(self, query_encodings, tolerance=DEFAULT_TOLERANCE):
+        indices, distances = self.nearest_two(query_encodings)
+        results = []
+        for (best, _), (best_dist, second_dist) in zip(indices, distances):
+            margin = float(second_dist - best_dist) if best >= 0 else float("inf")
+            if best >= 0 and best_dist <= tolerance:
+                info = self.student_info[best]
+                results.append(FaceMatch(int(best), info["roll_no"], info["name"], float(best_dist), margin))
+            else:
+                results.append(FaceMatch(None, None, None, float(best_dist), margin))
+        return results
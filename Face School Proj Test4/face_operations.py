@@ -2,10 +2,31 @@ import cv2
 import face_recognition
 import numpy as np
 import database_ops as db
+from face_gallery import FaceGallery
+from gallery_sync import GalleryWatcher
+import ann_index
+from attendance_writer import AttendanceWriteQueue
+import registration_pipeline
+from frame_quality import DiverseFrameSelector
+from frame_sources import CameraSource, WindowSink
+from face_tracker import IoUFaceTracker
+from face_detection import make_face_detector
+from recognition_scheduler import AdaptiveScheduler
+from frame_exchange import FrameRing, LatencyWindow, RecognitionResult
+from pipeline_metrics import recognition_metrics, serve_metrics
+from batch_encoder import BatchFaceEncoder
+from attendance_cache import marked_today
+from startup_timing import startup_timing
+from recognition_events import recognition_events
+from running_encodings import LiveSampleCollector
+from datetime import datetime
 from tkinter import messagebox
 import threading, time, warnings
 
 
+CAPTURE_DETECTION_SCALE = 0.5
+
+
 def _legacy_draw_text(frame, text, position, font, scale, color, thickness):
     warnings.warn(
         "'_legacy_draw_text' is deprecated. Use direct cv2 calls.",
@@ -14,173 +35,447 @@ def _legacy_draw_text(frame, text, position, font, scale, color, thickness):
     cv2.putText(frame, text, position, font, scale, color, thickness)
 
 
-def open_camera_and_capture_images(name):
-    # registration - capture images
-    video_capture = cv2.VideoCapture(0)
-    if not video_capture.isOpened():
+def open_camera_and_capture_images(name, frame_source=None, frame_sink=None, retraining=False):
+    # registration - capture a handful of sharp, varied images instead of the first 100
+    # retraining only needs a few, they're folded into what's stored (see running_encodings.py)
+    video_capture = frame_source or CameraSource(0)
+    frame_sink = frame_sink or WindowSink('Registration - Look at Camera & Press Q to Quit')
+    if not video_capture.is_opened():
         messagebox.showerror("Camera Error", "Could not open your camera.")
         return []
 
-    captured_frames_list = []
-    total_captures_needed = 100
+    selector = DiverseFrameSelector(RETRAIN_TARGET_FRAMES, RETRAIN_MIN_FRAMES) if retraining else DiverseFrameSelector()
 
-    while len(captured_frames_list) < total_captures_needed:
+    while not selector.is_done():
         ret, frame = video_capture.read()
         if not ret:
             print("Couldn't get a frame from the camera.");
             break
+        clean_frame = frame.copy()  # encoder must not see the overlay drawn below
 
-        progress_text = f"Images captured: {len(captured_frames_list)}/{total_captures_needed}"
+        progress_text = f"Good images: {len(selector.kept)}/{selector.target_frames} - turn your head slowly"
         cv2.putText(frame, progress_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
 
-        face_locations = face_recognition.face_locations(frame)
+        # detect on a half size frame, faces are close to the camera during registration
+        small_frame = cv2.resize(clean_frame, (0, 0), fx=CAPTURE_DETECTION_SCALE, fy=CAPTURE_DETECTION_SCALE)
+        face_locations = [tuple(int(v / CAPTURE_DETECTION_SCALE) for v in location)
+                          for location in face_recognition.face_locations(small_frame)]
 
         if len(face_locations) == 1:
             top, right, bottom, left = face_locations[0]
             pad = 10
-            cv2.rectangle(frame, (left - pad, top - pad), (right + pad, bottom + pad), (255, 0, 0), 2)
+            # keep the box too, processing reuses it instead of detecting again
+            kept = selector.offer(clean_frame, face_locations[0])
+            cv2.rectangle(frame, (left - pad, top - pad), (right + pad, bottom + pad),
+                          (0, 255, 0) if kept else (255, 0, 0), 2)
             _legacy_draw_text(frame, name, (left - pad, top - pad - 10), cv2.FONT_HERSHEY_DUPLEX, 0.8, (255, 255, 255),
                               1)
-
-            captured_frames_list.append(frame)
         elif len(face_locations) > 1:
             cv2.putText(frame, "Multiple faces detected!", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
         else:
             cv2.putText(frame, "No face detected.", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
 
-        cv2.imshow('Registration - Look at Camera & Press Q to Quit', frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            captured_frames_list = [];
+        if not frame_sink.show(frame):
+            selector.kept = [];
             break  # user cancelled
 
     video_capture.release()
-    cv2.destroyAllWindows()
-    return captured_frames_list
+    frame_sink.close()
+    return selector.kept
+
+
+PROGRESS_POLL_MS = 50
+RETRAIN_TARGET_FRAMES, RETRAIN_MIN_FRAMES = 5, 3
+# True folds confident recognitions into the students' encodings when a session ends. off by default: the
+# changed encodings mean a sidecar rebuild and ivf retrain on the next start, which costs more than it gains
+# for most schools. retraining from the manage window folds in the same way either way
+LIVE_RETRAINING = False
 
 
-def process_captured_images_and_save(roll_no, name, frames, progress_bar_widget, main_app_window,
-                                     is_retraining_flow=False):
-    # registration -process images
-    encodings_from_all_images = []
+def process_captured_images_and_save(roll_no, name, captured_frames, progress_bar_widget, main_app_window,
+                                     is_retraining_flow=False, on_finished=None):
+    # registration -process images on the process pool, tk event loop keeps running meanwhile
+    jobs = registration_pipeline.submit_encoding_jobs(captured_frames)
 
-    for i, frame in enumerate(frames):
-        face_locations = face_recognition.face_locations(frame)
-        if face_locations:
-            # get face encoding
-            face_encoding = face_recognition.face_encodings(frame, face_locations)[0]
-            encodings_from_all_images.append(face_encoding)
+    def check_progress():
+        done = sum(job.done() for job in jobs)
+        progress_bar_widget.set(done / len(jobs))
+        if done < len(jobs):
+            main_app_window.after(PROGRESS_POLL_MS, check_progress)
+            return
 
-        progress_bar_widget.set((i + 1) / len(frames))
-        main_app_window.update_idletasks()
+        encodings_from_all_images = [e for e in map(registration_pipeline.job_result, jobs) if e is not None]
+        save_registration_encodings(roll_no, name, encodings_from_all_images, is_retraining_flow)
+        if on_finished: on_finished()
 
+    check_progress()
+
+
+def save_registration_encodings(roll_no, name, encodings_from_all_images, is_retraining_flow=False):
     if not encodings_from_all_images:
         messagebox.showerror("Processing Error",
                              "Could not find a face in any of the captured images. Please try again.")
         return
 
-    # average all encodings
-    average_encoding = np.mean(encodings_from_all_images, axis=0)
-
     if is_retraining_flow:
-        db.update_face_data_for_student(roll_no, average_encoding)
-        messagebox.showinfo("Success", f"{name} was retrained successfully.")
-    else:
-        if not db.save_new_student_to_db(roll_no, name, average_encoding):
-            messagebox.showerror("Database Error", f"Roll number {roll_no} already exists.")
+        # the new frames are added to the stored average, a student who changed a lot starts over
+        if db.fold_encodings_into_students({roll_no: encodings_from_all_images}):
+            messagebox.showinfo("Success", f"{name} was retrained successfully.")
         else:
-            messagebox.showinfo("Success", f"{name} was registered successfully.")
-
-
-# global vars for threading
-latest_frame_from_cam, all_face_locations_in_frame, all_face_names_in_frame, should_stop_thread = None, [], [], False
-
+            messagebox.showerror("Database Error", f"Could not retrain {name}.")
+        return
 
-def background_thread_for_face_rec(all_known_encodings, all_known_student_info):
+    # robust average, outlier frames are trimmed
+    average_encoding = registration_pipeline.aggregate_encodings(encodings_from_all_images)
+    if not db.save_new_student_to_db(roll_no, name, average_encoding, encodings_from_all_images):
+        messagebox.showerror("Database Error", f"Roll number {roll_no} already exists.")
+    else:
+        messagebox.showinfo("Success", f"{name} was registered successfully.")
+
+
+# gallery search: "exact", "ivf" (approximate, index saved next to attendance.db) or "auto"
+# raise ANN_N_PROBE for better recall, lower it for speed
+GALLERY_SEARCH_BACKEND, ANN_N_PROBE, ANN_MIN_GALLERY_SIZE = "auto", 16, 20000
+
+RECOGNITION_SCALE = 0.25
+USE_BATCH_ENCODER = True  # all faces of a frame through the encoder in one dlib call, see batch_encoder.py
+DETECTION_MODE = "hog"  # or "cascade-gate" / "cascade-regions", see face_detection.py
+SHOW_RECOGNITION_STATUS = True  # scheduler scale / latency line at the bottom of the attendance window
+SYNC_OVERLAY_TO_FRAME = True  # show the frame the boxes were found on, False = live frame with the last boxes
+MAX_OVERLAY_LAG_SECONDS = 0.5
+SHOW_METRICS_OVERLAY = False  # per stage latency table on the attendance window, m toggles it
+METRICS_EXPORT_PATH = None  # e.g. "recognition_metrics.json" / ".csv", written when the window closes
+METRICS_HTTP_PORT = None  # e.g. 9109 serves prometheus text on http://127.0.0.1:9109/metrics
+
+
+def load_recognition_gallery(backend=None):
+    # gallery + search backend, same setup for the gui, offline replays and server workers
+    # the gallery comes stamped with the change feed id its encodings were validated against, the watcher
+    # replays anything newer
+    known_gallery = FaceGallery.load_from_db()
+    ann_index.attach_search_backend(known_gallery, backend or GALLERY_SEARCH_BACKEND,
+                                    index_path=ann_index.default_index_path(db.DB_FILE), n_probe=ANN_N_PROBE,
+                                    min_gallery_size=ANN_MIN_GALLERY_SIZE)
+    return known_gallery
+
+
+def prepare_frame_for_recognition(frame, scale=RECOGNITION_SCALE):
+    # cmprs image for faster processing
+    with recognition_metrics.stage("prepare"):
+        small_frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+        return cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+
+
+def detector_for_mode(mode=None, scale=RECOGNITION_SCALE):
+    # None keeps the original path, detect and encode on the downscaled frame
+    mode = mode or DETECTION_MODE
+    return None if mode == "hog" else make_face_detector(mode, scale)
+
+
+_batch_encoder = None
+
+
+def get_batch_encoder():
+    global _batch_encoder
+    if _batch_encoder is None:
+        _batch_encoder = BatchFaceEncoder()
+    return _batch_encoder
+
+
+def encode_faces_in_images(items):
+    # [(rgb image, face locations, track keys or None), ...] -> one (n, 128) array per image
+    if USE_BATCH_ENCODER:
+        return get_batch_encoder().encode_many(items)
+    return [np.array(face_recognition.face_encodings(rgb_image, locations)).reshape(-1, 128)
+            for rgb_image, locations, _ in items]
+
+
+def warm_up_models():
+    # one pass through detector and encoder on a blank frame, the first real frame then doesn't pay for
+    # dlib's one-off setup. the app runs this on its warm-up thread while the menu is showing
+    blank = np.zeros((120, 160, 3), dtype=np.uint8)
+    face_recognition.face_locations(blank)
+    encode_faces_in_images([(blank, [(30, 110, 90, 50)], None)])
+    detector_for_mode()  # loads the cascade when a cascade mode is configured
+
+
+def detect_faces_for_recognition(frame, scale=RECOGNITION_SCALE, detector=None, prepared=False):
+    # -> (rgb image the encoder reads, face locations in it, the same faces in full frame coords)
+    # prepared: frame is already the small rgb frame at scale (server workers get those)
+    if detector is not None:
+        face_boxes = detector.detect(frame)
+        with recognition_metrics.stage("prepare"):
+            # encoder reads the full size frame, a face far from the camera keeps all its pixels
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) if face_boxes else None
+        return rgb_frame, face_boxes, face_boxes
+    rgb_small_frame = frame if prepared else prepare_frame_for_recognition(frame, scale)
+    with recognition_metrics.stage("detect"):
+        face_locations = face_recognition.face_locations(rgb_small_frame)
+    return rgb_small_frame, face_locations, scale_boxes_to_frame(face_locations, scale)
+
+
+def recognize_faces_in_frames(frames, known_gallery, scale=RECOGNITION_SCALE, tolerance=0.6, trackers=None,
+                              detector=None, prepared=False, live_samples=None):
+    # several frames (e.g. one per camera) -> [(boxes in full frame coords, FaceMatch per box), ...]
+    # faces of all frames go through one encoder call and one gallery match
+    # live_samples: a LiveSampleCollector that gets offered every fresh encoding with its match
+    trackers = trackers or [None] * len(frames)
+    detections = [detect_faces_for_recognition(frame, scale, detector, prepared) for frame in frames]
+
+    # with a tracker only new / due-for-a-recheck faces go through the encoder
+    plans = []
+    for (_, face_locations, face_boxes), tracker in zip(detections, trackers):
+        if tracker is None:
+            plans.append((None, list(range(len(face_locations)))))
+            continue
+        # tracker gets full frame boxes, tracks survive the scheduler changing the scale between frames
+        with recognition_metrics.stage("track"):
+            plans.append(tracker.update(face_boxes))
+
+    items = []
+    for (rgb_image, face_locations, _), (tracks, to_encode), tracker in zip(detections, plans, trackers):
+        keys = [(tracker.tracker_id, tracks[i].track_id) for i in to_encode] if tracker is not None else None
+        items.append((rgb_image, [face_locations[i] for i in to_encode], keys))
+    face_count = sum(len(to_encode) for _, to_encode in plans)
+    if face_count:
+        with recognition_metrics.stage("encode"):
+            encodings = encode_faces_in_images(items)
+        recognition_metrics.count("faces_encoded", face_count)
+        # match whole batch at once against gallery
+        encodings = np.vstack(encodings)
+        with recognition_metrics.stage("match"):
+            all_matches = known_gallery.match_faces(encodings, tolerance=tolerance)
+        if live_samples is not None:
+            live_samples.offer(encodings, all_matches)
+    else:
+        all_matches = []
+
+    results, start = [], 0
+    for (_, _, face_boxes), (tracks, to_encode), tracker in zip(detections, plans, trackers):
+        matches = all_matches[start:start + len(to_encode)]
+        start += len(to_encode)
+        if tracker is not None:
+            for i, match in zip(to_encode, matches):
+                tracker.verified(tracks[i], match)
+            matches = [track.match for track in tracks]
+        results.append((face_boxes, matches))
+    return results
+
+
+def scale_boxes_to_frame(face_locations, scale):
+    return [tuple(int(v / scale) for v in location) for location in face_locations]
+
+
+def recognize_faces_in_frame(frame, known_gallery, scale=RECOGNITION_SCALE, tolerance=0.6, tracker=None,
+                             detector=None, live_samples=None):
+    # one BGR frame through the whole pipeline -> (boxes in full frame coords, FaceMatch per box)
+    return recognize_faces_in_frames([frame], known_gallery, scale, tolerance, [tracker], detector,
+                                     live_samples=live_samples)[0]
+
+
+def label_for_match(match):
+    return f"{match.name} - {match.roll_no}" if match.roll_no is not None else "Unknown"
+
+
+def draw_recognition_results(frame, face_boxes, face_labels):
+    for (top, right, bottom, left), name in zip(face_boxes, face_labels):
+        pad = 10
+        box_color = (0, 0, 255) if "Unknown" in name else (0, 255, 0)
+        cv2.rectangle(frame, (left - pad, top - pad), (right + pad, bottom + pad), box_color, 2)
+        _legacy_draw_text(frame, name, (left - pad, top - pad - 10), cv2.FONT_HERSHEY_DUPLEX, 0.8,
+                          (255, 255, 255), 1)
+
+
+def draw_metrics_overlay(frame, lines):
+    # dark box in the top left so the text reads on any background
+    height = 18 * len(lines) + 8
+    cv2.rectangle(frame, (0, 0), (470, height), (0, 0, 0), -1)
+    for i, line in enumerate(lines):
+        cv2.putText(frame, line, (8, 18 * (i + 1)), cv2.FONT_HERSHEY_PLAIN, 1.0, (255, 255, 255), 1)
+
+
+class RecognitionSession:
+    # everything one camera's capture loop and its recognition worker share, so several can run at once
+
+    def __init__(self, known_gallery, attendance_queue, marked_cache=None):
+        self.known_gallery, self.attendance_queue = known_gallery, attendance_queue
+        # shared by every session in the process unless one is passed in
+        self.marked_cache = marked_cache or marked_today
+        self.frames = FrameRing()
+        self.latest_result, self.result_frame = None, None  # result_frame stays pinned until the next result
+        self.display_frame = None  # reused for every displayed frame
+        self.show_metrics = SHOW_METRICS_OVERLAY
+        self.capture_to_display = LatencyWindow()
+        self.should_stop = False
+        self.tracker = IoUFaceTracker()
+        self.detector = detector_for_mode()
+        self.scheduler = AdaptiveScheduler(initial_scale=RECOGNITION_SCALE)
+        self.live_samples = LiveSampleCollector() if LIVE_RETRAINING else None
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=background_thread_for_face_rec, args=(self,), daemon=True)
+        self.thread.start()
+        return self
+
+    def capture_from(self, frame_source):
+        # camera -> ring, returns False when the source ran out
+        return self.frames.capture_from(frame_source) is not None
+
+    def publish_result(self, frame_ref, face_boxes, face_labels):
+        # worker side, the new result replaces the old one in one assignment
+        previous_frame = self.result_frame
+        self.result_frame = frame_ref
+        self.latest_result = RecognitionResult(frame_ref.seq, frame_ref.captured_at, face_boxes, face_labels,
+                                               time.perf_counter())
+        self.frames.release(previous_frame)
+        startup_timing.mark_once("first_recognition")
+
+    def frame_for_display(self):
+        # annotated copy of the frame the newest result was computed on, so boxes sit on the faces they came
+        # from. when the worker has been idle for a while (still scene / cpu budget) the live frame is shown
+        # with the last result instead, the scene hasn't moved enough to matter
+        result = self.latest_result
+        frame_ref = None
+        if SYNC_OVERLAY_TO_FRAME and result is not None and \
+                time.perf_counter() - result.finished_at < MAX_OVERLAY_LAG_SECONDS:
+            frame_ref = self.frames.acquire(result.frame_seq)
+        if frame_ref is None:
+            frame_ref = self.frames.acquire()
+        if frame_ref is None:
+            return None
+        if self.display_frame is None or self.display_frame.shape != frame_ref.image.shape:
+            self.display_frame = np.empty_like(frame_ref.image)
+        np.copyto(self.display_frame, frame_ref.image)
+        self.frames.release(frame_ref)
+
+        if result is not None and result.face_boxes:
+            draw_recognition_results(self.display_frame, result.face_boxes, result.face_labels)
+        display_lag_ms = (time.perf_counter() - frame_ref.captured_at) * 1000
+        self.capture_to_display.add(display_lag_ms)
+        recognition_metrics.observe("capture_to_display", display_lag_ms)
+        if self.show_metrics:
+            draw_metrics_overlay(self.display_frame, recognition_metrics.overlay_lines())
+        if SHOW_RECOGNITION_STATUS:
+            latency = self.capture_to_display.summary()
+            cv2.putText(self.display_frame, f"{self.scheduler.status_line()}  display lag {latency['mean']:.0f} ms",
+                        (10, self.display_frame.shape[0] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        return self.display_frame
+
+    def settings(self):
+        # what the scheduler picked and what it achieved, plus tracker counters
+        return {**self.scheduler.settings(), **self.tracker.stats(),
+                "capture_to_display_ms": self.capture_to_display.summary()}
+
+    def stop(self):
+        self.should_stop = True
+        self.frames.close()
+        if self.thread is not None and self.thread.is_alive(): self.thread.join()
+
+    def use_gallery(self, known_gallery):
+        # from the gallery watcher thread, the worker picks it up with its next frame
+        self.known_gallery = known_gallery
+
+    def save_live_samples(self):
+        # after stop(), folds what the session saw into the students' stored encodings in one transaction
+        if self.live_samples is None:
+            return 0
+        samples = self.live_samples.take()
+        try:
+            return (db.fold_encodings_into_students(samples, restart_if_far=False) or 0) if samples else 0
+        except Exception as e:  # runs during shutdown, the camera / window / metrics still have to be released
+            print(f"Couldn't save live samples: {e}")
+            return 0
+
+    def mark_present(self, matches):
+        now = datetime.now()
+        marked = []
+        for match in matches:
+            # repeat sightings stop at the in-memory set, only a first sighting today reaches the writer thread
+            if match.roll_no is not None and self.marked_cache.mark(match.roll_no, now):
+                self.attendance_queue.push(match.roll_no, now)
+                marked.append(match.roll_no)
+        recognition_events.matches_seen("camera", matches, marked, now)
+
+
+def background_thread_for_face_rec(session):
     # background worker for recognition, smoothness controller DO NOT CHAHNGE ANY SHIT HERE
-    global latest_frame_from_cam, all_face_locations_in_frame, all_face_names_in_frame, should_stop_thread
-    students_marked_today = []
-
-    while not should_stop_thread:
-        if latest_frame_from_cam is None:
-            time.sleep(0.1);
+    scheduler, seen_seq = session.scheduler, -1
+    while True:
+        frame_ref = session.frames.acquire_newer(seen_seq)
+        if frame_ref is None: break
+        if seen_seq >= 0:
+            recognition_metrics.count("frames_dropped", frame_ref.seq - seen_seq - 1)  # overwritten before we looked
+        seen_seq = frame_ref.seq
+        # still scene or over the cpu budget -> keep showing the last results
+        if not scheduler.should_process(frame_ref.image):
+            recognition_metrics.count("frames_skipped")
+            session.frames.release(frame_ref);
             continue
 
-        frame_to_process = latest_frame_from_cam
-        # cmprs image for faster processing
-        small_frame = cv2.resize(frame_to_process, (0, 0), fx=0.25, fy=0.25)
-        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-
-        face_locations = face_recognition.face_locations(rgb_small_frame)
-        face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
-
-        names_found = []
-        # loop found faces
-        for encoding in face_encodings:
-            matches = face_recognition.compare_faces(all_known_encodings, encoding, tolerance=0.6)
-            name, roll_no = "Unknown", None
-
-            face_distances = face_recognition.face_distance(all_known_encodings, encoding)
-            if len(face_distances) > 0:
-                best_match_index = np.argmin(face_distances)
-                if matches[best_match_index]:
-                    roll_no = all_known_student_info[best_match_index]["roll_no"]
-                    name = all_known_student_info[best_match_index]["name"]
-
-                    if roll_no not in students_marked_today:
-                        if db.log_student_attendance(roll_no): students_marked_today.append(roll_no)
-
-            names_found.append(f"{name} - {roll_no}" if roll_no is not None else "Unknown")
-
-        # update glbl results
-        all_face_locations_in_frame, all_face_names_in_frame = face_locations, names_found
-
-
-def start_attendance_recognition_process():
-    global latest_frame_from_cam, all_face_locations_in_frame, all_face_names_in_frame, should_stop_thread
-    # reset glbl vars
-    should_stop_thread, all_face_locations_in_frame, all_face_names_in_frame = False, [], []
-
-    known_students = db.load_all_registered_students_from_db()
-    if not known_students:
+        started = time.perf_counter()
+        face_locations, matches = recognize_faces_in_frame(frame_ref.image, session.known_gallery,
+                                                            scale=scheduler.scale, tracker=session.tracker,
+                                                            detector=session.detector,
+                                                            live_samples=session.live_samples)
+        latency_ms = (time.perf_counter() - started) * 1000
+        scheduler.record(latency_ms, face_locations)
+        recognition_metrics.observe("recognize", latency_ms)
+        recognition_metrics.count("frames_processed")
+        recognition_metrics.faces_in_frame(len(face_locations))
+        session.mark_present(matches)
+
+        # results go out tagged with the frame they were computed on
+        session.publish_result(frame_ref, face_locations, [label_for_match(m) for m in matches])
+
+    db.close_thread_connections()
+
+
+def start_attendance_recognition_process(frame_source=None, frame_sink=None, known_gallery=None):
+    # known_gallery: one the app preloaded in the background, the watcher catches it up if it's behind
+    if known_gallery is None:
+        known_gallery = load_recognition_gallery()
+    if len(known_gallery) == 0:
         messagebox.showwarning("No students", "There are no students registered in the system.")
+        if frame_source is not None: frame_source.release()  # released at the end like any other run
         return
 
-    known_encodings = [s["face_encoding"] for s in known_students]
-    known_info = [{"roll_no": s["roll_no"], "name": s["name"]} for s in known_students]
-
-    rec_thread = threading.Thread(target=background_thread_for_face_rec, args=(known_encodings, known_info),
-                                  daemon=True)
-    rec_thread.start()
+    marked_today.warm()
+    attendance_queue = AttendanceWriteQueue().start()
+    session = RecognitionSession(known_gallery, attendance_queue).start()
+    # students registered / retrained / deleted while this runs show up within a couple of seconds
+    gallery_watcher = GalleryWatcher(known_gallery, load_recognition_gallery).start(on_change=session.use_gallery)
 
     #main thread - camera display
-    video_capture = cv2.VideoCapture(0)
-    if not video_capture.isOpened():
+    video_capture = frame_source or CameraSource(0)
+    frame_sink = frame_sink or WindowSink('Attendance - Press Q to Exit')
+    if not video_capture.is_opened():
         messagebox.showerror("Camera Error", "Could not open camera.");
-        should_stop_thread = True;
+        session.stop();
+        gallery_watcher.stop();
+        attendance_queue.stop()
         return
 
-    while not should_stop_thread:
-        ret, frame = video_capture.read()
-        if not ret: break
-        latest_frame_from_cam = frame
-
-        #background thread
-        if all_face_locations_in_frame:
-            for (top, right, bottom, left), name in zip(all_face_locations_in_frame, all_face_names_in_frame):
-                top *= 4;
-                right *= 4;
-                bottom *= 4;
-                left *= 4
-                pad = 10
-                box_color = (0, 0, 255) if "Unknown" in name else (0, 255, 0)
-                cv2.rectangle(frame, (left - pad, top - pad), (right + pad, bottom + pad), box_color, 2)
-                _legacy_draw_text(frame, name, (left - pad, top - pad - 10), cv2.FONT_HERSHEY_DUPLEX, 0.8,
-                                  (255, 255, 255), 1)
-
-        cv2.imshow('Attendance - Press Q to Exit', frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'): break
-
-    should_stop_thread = True
-    if rec_thread.is_alive(): rec_thread.join()
+    metrics_server = serve_metrics(recognition_metrics, METRICS_HTTP_PORT) if METRICS_HTTP_PORT else None
+
+    while not session.should_stop:
+        if not session.capture_from(video_capture): break
+        recognition_metrics.count("frames_captured")
+
+        #background thread results drawn on a copy, the ring buffers are never drawn on
+        with recognition_metrics.stage("display"):
+            display_frame = session.frame_for_display()
+        if display_frame is not None and not frame_sink.show(display_frame): break
+        if getattr(frame_sink, "last_key", None) == ord('m'):
+            session.show_metrics = not session.show_metrics
+
+    session.stop()
+    gallery_watcher.stop()
+    attendance_queue.stop()  # drains whatever the worker pushed before it stopped
+    session.save_live_samples()
     video_capture.release()
-    cv2.destroyAllWindows()
+    frame_sink.close()
+    if metrics_server is not None:
+        metrics_server.shutdown()
+    if METRICS_EXPORT_PATH:
+        recognition_metrics.export(METRICS_EXPORT_PATH)
@@ -0,0 +1,94 @@
+import itertools, time, uuid
+
+# carries identities across frames so the 128-d encoder only runs when it has to
+# detection still runs every frame (cheap at quarter scale), each face box is matched to last frame's
+# tracks by overlap. a face only gets encoded when its track is new, when its identity is due for a
+# re-check, or when it's still Unknown. a face that leaves for a few frames loses its track and is
+# encoded again when it comes back
+# plain python objects, a tracker can be pickled to a worker process and back with its frame
+
+IOU_THRESHOLD = 0.3  # overlap needed to count as the same face as last frame
+MAX_MISSED_FRAMES = 5  # frames a track survives without a matching detection
+REVERIFY_EVERY = 30  # frames between identity re-checks of a known face
+UNKNOWN_REVERIFY_EVERY = 5  # unknown faces are re-tried sooner, first looks are often blurry or half turned
+
+
+def box_iou(a, b):
+    # boxes are (top, right, bottom, left)
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    overlap = max(0, bottom - top) * max(0, right - left)
+    if overlap == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    return overlap / float(area_a + area_b - overlap)
+
+
+class FaceTrack:
+    def __init__(self, track_id, box, frame_index):
+        self.track_id, self.box = track_id, box
+        self.match = None  # FaceMatch from the last encoding
+        self.last_seen = self.last_verified = frame_index
+        self.missed_frames = 0
+
+    def needs_encoding(self, frame_index):
+        if self.match is None:
+            return True
+        every = UNKNOWN_REVERIFY_EVERY if self.match.roll_no is None else REVERIFY_EVERY
+        return frame_index - self.last_verified >= every
+
+
+class IoUFaceTracker:
+    def __init__(self, iou_threshold=IOU_THRESHOLD, max_missed_frames=MAX_MISSED_FRAMES):
+        self.iou_threshold, self.max_missed_frames = iou_threshold, max_missed_frames
+        self.tracker_id = uuid.uuid4().hex[:12]  # with track_id keys the encoder's chip cache across processes
+        self.tracks = []
+        self.frame_index = 0
+        self.faces_seen = self.encodings_computed = self.tracks_started = 0
+        self.started_at = time.time()
+        self._next_id = itertools.count()
+
+    def update(self, face_locations):
+        # -> (track per face location, indexes of the locations that need encoding this frame)
+        self.frame_index += 1
+        pairs = sorted(((box_iou(track.box, box), t, d) for t, track in enumerate(self.tracks)
+                        for d, box in enumerate(face_locations)), reverse=True)
+        track_for = [None] * len(face_locations)
+        used_tracks = set()
+        for iou, t, d in pairs:
+            if iou < self.iou_threshold:
+                break
+            if t in used_tracks or track_for[d] is not None:
+                continue
+            used_tracks.add(t)
+            track_for[d] = self.tracks[t]
+
+        for t, track in enumerate(self.tracks):
+            if t not in used_tracks:
+                track.missed_frames += 1
+        self.tracks = [track for track in self.tracks if track.missed_frames <= self.max_missed_frames]
+
+        for d, box in enumerate(face_locations):
+            track = track_for[d]
+            if track is None:
+                track = track_for[d] = FaceTrack(next(self._next_id), box, self.frame_index)
+                self.tracks.append(track)
+                self.tracks_started += 1
+            track.box, track.last_seen, track.missed_frames = box, self.frame_index, 0
+
+        self.faces_seen += len(face_locations)
+        return track_for, [d for d, track in enumerate(track_for) if track.needs_encoding(self.frame_index)]
+
+    def verified(self, track, match):
+        track.match, track.last_verified = match, self.frame_index
+        self.encodings_computed += 1
+
+    def stats(self):
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        return {"frames": self.frame_index, "faces_seen": self.faces_seen,
+                "encodings_computed": self.encodings_computed, "tracks_started": self.tracks_started,
+                "active_tracks": len(self.tracks),
+                "faces_per_second": round(self.faces_seen / elapsed, 2),
+                "encodings_per_second": round(self.encodings_computed / elapsed, 2),
+                "encodings_per_face": round(self.encodings_computed / self.faces_seen, 3) if self.faces_seen else 0.0}
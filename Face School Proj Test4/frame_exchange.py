@@ -0,0 +1,97 @@
+import threading, time
+from collections import deque, namedtuple
+import numpy as np
+
+# frame handoff between the capture loop, the recognition worker and the display
+# a fixed set of frame buffers is reused for the whole session, the camera decodes straight into a free
+# one. every frame gets a sequence number, readers pin the buffer they use so the camera never writes
+# into a frame someone is still reading. the lock only guards the slot bookkeeping (a few ints),
+# frames are never copied while holding it
+
+FRAME_SLOTS = 6  # writer + latest + frame being recognized + frame of the last result + display + spare
+LATENCY_SAMPLES = 300
+
+FrameRef = namedtuple("FrameRef", ["seq", "image", "captured_at", "slot"])
+# what the worker found on frame frame_seq, boxes in full frame coords
+RecognitionResult = namedtuple("RecognitionResult", ["frame_seq", "captured_at", "face_boxes", "face_labels",
+                                                     "finished_at"])
+
+
+class FrameRing:
+    def __init__(self, slots=FRAME_SLOTS):
+        self.buffers = [None] * slots  # allocated by the first read into each slot, then reused
+        self.seqs, self.captured_at, self.pins = [-1] * slots, [0.0] * slots, [0] * slots
+        self.latest_slot, self.next_seq, self.closed = -1, 0, False
+        self.changed = threading.Condition()
+
+    def _claim_write_slot(self):
+        with self.changed:
+            free = [i for i in range(len(self.buffers)) if i != self.latest_slot and self.pins[i] == 0]
+            if not free:
+                raise RuntimeError("FrameRing ran out of free slots, a reader is not releasing its frames")
+            slot = min(free, key=lambda i: self.seqs[i])  # oldest frame goes first
+            self.seqs[slot] = -1  # nobody can acquire it while it's being written
+            return slot
+
+    def capture_from(self, frame_source):
+        # reads the next frame straight into a free buffer -> its seq, None when the source ran out
+        slot = self._claim_write_slot()
+        ret, frame = frame_source.read(self.buffers[slot])
+        if not ret:
+            return None
+        captured_at = time.perf_counter()
+        with self.changed:
+            self.buffers[slot] = frame  # same array unless the source had to allocate (first frame, size change)
+            self.seqs[slot], self.captured_at[slot] = self.next_seq, captured_at
+            self.latest_slot = slot
+            self.next_seq += 1
+            self.changed.notify_all()
+            return self.seqs[slot]
+
+    def _pin(self, slot):
+        self.pins[slot] += 1
+        return FrameRef(self.seqs[slot], self.buffers[slot], self.captured_at[slot], slot)
+
+    def acquire_newer(self, seen_seq):
+        # blocks until there's a frame newer than seen_seq and pins it, None once the ring is closed
+        with self.changed:
+            self.changed.wait_for(lambda: self.closed or
+                                  (self.latest_slot >= 0 and self.seqs[self.latest_slot] > seen_seq))
+            return None if self.closed else self._pin(self.latest_slot)
+
+    def acquire(self, seq=None):
+        # pins frame seq (the newest frame if seq is None), None if it's already been overwritten
+        with self.changed:
+            if seq is None:
+                return self._pin(self.latest_slot) if self.latest_slot >= 0 else None
+            for slot, slot_seq in enumerate(self.seqs):
+                if slot_seq == seq:
+                    return self._pin(slot)
+            return None
+
+    def release(self, frame_ref):
+        if frame_ref is None:
+            return
+        with self.changed:
+            self.pins[frame_ref.slot] -= 1
+
+    def close(self):
+        with self.changed:
+            self.closed = True
+            self.changed.notify_all()
+
+
+class LatencyWindow:
+    # last few hundred samples in ms, for mean / p95 on screen and in settings()
+    def __init__(self, size=LATENCY_SAMPLES):
+        self.samples = deque(maxlen=size)
+
+    def add(self, ms):
+        self.samples.append(ms)
+
+    def summary(self):
+        if not self.samples:
+            return {"mean": 0.0, "p95": 0.0, "max": 0.0}
+        values = np.fromiter(self.samples, dtype=np.float64)
+        return {"mean": round(float(values.mean()), 1), "p95": round(float(np.percentile(values, 95)), 1),
+                "max": round(float(values.max()), 1)}
@@ -0,0 +1,105 @@
+from collections import namedtuple
+import cv2
+import face_recognition
+import numpy as np
+from registration_pipeline import CapturedFrame
+
+# picks a small set of sharp, different-looking frames during registration capture
+# cheap checks first (face size, sharpness), landmarks only for frames that pass them,
+# then a frame is kept only if its pose or appearance is new compared to what's already kept
+
+MIN_FACE_SIZE = 80  # px at full resolution
+MIN_SHARPNESS = 40.0  # variance of laplacian on the normalised face crop
+TARGET_FRAMES, MIN_FRAMES = 15, 10
+MAX_FRAMES_SEEN = 400  # give up waiting for variety after this, keep what we have
+POSE_STEP, APPEARANCE_STEP = 0.08, 0.3  # how different a frame must be to count as new
+TARGET_YAW_RANGE = 0.25  # stop early once this much head turn is covered
+THUMBNAIL_SIZE = 32
+
+FrameScore = namedtuple("FrameScore", ["sharpness", "face_size", "pose", "thumbnail"])
+
+
+def _face_crop_gray(image, face_location, size):
+    top, right, bottom, left = face_location
+    height, width = image.shape[:2]
+    crop = image[max(0, top):min(height, bottom), max(0, left):min(width, right)]
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA)
+
+
+def sharpness_of(image, face_location):
+    # same crop size for every frame so big and small faces score alike
+    return float(cv2.Laplacian(_face_crop_gray(image, face_location, 128), cv2.CV_64F).var())
+
+
+def pose_from_landmarks(landmarks):
+    # rough (yaw, pitch, roll) from the 5 point model, only used to compare frames with each other
+    left_eye = np.mean(landmarks["left_eye"], axis=0)
+    right_eye = np.mean(landmarks["right_eye"], axis=0)
+    nose = np.mean(landmarks["nose_tip"], axis=0)
+    eye_mid, eye_vector = (left_eye + right_eye) / 2, right_eye - left_eye
+    eye_distance = max(np.linalg.norm(eye_vector), 1e-6)
+    yaw = (nose[0] - eye_mid[0]) / eye_distance
+    pitch = (nose[1] - eye_mid[1]) / eye_distance
+    roll = np.arctan2(eye_vector[1], eye_vector[0])
+    return np.array([yaw, pitch, roll], dtype=np.float32)
+
+
+def score_frame(image, face_location):
+    # None when the frame fails the cheap checks
+    top, right, bottom, left = face_location
+    face_size = min(bottom - top, right - left)
+    if face_size < MIN_FACE_SIZE:
+        return None
+    sharpness = sharpness_of(image, face_location)
+    if sharpness < MIN_SHARPNESS:
+        return None
+
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    landmarks = face_recognition.face_landmarks(rgb, [face_location], model="small")
+    if not landmarks:
+        return None
+    thumbnail = _face_crop_gray(image, face_location, THUMBNAIL_SIZE).astype(np.float32)
+    thumbnail = (thumbnail - thumbnail.mean()) / (thumbnail.std() + 1e-6)  # ignore overall brightness
+    return FrameScore(sharpness, face_size, pose_from_landmarks(landmarks[0]), thumbnail)
+
+
+class DiverseFrameSelector:
+    def __init__(self, target_frames=TARGET_FRAMES, min_frames=MIN_FRAMES, max_frames_seen=MAX_FRAMES_SEEN):
+        self.target_frames, self.min_frames, self.max_frames_seen = target_frames, min_frames, max_frames_seen
+        self.kept, self.scores, self.frames_seen = [], [], 0
+
+    def novelty(self, score):
+        # >= 1 means new enough to keep
+        if not self.scores:
+            return float("inf")
+        pose_gap = min(np.linalg.norm(score.pose - s.pose) for s in self.scores) / POSE_STEP
+        look_gap = min(np.mean(np.abs(score.thumbnail - s.thumbnail)) for s in self.scores) / APPEARANCE_STEP
+        return max(pose_gap, look_gap)
+
+    def offer(self, image, face_location):
+        # returns True if the frame was kept
+        self.frames_seen += 1
+        score = score_frame(image, face_location)
+        if score is None:
+            return False
+        if self.novelty(score) >= 1.0:
+            self.kept.append(CapturedFrame(image, face_location))
+            self.scores.append(score)
+            return True
+        # not new, but swap it in if it's a sharper take of the closest kept frame
+        closest = min(range(len(self.scores)), key=lambda i: np.linalg.norm(score.pose - self.scores[i].pose))
+        if score.sharpness > 1.5 * self.scores[closest].sharpness:
+            self.kept[closest], self.scores[closest] = CapturedFrame(image, face_location), score
+        return False
+
+    def yaw_range(self):
+        yaws = [s.pose[0] for s in self.scores]
+        return max(yaws) - min(yaws) if yaws else 0.0
+
+    def is_done(self):
+        if len(self.kept) >= self.target_frames:
+            return True
+        if len(self.kept) >= self.min_frames and self.yaw_range() >= TARGET_YAW_RANGE:
+            return True
+        return self.frames_seen >= self.max_frames_seen and len(self.kept) > 0
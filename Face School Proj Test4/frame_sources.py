@@ -0,0 +1,106 @@
+import glob, json, os
+import cv2
+
+# where frames come from and where annotated frames go, so recognition can run on a webcam with a
+# window or headless over a video file / folder of images (benchmarks, CI machines without a camera)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class CameraSource:
+    is_live = True
+
+    def __init__(self, camera_index=0):
+        self.name = f"camera:{camera_index}"
+        self.capture = cv2.VideoCapture(camera_index)
+
+    def is_opened(self):
+        return self.capture.isOpened()
+
+    def read(self, frame=None):
+        # frame: buffer to decode into, reused when the size matches
+        return self.capture.read(frame)
+
+    def release(self):
+        self.capture.release()
+
+
+class VideoFileSource(CameraSource):
+    is_live = False
+
+    def __init__(self, path):
+        self.name = path
+        self.capture = cv2.VideoCapture(path)
+
+
+class ImageDirectorySource:
+    # frames in file name order, so frame_0001.jpg, frame_0002.jpg ... replay in sequence
+    is_live = False
+
+    def __init__(self, folder):
+        self.name = folder
+        self.paths = sorted(p for p in glob.glob(os.path.join(folder, "*")) if p.lower().endswith(IMAGE_EXTENSIONS))
+        self.position = 0
+
+    def is_opened(self):
+        return bool(self.paths)
+
+    def read(self, frame=None):
+        while self.position < len(self.paths):
+            image = cv2.imread(self.paths[self.position])
+            self.position += 1
+            if image is not None:
+                if frame is not None and frame.shape == image.shape:
+                    frame[:] = image
+                    return True, frame
+                return True, image
+        return False, None
+
+    def release(self):
+        self.position = len(self.paths)
+
+
+def open_frame_source(spec):
+    # "0" / 0 -> webcam 0, a folder -> images, anything else -> video file
+    if isinstance(spec, int) or str(spec).isdigit():
+        return CameraSource(int(spec))
+    if os.path.isdir(spec):
+        return ImageDirectorySource(spec)
+    return VideoFileSource(spec)
+
+
+class WindowSink:
+    def __init__(self, title):
+        self.title = title
+        self.last_key = None  # key pressed during the last show(), for toggles
+
+    def show(self, frame):
+        # False once the user pressed q
+        cv2.imshow(self.title, frame)
+        key = cv2.waitKey(1) & 0xFF
+        self.last_key = key if key != 0xFF else None
+        return key != ord('q')
+
+    def close(self):
+        cv2.destroyAllWindows()
+
+
+class NullSink:
+    # headless, frames are dropped
+    def show(self, frame):
+        return True
+
+    def close(self):
+        pass
+
+
+class JsonLinesResultWriter:
+    # one line per frame: {"frame": n, "latency_ms": .., "faces": [{"box": [t, r, b, l], "roll_no": .., ...}]}
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, frame_index, latency_ms, faces):
+        self.file.write(json.dumps({"frame": frame_index, "latency_ms": round(latency_ms, 3), "faces": faces}) + "\n")
+
+    def close(self):
+        self.file.close()
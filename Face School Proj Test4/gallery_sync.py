@@ -0,0 +1,69 @@
+import threading
+import database_ops as db
+
+# keeps a running recognizer's gallery in step with the students table without a restart
+# the db keeps a change feed (student_changes, filled by triggers). every GALLERY_POLL_SECONDS the watcher
+# reads the newest change id (one index lookup), and when it moved, re-reads only the students changed
+# since, builds a new gallery from the old one + those rows and hands it over in one assignment. the
+# recognizer never waits on any of it, frames already being matched finish on the gallery they started with
+
+GALLERY_POLL_SECONDS = 2.0
+
+
+class GalleryWatcher:
+    def __init__(self, gallery, reload, poll_seconds=GALLERY_POLL_SECONDS):
+        # reload() -> fresh gallery from the db, for when the feed was trimmed past us or the db was replaced
+        self.gallery, self.reload, self.poll_seconds = gallery, reload, poll_seconds
+        self.on_change = None
+        self.changes_applied = self.full_reloads = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll(self):
+        # True when the gallery was swapped
+        change_range = db.fetch_student_change_range()
+        if change_range is None:
+            return False  # db busy / feed missing, keep what we have and try again next time
+        oldest, latest = change_range
+        seen, latest = self.gallery.change_id or 0, latest or 0
+        if latest == seen:
+            return False
+
+        if latest < seen or (oldest is not None and oldest > seen + 1):
+            gallery = self.reload()
+            self.full_reloads += 1
+        else:
+            changes = db.fetch_student_changes(seen, latest)
+            if changes is None:
+                return False
+            gallery = self.gallery.with_changes(changes, latest)
+            self.changes_applied += len(changes)
+        self.gallery = gallery
+        if self.on_change is not None:
+            self.on_change(gallery)
+        return True
+
+    def start(self, on_change=None):
+        self.on_change = on_change
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="gallery-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.poll()
+            except Exception as e:  # a bad row must not kill the watcher, the old gallery stays in use
+                print(f"Couldn't update the gallery: {e}")
+        db.close_thread_connections()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        return {"gallery_size": len(self.gallery), "change_id": self.gallery.change_id,
+                "changes_applied": self.changes_applied, "full_reloads": self.full_reloads}
@@ -1,15 +1,25 @@
+from startup_timing import startup_timing  # first, so the clock starts before anything heavy loads
 import customtkinter as ctk
 from tkinter import ttk, messagebox
 import database_ops as db
-import face_operations as face_op
+from app_warmup import app_warmup
 import os
 
+# face_operations (cv2, dlib, face_recognition models) is imported inside the button handlers, the
+# warm-up thread has usually imported it by the time anyone clicks
+
+ATTENDANCE_API_PORT = None  # e.g. 8765 serves attendance queries + live events on 127.0.0.1 while the app is open
+
 
 class AttendanceAppGUI(ctk.CTk):
     def __init__(self):
         super().__init__()
 
         db.setup_database_tables_if_needed()
+        self.api_server = None
+        if ATTENDANCE_API_PORT:
+            from attendance_api import serve_attendance_api
+            self.api_server = serve_attendance_api(ATTENDANCE_API_PORT)
 
         self.title("Face Recognition Attendance System")
         self.geometry("750x550")
@@ -48,6 +58,12 @@ class AttendanceAppGUI(ctk.CTk):
         db_file_path = os.path.abspath("attendance.db")
         path_label = ctk.CTkLabel(self, text=f"DB Path: {db_file_path}", font=ctk.CTkFont(size=10), text_color="grey")
         path_label.place(relx=0.01, rely=0.98, anchor="sw")
+        self.after_idle(self.main_window_shown)
+
+    def main_window_shown(self):
+        self.update_idletasks()
+        startup_timing.mark("window")
+        app_warmup.start()  # models, gallery and camera load while the menu is up
 
     def make_window_appear_in_center(self, pop_up_window=None):
         #center window function
@@ -111,7 +127,10 @@ class AttendanceAppGUI(ctk.CTk):
             return
 
         popup_window.destroy()
-        captured_frames = face_op.open_camera_and_capture_images(name_text)
+        import face_operations as face_op
+        captured_frames = face_op.open_camera_and_capture_images(name_text, frame_source=app_warmup.take_camera(),
+                                                                 retraining=is_retraining)
+        app_warmup.reopen_camera()
 
         if captured_frames: self.show_the_processing_progress_bar(roll_no_int, name_text, captured_frames,
                                                                   is_retraining)
@@ -132,8 +151,10 @@ class AttendanceAppGUI(ctk.CTk):
         progress_bar.pack(pady=10)
         self.update()
 
-        face_op.process_captured_images_and_save(roll_no, name, frames, progress_bar, self, is_retraining)
-        progress_popup.destroy()
+        # returns right away, popup closes once the pool has encoded every frame
+        import face_operations as face_op
+        face_op.process_captured_images_and_save(roll_no, name, frames, progress_bar, self, is_retraining,
+                                                 on_finished=progress_popup.destroy)
 
     def manage_students_button_clicked(self):
         manage_popup = ctk.CTkToplevel(self)
@@ -149,50 +170,88 @@ class AttendanceAppGUI(ctk.CTk):
         frame = ctk.CTkFrame(manage_popup)
         frame.grid(padx=10, pady=10, sticky="nsew")
         frame.grid_columnconfigure((0, 1), weight=1);
-        frame.grid_rowconfigure(0, weight=1)
-
-        student_table = self.setup_the_table_style_and_columns(frame)
-        student_table.grid(row=0, column=0, columnspan=2, padx=10, pady=10, sticky="nsew")
+        frame.grid_rowconfigure(1, weight=1)
 
-        def refresh_student_list():
-            for item in student_table.get_children(): student_table.delete(item)
-            for student in db.load_all_registered_students_from_db(): student_table.insert("", "end",
-                                                                                           values=(student["roll_no"],
-                                                                                                   student["name"]))
+        search_entry = ctk.CTkEntry(frame, placeholder_text="Roll number or name starts with")
+        search_entry.grid(row=0, column=0, padx=10, pady=(10, 0), sticky="ew")
 
-        refresh_student_list()
+        student_table = self.setup_the_table_style_and_columns(frame)
+        student_table.grid(row=1, column=0, columnspan=2, padx=(10, 0), pady=10, sticky="nsew")
+        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=student_table.yview)
+        scrollbar.grid(row=1, column=2, padx=(0, 10), pady=10, sticky="ns")
+
+        # roll numbers and names only, a page at a time as the list is scrolled, like the report
+        # rows are keyed by roll_no so a delete removes just its row
+        list_state = {"cursor": None, "done": False, "loading": False, "search": None}
+
+        def load_next_page():
+            list_state["loading"] = False
+            if list_state["done"]: return
+            rows, list_state["cursor"] = db.fetch_student_page(list_state["cursor"], search=list_state["search"])
+            for roll_no, name in rows:
+                student_table.insert("", "end", iid=str(roll_no), values=(roll_no, name))
+            list_state["done"] = list_state["cursor"] is None
+
+        def on_table_scrolled(first, last):
+            scrollbar.set(first, last)
+            if float(last) > 0.9 and not list_state["done"] and not list_state["loading"]:
+                list_state["loading"] = True
+                manage_popup.after_idle(load_next_page)
+
+        student_table.configure(yscrollcommand=on_table_scrolled)
+
+        def search_students(event=None):
+            list_state["search"] = search_entry.get().strip() or None
+            list_state["cursor"], list_state["done"] = None, False
+            student_table.delete(*student_table.get_children())
+            load_next_page()
+
+        search_entry.bind("<Return>", search_students)
+        ctk.CTkButton(frame, text="Search", command=search_students).grid(row=0, column=1, padx=10, pady=(10, 0),
+                                                                         sticky="ew")
+        load_next_page()
 
         def delete_selected_student():
-            if not student_table.focus():
+            selected = student_table.selection()
+            if not selected:
                 messagebox.showerror("Selection Error", "You need to select a student first.", parent=manage_popup);
                 return
 
-            roll_no, name = student_table.item(student_table.focus())['values']
-            if messagebox.askyesno("Confirm", f"Are you sure you want to delete {name} (Roll No: {roll_no})?",
-                                   parent=manage_popup):
-                if db.delete_student_from_db(roll_no):
-                    refresh_student_list()
+            if len(selected) == 1:
+                roll_no, name = student_table.item(selected[0])['values']
+                question = f"Are you sure you want to delete {name} (Roll No: {roll_no})?"
+            else:
+                question = f"Are you sure you want to delete these {len(selected)} students?"
+            if messagebox.askyesno("Confirm", question, parent=manage_popup):
+                # all of them in one transaction
+                if db.delete_students_from_db([int(item) for item in selected]) is not None:
+                    student_table.delete(*selected)
                 else:
-                    messagebox.showerror("Database Error", "Could not delete the student.", parent=manage_popup)
+                    messagebox.showerror("Database Error", "Could not delete the students.", parent=manage_popup)
 
         def retrain_selected_student():
-            if not student_table.focus():
-                messagebox.showerror("Selection Error", "You need to select a student first.", parent=manage_popup);
+            selected = student_table.selection()
+            if len(selected) != 1:
+                messagebox.showerror("Selection Error", "Select the one student to retrain.", parent=manage_popup);
                 return
-            roll_no, name = student_table.item(student_table.focus())['values']
+            roll_no, name = student_table.item(selected[0])['values']
             # open reg window in retrain mode
             self.new_student_button_clicked(retrain_data=(roll_no, name))
 
-        delete_button = ctk.CTkButton(frame, text="Delete Selected Student", command=delete_selected_student,
+        delete_button = ctk.CTkButton(frame, text="Delete Selected Students", command=delete_selected_student,
                                       fg_color="#E53935", hover_color="#C62828")
-        delete_button.grid(row=1, column=0, padx=10, pady=10, sticky="ew")
+        delete_button.grid(row=2, column=0, padx=10, pady=10, sticky="ew")
         retrain_button = ctk.CTkButton(frame, text="Retrain Selected Student", command=retrain_selected_student)
-        retrain_button.grid(row=1, column=1, padx=10, pady=10, sticky="ew")
+        retrain_button.grid(row=2, column=1, padx=10, pady=10, sticky="ew")
 
     def take_attendance_button_clicked(self):
+        startup_timing.mark_once("attendance_clicked")
         self.withdraw()
-        face_op.start_attendance_recognition_process()
+        import face_operations as face_op
+        face_op.start_attendance_recognition_process(frame_source=app_warmup.take_camera(),
+                                                     known_gallery=app_warmup.take_gallery())
         self.deiconify()
+        app_warmup.reopen_camera()
 
     def setup_the_table_style_and_columns(self, parent_container):
         #table styke
@@ -220,7 +279,18 @@ class AttendanceAppGUI(ctk.CTk):
         report_popup.transient(self);
         report_popup.grab_set()
         report_popup.grid_columnconfigure(0, weight=1);
-        report_popup.grid_rowconfigure(0, weight=1)
+        report_popup.grid_rowconfigure(1, weight=1)
+
+        #filters
+        filter_frame = ctk.CTkFrame(report_popup)
+        filter_frame.grid(row=0, column=0, columnspan=2, padx=20, pady=(20, 0), sticky="ew")
+        filter_frame.grid_columnconfigure((0, 1, 2, 3), weight=1)
+        date_from_entry = ctk.CTkEntry(filter_frame, placeholder_text="From (YYYY-MM-DD)")
+        date_to_entry = ctk.CTkEntry(filter_frame, placeholder_text="To (YYYY-MM-DD)")
+        roll_entry = ctk.CTkEntry(filter_frame, placeholder_text="Roll Number")
+        name_entry = ctk.CTkEntry(filter_frame, placeholder_text="Name starts with")
+        for column, entry in enumerate((date_from_entry, date_to_entry, roll_entry, name_entry)):
+            entry.grid(row=0, column=column, padx=5, pady=10, sticky="ew")
 
         report_table = self.setup_the_table_style_and_columns(report_popup)
         report_table['columns'] = ("Roll No", "Name", "Date", "Time")
@@ -228,11 +298,50 @@ class AttendanceAppGUI(ctk.CTk):
         report_table.heading("Time", text="Time")
         report_table.column("Date", anchor="center");
         report_table.column("Time", anchor="center")
-        report_table.grid(row=0, column=0, padx=20, pady=20, sticky="nsew")
+        report_table.grid(row=1, column=0, padx=(20, 0), pady=20, sticky="nsew")
+        scrollbar = ttk.Scrollbar(report_popup, orient="vertical", command=report_table.yview)
+        scrollbar.grid(row=1, column=1, padx=(0, 20), pady=20, sticky="ns")
+
+        # rows come in a page at a time as the user scrolls down
+        report_state = {"cursor": None, "done": False, "loading": False, "filters": {}}
+
+        def load_next_page():
+            report_state["loading"] = False
+            if report_state["done"]: return
+            rows, report_state["cursor"] = db.fetch_attendance_report_page(report_state["cursor"],
+                                                                           **report_state["filters"])
+            for record in rows:
+                report_table.insert("", "end", values=record)
+            report_state["done"] = report_state["cursor"] is None
+
+        def on_table_scrolled(first, last):
+            scrollbar.set(first, last)
+            if float(last) > 0.9 and not report_state["done"] and not report_state["loading"]:
+                report_state["loading"] = True
+                report_popup.after_idle(load_next_page)
+
+        report_table.configure(yscrollcommand=on_table_scrolled)
+
+        def apply_filters():
+            roll_text = roll_entry.get().strip()
+            if roll_text and not roll_text.isdigit():
+                messagebox.showerror("Input Error", "Roll Number must be a number.", parent=report_popup)
+                return
+            report_state["filters"] = {"date_from": date_from_entry.get().strip() or None,
+                                       "date_to": date_to_entry.get().strip() or None,
+                                       "roll_no": int(roll_text) if roll_text else None,
+                                       "name_prefix": name_entry.get().strip() or None}
+            report_state["cursor"], report_state["done"] = None, False
+            report_table.delete(*report_table.get_children())
+            load_next_page()
 
-        for record in db.fetch_full_attendance_report():
-            report_table.insert("", "end", values=record)
+        ctk.CTkButton(filter_frame, text="Apply Filters", command=apply_filters).grid(row=0, column=4, padx=5, pady=10)
+        load_next_page()
 
 if __name__ == "__main__":
     app = AttendanceAppGUI()
-    app.mainloop()
\ No newline at end of file
+    app.mainloop()
+    app_warmup.release()
+    if app.api_server is not None:
+        app.api_server.shutdown()
+    startup_timing.save()
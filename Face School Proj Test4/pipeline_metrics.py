@@ -0,0 +1,234 @@
+import bisect, csv, json, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# where the time goes in recognition: per stage latency histograms + counters
+# recording is a perf_counter pair and a bucket increment, off entirely when enabled is False
+# read it as an overlay in the attendance window (m toggles), a json / csv dump, or prometheus text
+# served on localhost:
+#
+#   with recognition_metrics.stage("detect"):
+#       face_locations = face_recognition.face_locations(rgb_small_frame)
+#   recognition_metrics.count("frames_processed")
+
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 200, 300, 500, 1000, 2000, 5000)
+FACES_PER_FRAME_BUCKETS = (0, 1, 2, 3, 5, 8, 12, 20, 30, 40, 60)
+STAGE_ORDER = ("prepare", "cascade", "detect", "track", "encode", "match", "recognize", "db_write", "display",
+               "capture_to_display")
+
+
+class Histogram:
+    # plain lists + bisect, numpy calls on single values cost more than the bucketing itself
+    def __init__(self, bounds, discrete=False):
+        self.bounds = tuple(float(b) for b in bounds)
+        self.discrete = discrete  # whole counts (faces), quantiles report the bucket bound, no interpolation
+        self.counts = [0] * (len(bounds) + 1)  # last one is +Inf
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def quantile(self, q):
+        # linear inside the bucket, good enough to tell 20 ms from 200 ms
+        count = self.count
+        if count == 0:
+            return 0.0
+        rank, before = q * count, 0
+        for i, in_bucket in enumerate(self.counts):
+            if in_bucket and before + in_bucket >= rank:
+                break
+            before += in_bucket
+        lower = self.bounds[i - 1] if i > 0 else 0.0
+        upper = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+        if self.discrete:
+            return upper
+        return lower + (upper - lower) * (rank - before) / in_bucket
+
+    def summary(self):
+        count = self.count
+        return {"count": count, "mean": round(self.total / count, 3) if count else 0.0,
+                "p50": round(self.quantile(0.5), 3), "p95": round(self.quantile(0.95), 3),
+                "p99": round(self.quantile(0.99), 3)}
+
+
+class _NoTiming:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _StageTimer:
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics, name):
+        self.metrics, self.name = metrics, name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, (time.perf_counter() - self.started) * 1000)
+        return False
+
+
+_NO_TIMING = _NoTiming()
+
+
+class PipelineMetrics:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stages, self.counters = {}, {}
+        self.faces_per_frame = Histogram(FACES_PER_FRAME_BUCKETS, discrete=True)
+        self.keep_samples, self.samples = False, []  # pool workers ship raw samples back to the parent
+        self.started_at = time.time()
+        self.lock = threading.Lock()
+
+    def stage(self, name):
+        return _StageTimer(self, name) if self.enabled else _NO_TIMING
+
+    def observe(self, name, ms):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.stages.get(name)
+            if histogram is None:
+                histogram = self.stages[name] = Histogram(LATENCY_BUCKETS_MS)
+            histogram.observe(ms)
+            if self.keep_samples:
+                self.samples.append((name, ms))
+
+    def count(self, name, n=1):
+        if not self.enabled or not n:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+            if self.keep_samples:
+                self.samples.append(("#" + name, n))
+
+    def faces_in_frame(self, n):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.faces_per_frame.observe(n)
+            if self.keep_samples:
+                self.samples.append(("faces", n))
+
+    def take_samples(self):
+        with self.lock:
+            samples, self.samples = self.samples, []
+        return samples
+
+    def replay(self, samples):
+        # samples from take_samples() in another process
+        for name, value in samples:
+            if name == "faces":
+                self.faces_in_frame(value)
+            elif name.startswith("#"):
+                self.count(name[1:], value)
+            else:
+                self.observe(name, value)
+
+    def reset(self):
+        with self.lock:
+            self.stages, self.counters = {}, {}
+            self.faces_per_frame = Histogram(FACES_PER_FRAME_BUCKETS, discrete=True)
+            self.started_at = time.time()
+
+    def _ordered_stages(self):
+        return sorted(self.stages, key=lambda s: (STAGE_ORDER.index(s) if s in STAGE_ORDER else len(STAGE_ORDER), s))
+
+    def snapshot(self):
+        with self.lock:
+            elapsed = max(time.time() - self.started_at, 1e-9)
+            return {"uptime_seconds": round(elapsed, 1),
+                    "stages_ms": {name: self.stages[name].summary() for name in self._ordered_stages()},
+                    "counters": dict(self.counters),
+                    "rates_per_second": {name: round(value / elapsed, 2) for name, value in self.counters.items()},
+                    "faces_per_frame": self.faces_per_frame.summary()}
+
+    def export(self, path):
+        # .csv -> one row per stage, anything else -> json snapshot
+        snapshot = self.snapshot()
+        if path.lower().endswith(".csv"):
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["metric", "count", "mean_ms", "p50_ms", "p95_ms", "p99_ms"])
+                for name, s in snapshot["stages_ms"].items():
+                    writer.writerow([name, s["count"], s["mean"], s["p50"], s["p95"], s["p99"]])
+                s = snapshot["faces_per_frame"]
+                writer.writerow(["faces_per_frame", s["count"], s["mean"], s["p50"], s["p95"], s["p99"]])
+                for name, value in snapshot["counters"].items():
+                    writer.writerow([name, value, "", "", "", ""])
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, indent=2)
+
+    def prometheus_text(self):
+        lines = []
+
+        def histogram_lines(metric, histogram, labels=""):
+            cumulative = 0
+            for bound, count in zip(histogram.bounds + ("+Inf",), histogram.counts):
+                cumulative += count
+                le = bound if bound == "+Inf" else f"{bound:g}"
+                lines.append(f'{metric}_bucket{{{labels}le="{le}"}} {cumulative}')
+            series_labels = f"{{{labels.rstrip(',')}}}" if labels else ""
+            lines.append(f"{metric}_sum{series_labels} {histogram.total:.6f}")
+            lines.append(f"{metric}_count{series_labels} {cumulative}")
+
+        with self.lock:
+            lines += ["# HELP attendance_stage_latency_ms Recognition pipeline stage latency in milliseconds.",
+                      "# TYPE attendance_stage_latency_ms histogram"]
+            for name in self._ordered_stages():
+                histogram_lines("attendance_stage_latency_ms", self.stages[name], f'stage="{name}",')
+            lines += ["# HELP attendance_faces_per_frame Faces detected per processed frame.",
+                      "# TYPE attendance_faces_per_frame histogram"]
+            histogram_lines("attendance_faces_per_frame", self.faces_per_frame)
+            for name, value in sorted(self.counters.items()):
+                lines += [f"# TYPE attendance_{name}_total counter", f"attendance_{name}_total {value}"]
+        return "\n".join(lines) + "\n"
+
+    def overlay_lines(self):
+        snapshot = self.snapshot()
+        lines = [f"{name:<18} p50 {s['p50']:7.1f}  p95 {s['p95']:7.1f} ms  n={s['count']}"
+                 for name, s in snapshot["stages_ms"].items()]
+        rates = snapshot["rates_per_second"]
+        lines.append("  ".join(f"{name} {rate:.1f}/s" for name, rate in rates.items() if name.startswith("frames_")))
+        lines.append(f"faces/frame mean {snapshot['faces_per_frame']['mean']:.1f}")
+        return lines
+
+
+def serve_metrics(metrics, port, host="127.0.0.1"):
+    # /metrics -> prometheus text, /metrics.json -> snapshot. local only by default
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/metrics.json"):
+                body, content_type = json.dumps(metrics.snapshot()).encode(), "application/json"
+            elif self.path.startswith("/metrics"):
+                body, content_type = metrics.prometheus_text().encode(), "text/plain; version=0.0.4"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # scrapes every few seconds would flood the console
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# one registry per process, like database_ops.connection_manager
+recognition_metrics = PipelineMetrics()
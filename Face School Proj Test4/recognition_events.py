@@ -0,0 +1,56 @@
+import threading
+from datetime import datetime
+from face_gallery import json_distance
+
+# live recognition events for whoever listens (the local api), published from the recognition loops
+#   recognized  a processed frame had faces in it: roll_no / name / distance per face (roll_no None = unknown,
+#               distance None when there was nobody to compare against)
+#   marked      a student's first sighting today, the attendance row is on its way to the db
+# with nobody subscribed a publish is one list check, the recognition thread never waits on a listener.
+# listeners get the event dict on the publishing thread and must hand it off right away (the api does
+# one call_soon_threadsafe per event)
+
+
+class RecognitionEvents:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = ()  # replaced, never changed in place, publish reads it without the lock
+        self.event_id = 0
+
+    def subscribe(self, callback):
+        with self.lock:
+            self.subscribers = self.subscribers + (callback,)
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            self.subscribers = tuple(s for s in self.subscribers if s != callback)
+
+    def publish(self, event):
+        subscribers = self.subscribers
+        if not subscribers:
+            return
+        with self.lock:
+            self.event_id += 1
+            event["id"] = self.event_id
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:  # a broken listener mustn't take recognition down with it
+                print(f"Recognition event listener failed: {e}")
+
+    def matches_seen(self, stream_id, matches, marked_roll_nos=(), when=None):
+        # one recognized event for the frame plus a marked event per newly marked student
+        if not self.subscribers or not matches:
+            return
+        at = (when or datetime.now()).isoformat(timespec="milliseconds")
+        self.publish({"type": "recognized", "stream": stream_id, "at": at,
+                      "faces": [{"roll_no": m.roll_no, "name": m.name, "distance": json_distance(m.distance)}
+                                for m in matches]})
+        for match in matches:
+            if match.roll_no in marked_roll_nos:
+                self.publish({"type": "marked", "stream": stream_id, "at": at, "roll_no": match.roll_no,
+                              "name": match.name})
+
+
+# one per process, like pipeline_metrics.recognition_metrics
+recognition_events = RecognitionEvents()
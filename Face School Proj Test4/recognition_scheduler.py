@@ -0,0 +1,111 @@
+import time
+import cv2
+import numpy as np
+
+# decides how often and how big the recognition worker processes frames
+#  - scale: steps down while latency is over target, back up when there's room. never below the size that
+#    keeps the smallest face seen recently detectable, unless latency is way over budget
+#  - cadence: after a frame that took t ms the worker rests so its busy share stays under CPU_BUDGET
+#  - still scenes: a frame that barely differs from the last processed one is skipped, a still scene is
+#    re-checked every STATIC_RECHECK_SECONDS anyway
+
+TARGET_LATENCY_MS = 150.0
+CPU_BUDGET = 0.6  # share of one core the recognition worker may keep busy
+SCALE_STEPS = (0.125, 0.2, 0.25, 0.33, 0.5)
+MIN_DETECTABLE_FACE = 45  # px a face needs in the downscaled frame for HOG (80 px window, 1 upsample)
+LATENCY_SMOOTHING = 0.3
+FACE_SIZE_MEMORY_SECONDS = 10.0  # how long a small face keeps the scale up after it was last seen
+MOTION_THRESHOLD = 3.0  # mean abs gray difference of a 64x48 thumbnail, 0-255
+STATIC_RECHECK_SECONDS = 2.0
+THUMBNAIL_SIZE = (64, 48)
+
+
+def frame_thumbnail(frame):
+    gray = cv2.cvtColor(cv2.resize(frame, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+    return cv2.GaussianBlur(gray, (3, 3), 0).astype(np.int16)  # blur so sensor noise doesn't count as motion
+
+
+class AdaptiveScheduler:
+    def __init__(self, target_latency_ms=TARGET_LATENCY_MS, cpu_budget=CPU_BUDGET, scale_steps=SCALE_STEPS,
+                 initial_scale=0.25):
+        self.target_latency_ms, self.cpu_budget, self.scale_steps = target_latency_ms, cpu_budget, scale_steps
+        self.step = min(range(len(scale_steps)), key=lambda i: abs(scale_steps[i] - initial_scale))
+        self.latency_ms, self.last_latency_ms = None, 0.0  # smoothed latency at the current scale
+        self.smallest_face, self.smallest_face_seen_at = None, 0.0
+        self.last_thumbnail, self.last_processed_at, self.next_allowed_at = None, 0.0, 0.0
+        self.frames_processed = self.skipped_static = self.skipped_budget = 0
+        self.busy_seconds, self.started_at = 0.0, time.perf_counter()
+
+    @property
+    def scale(self):
+        return self.scale_steps[self.step]
+
+    def should_process(self, frame):
+        now = time.perf_counter()
+        if now < self.next_allowed_at:
+            self.skipped_budget += 1
+            return False
+        thumbnail = frame_thumbnail(frame)
+        if self.last_thumbnail is not None and now - self.last_processed_at < STATIC_RECHECK_SECONDS:
+            if np.mean(np.abs(thumbnail - self.last_thumbnail)) < MOTION_THRESHOLD:
+                self.skipped_static += 1
+                return False
+        self.last_thumbnail = thumbnail
+        return True
+
+    def min_step_for_faces(self, now):
+        # smallest scale at which the smallest recent face is still detectable
+        if self.smallest_face is None or now - self.smallest_face_seen_at > FACE_SIZE_MEMORY_SECONDS:
+            return 0
+        for i, scale in enumerate(self.scale_steps):
+            if self.smallest_face * scale >= MIN_DETECTABLE_FACE:
+                return i
+        return len(self.scale_steps) - 1
+
+    def record(self, latency_ms, face_boxes):
+        # face_boxes in full frame coords
+        now = time.perf_counter()
+        self.frames_processed += 1
+        self.busy_seconds += latency_ms / 1000
+        self.last_latency_ms = latency_ms
+        self.latency_ms = latency_ms if self.latency_ms is None else \
+            (1 - LATENCY_SMOOTHING) * self.latency_ms + LATENCY_SMOOTHING * latency_ms
+        self.last_processed_at = now
+        # rest long enough that busy / (busy + rest) stays at the budget
+        self.next_allowed_at = now + latency_ms / 1000 * (1 / self.cpu_budget - 1)
+
+        if face_boxes:
+            smallest = min(min(bottom - top, right - left) for top, right, bottom, left in face_boxes)
+            if self.smallest_face is None or smallest < self.smallest_face or \
+                    now - self.smallest_face_seen_at > FACE_SIZE_MEMORY_SECONDS:
+                self.smallest_face = smallest
+            self.smallest_face_seen_at = now
+
+        floor, step = self.min_step_for_faces(now), self.step
+        if self.latency_ms > 1.5 * self.target_latency_ms and step > 0:
+            step -= 1  # way over budget, latency wins over small faces
+        elif self.latency_ms > self.target_latency_ms and step > floor:
+            step -= 1
+        elif step < len(self.scale_steps) - 1:
+            # detection cost grows with the pixel count, only go up if the bigger frame should still fit
+            growth = (self.scale_steps[step + 1] / self.scale_steps[step]) ** 2
+            headroom = self.target_latency_ms if step < floor else 0.8 * self.target_latency_ms
+            if self.latency_ms * growth < headroom:
+                step += 1
+        if step != self.step:
+            self.step, self.latency_ms = step, None  # start averaging again at the new size
+
+    def settings(self):
+        wall_seconds = max(time.perf_counter() - self.started_at, 1e-9)
+        latency_ms = self.last_latency_ms if self.latency_ms is None else self.latency_ms
+        return {"scale": self.scale, "latency_ms": round(latency_ms, 1),
+                "last_latency_ms": round(self.last_latency_ms, 1), "target_latency_ms": self.target_latency_ms,
+                "min_interval_ms": round(self.last_latency_ms * (1 / self.cpu_budget - 1), 1),
+                "cpu_share": round(self.busy_seconds / wall_seconds, 3), "cpu_budget": self.cpu_budget,
+                "smallest_face": self.smallest_face, "frames_processed": self.frames_processed,
+                "skipped_static": self.skipped_static, "skipped_budget": self.skipped_budget}
+
+    def status_line(self):
+        latency_ms = self.last_latency_ms if self.latency_ms is None else self.latency_ms
+        return (f"scale {self.scale:.2f}  {latency_ms:.0f}/{self.target_latency_ms:.0f} ms  "
+                f"skipped {self.skipped_static} still, {self.skipped_budget} budget")
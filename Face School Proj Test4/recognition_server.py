@@ -0,0 +1,335 @@
+import argparse, json, os, sys, threading, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import database_ops as db
+import face_operations as face_op
+from attendance_writer import AttendanceWriteQueue
+from frame_sources import open_frame_source
+from face_tracker import IoUFaceTracker
+from face_detection import DETECTION_MODES
+from gallery_sync import GalleryWatcher
+from pipeline_metrics import recognition_metrics, serve_metrics
+from recognition_events import recognition_events
+from attendance_cache import marked_today
+from datetime import datetime
+
+# recognition for several gates from one machine
+# every stream (camera or recording) gets a capture thread that only keeps its newest frame, a dispatcher
+# hands those to a pool of worker processes, at most one frame per stream in flight. a frame that gets
+# replaced before a worker was free is dropped, so a slow pool makes streams skip frames instead of lagging
+# behind. workers map the same read-only encoding sidecar, the gallery is in memory once
+#
+#   python recognition_server.py 0 1 gate_b.mp4 --workers 3 --show
+
+RECORDING_FPS = 25.0  # pace for recordings that don't say their frame rate
+FPS_WINDOW = 30  # frames the fps is averaged over
+STATS_INTERVAL_SECONDS = 5.0
+MAX_STREAMS_PER_JOB = 4  # frames from different streams batched into one worker job when workers are short
+
+_worker_gallery, _worker_detector, _worker_scale = None, None, face_op.RECOGNITION_SCALE
+
+
+def _init_worker(db_file, backend, detection_mode, scale):
+    # runs once per worker process
+    global _worker_gallery, _worker_detector, _worker_scale
+    db.DB_FILE = db_file
+    _worker_gallery = face_op.load_recognition_gallery(backend)
+    # each worker follows the students table on its own, a registration shows up without restarting the pool
+    GalleryWatcher(_worker_gallery, lambda: face_op.load_recognition_gallery(backend)).start(_use_worker_gallery)
+    _worker_detector, _worker_scale = face_op.detector_for_mode(detection_mode, scale), scale
+    recognition_metrics.keep_samples = True  # stage timings go back to the parent with each result
+
+
+def _use_worker_gallery(gallery):
+    global _worker_gallery
+    _worker_gallery = gallery
+
+
+def _recognize_in_worker(frames, tolerance, trackers):
+    # frames are small rgb frames on the plain hog path, full BGR frames when a cascade detector crops
+    # regions out of them. boxes come back in full frame coords either way
+    # several streams' frames in one job share one encoder call
+    # each stream's tracker travels with its frame and comes back updated, one frame per stream is in
+    # flight so two workers never hold the same tracker
+    with recognition_metrics.stage("recognize"):
+        results = face_op.recognize_faces_in_frames(frames, _worker_gallery, _worker_scale, tolerance, trackers,
+                                                    _worker_detector, prepared=_worker_detector is None)
+    return results, trackers, recognition_metrics.take_samples()
+
+
+def _rate(timestamps):
+    if len(timestamps) < 2 or timestamps[-1] == timestamps[0]:
+        return 0.0
+    return (len(timestamps) - 1) / (timestamps[-1] - timestamps[0])
+
+
+class RecognitionStream:
+    # one camera / recording, only touched under the server's condition
+
+    def __init__(self, stream_id, frame_source):
+        self.stream_id, self.frame_source = stream_id, frame_source
+        self.latest_frame = None  # newest full size frame, for display
+        self.pending = None  # (seq, frame for the worker) waiting for a worker
+        self.in_flight = False
+        self.frame_seq = 0
+        self.face_locations, self.face_names, self.result_seq = [], [], -1
+        self.frames_captured = self.frames_processed = self.frames_dropped = 0
+        self.last_latency_ms = 0.0
+        self.capture_times, self.result_times = deque(maxlen=FPS_WINDOW), deque(maxlen=FPS_WINDOW)
+        self.last_dispatch = 0.0
+        self.tracker = IoUFaceTracker()
+        self.finished = False
+
+    def stats(self):
+        tracking = self.tracker.stats()
+        return {"stream": self.stream_id, "captured": self.frames_captured, "processed": self.frames_processed,
+                "dropped": self.frames_dropped, "capture_fps": round(_rate(self.capture_times), 2),
+                "recognition_fps": round(_rate(self.result_times), 2),
+                "latency_ms": round(self.last_latency_ms, 2), "finished": self.finished,
+                "faces_per_second": tracking["faces_per_second"],
+                "encodings_per_second": tracking["encodings_per_second"]}
+
+
+class RecognitionServer:
+    def __init__(self, frame_sources, workers=None, scale=face_op.RECOGNITION_SCALE, tolerance=0.6,
+                 backend=face_op.GALLERY_SEARCH_BACKEND, detection_mode=face_op.DETECTION_MODE, on_result=None):
+        self.streams = [RecognitionStream(source.name, source) for source in frame_sources]
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.scale, self.tolerance, self.backend = scale, tolerance, backend
+        self.detection_mode = detection_mode
+        self.on_result = on_result  # on_result(stream_id, seq, face_boxes, matches), called from pool threads
+        self.condition = threading.Condition()
+        self.busy_workers = 0
+        self.should_stop = False
+        self.gallery_size = 0
+        self.pool, self.attendance_queue, self.threads = None, None, []
+
+    def start(self):
+        # load once here first: refreshes the sidecar / ann index on disk so the workers only read them
+        known_gallery = face_op.load_recognition_gallery(self.backend)
+        if len(known_gallery) == 0:
+            print("There are no students registered in the system.")
+            return False
+        self.gallery_size = len(known_gallery)
+
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                        initargs=(db.DB_FILE, self.backend, self.detection_mode, self.scale))
+        marked_today.warm()
+        self.attendance_queue = AttendanceWriteQueue().start()
+        self.threads = [threading.Thread(target=self._capture_loop, args=(s,), daemon=True) for s in self.streams]
+        self.threads.append(threading.Thread(target=self._dispatch_loop, daemon=True))
+        for thread in self.threads:
+            thread.start()
+        return True
+
+    def _capture_loop(self, stream):
+        frame_interval = 0.0
+        if not stream.frame_source.is_live:
+            capture = getattr(stream.frame_source, "capture", None)
+            recorded_fps = capture.get(cv2.CAP_PROP_FPS) if capture is not None else 0
+            frame_interval = 1.0 / (recorded_fps if recorded_fps and recorded_fps > 0 else RECORDING_FPS)
+
+        next_frame_at = time.perf_counter()
+        while not self.should_stop:
+            ret, frame = stream.frame_source.read()
+            if not ret:
+                break
+            if self.detection_mode == "hog":
+                work_frame = face_op.prepare_frame_for_recognition(frame, self.scale)
+            else:
+                work_frame = frame  # cascade detectors crop their regions out of the full frame
+            with self.condition:
+                if stream.pending is not None:
+                    stream.frames_dropped += 1  # a worker never got to it, the new frame replaces it
+                    recognition_metrics.count("frames_dropped")
+                stream.pending = (stream.frame_seq, work_frame)
+                stream.latest_frame = frame
+                stream.frame_seq += 1
+                stream.frames_captured += 1
+                recognition_metrics.count("frames_captured")
+                stream.capture_times.append(time.perf_counter())
+                self.condition.notify_all()
+
+            if frame_interval:
+                # recordings play at their own speed, not as fast as the disk reads
+                next_frame_at += frame_interval
+                time.sleep(max(0.0, next_frame_at - time.perf_counter()))
+
+        with self.condition:
+            stream.finished = True
+            self.condition.notify_all()
+
+    def _next_ready_streams(self):
+        # the streams that waited longest go first, so one busy gate can't starve the others. when more
+        # streams are ready than workers are free they're grouped, a group shares one encoder batch
+        free_workers = self.workers - self.busy_workers
+        ready = sorted((s for s in self.streams if s.pending is not None and not s.in_flight),
+                       key=lambda s: s.last_dispatch)
+        if free_workers <= 0 or not ready:
+            return []
+        group_size = min(MAX_STREAMS_PER_JOB, -(-len(ready) // free_workers))
+        return ready[:group_size]
+
+    def _dispatch_loop(self):
+        while True:
+            with self.condition:
+                streams = []
+                while not self.should_stop:
+                    streams = self._next_ready_streams()
+                    if streams:
+                        break
+                    self.condition.wait()
+                if self.should_stop:
+                    return
+                seqs, work_frames = zip(*(stream.pending for stream in streams))
+                sent_at = time.perf_counter()
+                for stream in streams:
+                    stream.pending, stream.in_flight, stream.last_dispatch = None, True, sent_at
+                self.busy_workers += 1
+
+            job = self.pool.submit(_recognize_in_worker, list(work_frames), self.tolerance,
+                                   [stream.tracker for stream in streams])
+            job.add_done_callback(lambda job, streams=streams, seqs=seqs, sent_at=sent_at:
+                                  self._job_finished(streams, seqs, sent_at, job))
+
+    def _job_finished(self, streams, seqs, sent_at, job):
+        try:
+            results, trackers, samples = job.result()
+        except Exception as e:  # a crashed worker only costs those frames
+            print(f"Recognition job failed on {', '.join(s.stream_id for s in streams)}: {e}")
+            results, trackers, samples = [([], [])] * len(streams), [None] * len(streams), []
+        recognition_metrics.replay(samples)
+        recognition_metrics.count("frames_processed", len(streams))
+        for face_boxes, _ in results:
+            recognition_metrics.faces_in_frame(len(face_boxes))
+
+        with self.condition:
+            finished_at = time.perf_counter()
+            for stream, seq, (face_boxes, matches), tracker in zip(streams, seqs, results, trackers):
+                stream.face_locations = face_boxes
+                stream.face_names = [face_op.label_for_match(m) for m in matches]
+                stream.result_seq = seq
+                stream.tracker = tracker or stream.tracker
+                stream.frames_processed += 1
+                stream.last_latency_ms = (finished_at - sent_at) * 1000
+                stream.result_times.append(finished_at)
+                stream.in_flight = False
+            self.busy_workers -= 1
+            self.condition.notify_all()
+
+        # one cache for every stream, a student seen at two gates is marked once
+        now = datetime.now()
+        for stream, seq, (face_boxes, matches) in zip(streams, seqs, results):
+            marked = []
+            for match in matches:
+                if match.roll_no is not None and marked_today.mark(match.roll_no, now):
+                    self.attendance_queue.push(match.roll_no, now)
+                    marked.append(match.roll_no)
+            recognition_events.matches_seen(stream.stream_id, matches, marked, now)
+            if self.on_result:
+                self.on_result(stream.stream_id, seq, face_boxes, matches)
+
+    def is_running(self):
+        with self.condition:
+            return not self.should_stop and not all(s.finished and s.pending is None and not s.in_flight for s in self.streams)
+
+    def stats(self):
+        with self.condition:
+            return [s.stats() for s in self.streams]
+
+    def annotated_frame(self, stream):
+        # copy of the newest frame with the newest results drawn on it, None before the first frame
+        with self.condition:
+            if stream.latest_frame is None:
+                return None
+            frame = stream.latest_frame.copy()
+            face_locations, face_names = stream.face_locations, stream.face_names
+        face_op.draw_recognition_results(frame, face_locations, face_names)
+        return frame
+
+    def stop(self):
+        with self.condition:
+            self.should_stop = True
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+        if self.attendance_queue is not None:
+            self.attendance_queue.stop()
+        for stream in self.streams:
+            stream.frame_source.release()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Recognize faces on several cameras / recordings at once.")
+    parser.add_argument("sources", nargs="+", help="camera indexes, video files or folders of images")
+    parser.add_argument("--db", default=db.DB_FILE, help="attendance db with the registered students")
+    parser.add_argument("--workers", type=int, default=0, help="recognition processes (0 = cores - 1)")
+    parser.add_argument("--scale", type=float, default=face_op.RECOGNITION_SCALE, help="downscale before detection")
+    parser.add_argument("--tolerance", type=float, default=0.6)
+    parser.add_argument("--backend", default=face_op.GALLERY_SEARCH_BACKEND, choices=["auto", "exact", "ivf"])
+    parser.add_argument("--detector", default=face_op.DETECTION_MODE, choices=DETECTION_MODES)
+    parser.add_argument("--metrics", help="write stage latencies / counters here at exit (.json or .csv)")
+    parser.add_argument("--metrics-port", type=int, help="serve prometheus text on 127.0.0.1:PORT/metrics")
+    parser.add_argument("--api-port", type=int, help="attendance queries + live events on 127.0.0.1:PORT, "
+                                                     "see attendance_api.py")
+    parser.add_argument("--show", action="store_true", help="one window per stream, q in any of them quits")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    db.DB_FILE = args.db
+    frame_sources = [open_frame_source(spec) for spec in args.sources]
+    for spec, frame_source in zip(args.sources, frame_sources):
+        if not frame_source.is_opened():
+            sys.exit(f"Could not open {spec}")
+
+    server = RecognitionServer(frame_sources, args.workers or None, args.scale, args.tolerance, args.backend,
+                               args.detector)
+    if not server.start():
+        sys.exit(1)
+    print(f"{len(server.streams)} streams, {server.workers} workers, {server.gallery_size} students")
+
+    metrics_server = serve_metrics(recognition_metrics, args.metrics_port) if args.metrics_port else None
+    api_server = None
+    if args.api_port:
+        from attendance_api import serve_attendance_api
+        api_server = serve_attendance_api(args.api_port)
+    next_stats_at = time.perf_counter() + STATS_INTERVAL_SECONDS
+    try:
+        while server.is_running():
+            if args.show:
+                # imshow has to stay on this thread
+                for stream in server.streams:
+                    frame = server.annotated_frame(stream)
+                    if frame is not None:
+                        cv2.imshow(f"{stream.stream_id} - Press Q to Exit", frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+            else:
+                time.sleep(0.1)
+            if time.perf_counter() >= next_stats_at:
+                next_stats_at += STATS_INTERVAL_SECONDS
+                for line in server.stats():
+                    print(json.dumps(line))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        if args.show:
+            cv2.destroyAllWindows()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        if api_server is not None:
+            api_server.shutdown()
+        if args.metrics:
+            recognition_metrics.export(args.metrics)
+
+    print(json.dumps({"streams": server.stats(), "attendance": server.attendance_queue.stats()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
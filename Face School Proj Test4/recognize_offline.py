@@ -0,0 +1,113 @@
+import argparse, json, sys, time
+import numpy as np
+import database_ops as db
+from frame_sources import open_frame_source, NullSink, WindowSink, JsonLinesResultWriter
+import face_operations as face_op
+from face_gallery import json_distance
+from face_tracker import IoUFaceTracker
+from face_detection import DETECTION_MODES
+from pipeline_metrics import recognition_metrics
+
+# headless recognition over a video file or a folder of frames, as fast as the pipeline goes
+# per-frame results go to a JSON lines file, an FPS / latency summary is printed at the end
+# attendance is not logged, this is for replays and benchmarks
+#
+#   python recognize_offline.py gate_recording.mp4 --out results.jsonl
+#   python recognize_offline.py frames/ --db attendance.db --summary summary.json
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Run face recognition over a recording without a camera.")
+    parser.add_argument("source", help="video file, folder of images, or a camera index")
+    parser.add_argument("--db", default=db.DB_FILE, help="attendance db with the registered students")
+    parser.add_argument("--out", help="write per-frame results here as JSON lines")
+    parser.add_argument("--summary", help="also write the summary here as JSON")
+    parser.add_argument("--scale", type=float, default=face_op.RECOGNITION_SCALE, help="downscale before detection")
+    parser.add_argument("--tolerance", type=float, default=0.6)
+    parser.add_argument("--backend", default=face_op.GALLERY_SEARCH_BACKEND, choices=["auto", "exact", "ivf"])
+    parser.add_argument("--max-frames", type=int, default=0, help="stop after this many frames (0 = all)")
+    parser.add_argument("--detector", default=face_op.DETECTION_MODE, choices=DETECTION_MODES)
+    parser.add_argument("--no-tracking", action="store_true", help="encode every face on every frame")
+    parser.add_argument("--metrics", help="write per stage latencies here (.json or .csv)")
+    parser.add_argument("--show", action="store_true", help="show annotated frames in a window")
+    return parser.parse_args(argv)
+
+
+def summarize(latencies_ms, faces_per_frame, wall_seconds):
+    latencies = np.asarray(latencies_ms) if latencies_ms else np.zeros(1)
+    frames = len(latencies_ms)
+    return {"frames": frames, "faces": int(sum(faces_per_frame)), "wall_seconds": round(wall_seconds, 3),
+            "fps": round(frames / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+            "latency_ms_mean": round(float(latencies.mean()), 3),
+            "latency_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+            "latency_ms_p95": round(float(np.percentile(latencies, 95)), 3),
+            "latency_ms_max": round(float(latencies.max()), 3)}
+
+
+def run_offline_recognition(frame_source, known_gallery, result_writer=None, frame_sink=None,
+                            scale=face_op.RECOGNITION_SCALE, tolerance=0.6, max_frames=0, tracker=None,
+                            detector=None):
+    frame_sink = frame_sink or NullSink()
+    latencies_ms, faces_per_frame = [], []
+    start = time.perf_counter()
+    while not max_frames or len(latencies_ms) < max_frames:
+        ret, frame = frame_source.read()
+        if not ret:
+            break
+        frame_start = time.perf_counter()
+        boxes, matches = face_op.recognize_faces_in_frame(frame, known_gallery, scale, tolerance, tracker, detector)
+        latency_ms = (time.perf_counter() - frame_start) * 1000
+        latencies_ms.append(latency_ms)
+        faces_per_frame.append(len(boxes))
+        recognition_metrics.observe("recognize", latency_ms)
+        recognition_metrics.count("frames_processed")
+        recognition_metrics.faces_in_frame(len(boxes))
+
+        if result_writer:
+            result_writer.write(len(latencies_ms) - 1, latency_ms, [
+                {"box": list(box), "roll_no": m.roll_no, "name": m.name, "distance": json_distance(m.distance, 4),
+                 "margin": json_distance(m.margin, 4)} for box, m in zip(boxes, matches)])
+        face_op.draw_recognition_results(frame, boxes, [face_op.label_for_match(m) for m in matches])
+        if not frame_sink.show(frame):
+            break
+    summary = summarize(latencies_ms, faces_per_frame, time.perf_counter() - start)
+    # encoder work vs faces on screen, without a tracker every face seen is an encoding
+    encodings = tracker.encodings_computed if tracker else summary["faces"]
+    wall_seconds = summary["wall_seconds"] or 1e-9
+    summary.update({"encodings": encodings, "faces_per_second": round(summary["faces"] / wall_seconds, 2),
+                    "encodings_per_second": round(encodings / wall_seconds, 2)})
+    return summary
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    db.DB_FILE = args.db
+    frame_source = open_frame_source(args.source)
+    if not frame_source.is_opened():
+        sys.exit(f"Could not open {args.source}")
+
+    known_gallery = face_op.load_recognition_gallery(args.backend)
+    result_writer = JsonLinesResultWriter(args.out) if args.out else None
+    frame_sink = WindowSink("Offline recognition - Press Q to Exit") if args.show else NullSink()
+    try:
+        tracker = None if args.no_tracking else IoUFaceTracker()
+        summary = run_offline_recognition(frame_source, known_gallery, result_writer, frame_sink, args.scale,
+                                          args.tolerance, args.max_frames, tracker,
+                                          face_op.detector_for_mode(args.detector, args.scale))
+    finally:
+        frame_source.release()
+        frame_sink.close()
+        if result_writer:
+            result_writer.close()
+
+    summary.update({"source": frame_source.name, "gallery_size": len(known_gallery)})
+    if args.metrics:
+        recognition_metrics.export(args.metrics)
+    print(json.dumps(summary, indent=2))
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
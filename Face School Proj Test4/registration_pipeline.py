@@ -0,0 +1,84 @@
+import atexit, os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import face_recognition
+import numpy as np
+
+# registration encoding on a process pool
+# capture already found the face box, so workers skip detection and only run the encoder on a
+# small crop around it. keep this module free of tkinter, the pool workers import it
+
+# image = clean BGR frame (nothing drawn on it), face_location = (top, right, bottom, left)
+CapturedFrame = namedtuple("CapturedFrame", ["image", "face_location"])
+
+TARGET_FACE_SIZE = 200  # px, dlib aligns faces to a 150x150 chip so bigger faces only cost time
+CROP_MARGIN = 0.5  # room around the box for the landmark model
+TRIM_FRACTION = 0.2  # share of frames furthest from the medoid left out of the average
+
+_encoding_pool = None
+
+
+def crop_face_for_encoding(image, face_location):
+    # BGR frame -> (RGB crop around the face, downscaled if the face is big, face box inside the crop)
+    top, right, bottom, left = face_location
+    height, width = image.shape[:2]
+    face_size = max(bottom - top, right - left, 1)
+    margin = int(face_size * CROP_MARGIN)
+    y0, y1 = max(0, top - margin), min(height, bottom + margin)
+    x0, x1 = max(0, left - margin), min(width, right + margin)
+    crop = image[y0:y1, x0:x1]
+    box = (top - y0, right - x0, bottom - y0, left - x0)
+
+    scale = TARGET_FACE_SIZE / face_size
+    if scale < 1.0:
+        crop = cv2.resize(crop, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        box = tuple(int(round(v * scale)) for v in box)
+    return cv2.cvtColor(crop, cv2.COLOR_BGR2RGB), box
+
+
+def encode_face_crop(rgb_crop, face_location):
+    # runs in a pool worker
+    encodings = face_recognition.face_encodings(rgb_crop, [face_location])
+    return encodings[0] if encodings else None
+
+
+def get_encoding_pool():
+    # one pool for the whole app run, workers load the dlib models once and stay warm
+    global _encoding_pool
+    if _encoding_pool is None:
+        workers = max(1, (os.cpu_count() or 2) - 1)  # leave a core for the gui
+        _encoding_pool = ProcessPoolExecutor(max_workers=workers)
+        atexit.register(_encoding_pool.shutdown, wait=False, cancel_futures=True)
+    return _encoding_pool
+
+
+def submit_encoding_jobs(captured_frames):
+    pool = get_encoding_pool()
+    return [pool.submit(encode_face_crop, *crop_face_for_encoding(f.image, f.face_location))
+            for f in captured_frames]
+
+
+def job_result(job):
+    try:
+        return job.result()
+    except Exception as e:  # a crashed worker only costs that frame
+        print(f"Encoding job failed: {e}")
+        return None
+
+
+def encode_captured_frames_serially(captured_frames):
+    # same work without the pool, for timing comparisons
+    return [encode_face_crop(*crop_face_for_encoding(f.image, f.face_location)) for f in captured_frames]
+
+
+def aggregate_encodings(encodings):
+    # trimmed mean around the medoid, a blink or a bad crop doesn't drag the average away
+    encodings = np.asarray(encodings, dtype=np.float64)
+    if len(encodings) < 3:
+        return encodings.mean(axis=0)
+    pairwise = np.linalg.norm(encodings[:, None, :] - encodings[None, :, :], axis=2)
+    medoid = encodings[np.argmin(pairwise.sum(axis=1))]
+    keep = max(2, int(round(len(encodings) * (1 - TRIM_FRACTION))))
+    closest = np.argsort(np.linalg.norm(encodings - medoid, axis=1))[:keep]
+    return encodings[closest].mean(axis=0)
@@ -0,0 +1,81 @@
+import threading, time
+from collections import namedtuple
+import numpy as np
+
+# per student running statistics, so a retrain folds a few new frames into what's stored instead of
+# replacing it with a fresh full capture
+#   sample_count  encodings that went into the stored mean (students.face_encoding is the mean)
+#   prototypes    a few stored samples that differ from each other (glasses / no glasses, haircut ...)
+# the mean weighs at most MAX_EFFECTIVE_COUNT old samples, past that older samples fade out and the
+# gallery follows the student as they grow up. plain numpy only, database_ops imports it
+
+INITIAL_SAMPLE_COUNT = 15  # weight of an encoding stored before stats existed, one registration's frames
+MAX_EFFECTIVE_COUNT = 60
+MAX_PROTOTYPES = 5
+PROTOTYPE_MIN_DISTANCE = 0.25  # a sample this close to a kept prototype isn't kept as another one
+RESTART_DISTANCE = 0.6  # retrain frames this far from everything stored replace it instead of averaging
+
+# live samples: only faces matched with a clear margin, a few per student per session, spaced out
+LIVE_MAX_DISTANCE = 0.4
+LIVE_MIN_MARGIN = 0.15
+LIVE_SAMPLES_PER_STUDENT = 3
+LIVE_SAMPLE_INTERVAL_SECONDS = 2.0
+
+EncodingStats = namedtuple("EncodingStats", ["sample_count", "mean", "prototypes"])
+
+
+def _add_prototypes(prototypes, encodings):
+    prototypes = list(prototypes)
+    for encoding in encodings:
+        if not prototypes or min(np.linalg.norm(encoding - p) for p in prototypes) >= PROTOTYPE_MIN_DISTANCE:
+            prototypes.append(encoding)
+    return np.array(prototypes[-MAX_PROTOTYPES:], dtype=np.float64).reshape(-1, len(encodings[0]))
+
+
+def stats_from_samples(encodings, mean=None):
+    # stats for a new registration, mean defaults to the plain average
+    encodings = np.asarray(encodings, dtype=np.float64).reshape(len(encodings), -1)
+    mean = encodings.mean(axis=0) if mean is None else np.asarray(mean, dtype=np.float64)
+    return EncodingStats(len(encodings), mean, _add_prototypes([], encodings))
+
+
+def fold_in(stats, encodings, restart_if_far=True):
+    # stats + new samples -> new EncodingStats, nothing old is needed beyond the stats themselves
+    encodings = np.asarray(encodings, dtype=np.float64).reshape(len(encodings), -1)
+    batch_mean = encodings.mean(axis=0)
+    if restart_if_far:
+        stored = np.vstack([stats.mean[None, :], stats.prototypes]) if len(stats.prototypes) else stats.mean[None, :]
+        if np.linalg.norm(stored - batch_mean, axis=1).min() > RESTART_DISTANCE:
+            return stats_from_samples(encodings)  # looks nothing like what's stored, the old data is stale
+    weight = min(stats.sample_count, MAX_EFFECTIVE_COUNT)
+    mean = (weight * stats.mean + encodings.sum(axis=0)) / (weight + len(encodings))
+    return EncodingStats(stats.sample_count + len(encodings), mean, _add_prototypes(stats.prototypes, encodings))
+
+
+class LiveSampleCollector:
+    # confident recognitions during attendance, folded into the students' stats when the session ends
+    def __init__(self, max_distance=LIVE_MAX_DISTANCE, min_margin=LIVE_MIN_MARGIN,
+                 per_student=LIVE_SAMPLES_PER_STUDENT, min_interval=LIVE_SAMPLE_INTERVAL_SECONDS):
+        self.max_distance, self.min_margin = max_distance, min_margin
+        self.per_student, self.min_interval = per_student, min_interval
+        self.samples, self.last_sample_at = {}, {}
+        self.lock = threading.Lock()
+
+    def offer(self, encodings, matches):
+        # encodings and the FaceMatch each one got, from the recognition worker
+        now = time.perf_counter()
+        with self.lock:
+            for encoding, match in zip(encodings, matches):
+                if match.roll_no is None or match.distance > self.max_distance or match.margin < self.min_margin:
+                    continue
+                samples = self.samples.setdefault(match.roll_no, [])
+                if len(samples) < self.per_student and \
+                        now - self.last_sample_at.get(match.roll_no, -self.min_interval) >= self.min_interval:
+                    samples.append(np.array(encoding, dtype=np.float64))
+                    self.last_sample_at[match.roll_no] = now
+
+    def take(self):
+        # {roll_no: [encodings]} collected so far, the collector starts over empty
+        with self.lock:
+            samples, self.samples, self.last_sample_at = self.samples, {}, {}
+        return samples
@@ -0,0 +1,53 @@
+import json, platform, threading, time
+from datetime import datetime
+
+# how long the app takes to get going, per launch, so slow kiosk PCs and regressions show up
+# milestones are ms since this module was imported (main_app imports it before anything heavy):
+#   window              main menu is on screen
+#   imports / models    cv2 + dlib + face_recognition imported / first inference done (background)
+#   gallery / camera    recognition gallery loaded / camera opened and warmed (background)
+#   attendance_clicked  first "Start Taking Attendance" click
+#   first_recognition   first frame recognized after that click
+# one json line per launch is appended to STARTUP_REPORT_PATH when the app closes
+
+STARTUP_REPORT_PATH = "startup_timing.jsonl"  # None turns the file off
+
+
+class StartupTiming:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.marks = {}
+        self.lock = threading.Lock()
+
+    def mark(self, name):
+        with self.lock:
+            self.marks[name] = round((time.perf_counter() - self.started_at) * 1000, 1)
+
+    def mark_once(self, name):
+        # only the first time counts, later clicks / sessions aren't startup anymore
+        with self.lock:
+            if name not in self.marks:
+                self.marks[name] = round((time.perf_counter() - self.started_at) * 1000, 1)
+
+    def report(self):
+        with self.lock:
+            marks = dict(self.marks)
+        report = {"recorded_at": datetime.now().isoformat(timespec="seconds"), "host": platform.node(),
+                  **{f"{name}_ms": ms for name, ms in marks.items()}}
+        if "attendance_clicked" in marks and "first_recognition" in marks:
+            report["click_to_first_recognition_ms"] = round(marks["first_recognition"] - marks["attendance_clicked"], 1)
+        return report
+
+    def save(self, path=STARTUP_REPORT_PATH):
+        report = self.report()
+        print(f"Startup timing: {json.dumps(report)}")
+        if path:
+            try:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(report) + "\n")
+            except OSError as e:
+                print(f"Couldn't write startup timing: {e}")
+        return report
+
+
+startup_timing = StartupTiming()
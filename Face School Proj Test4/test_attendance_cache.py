@@ -0,0 +1,33 @@
+from datetime import datetime
+import database_ops as db
+from attendance_cache import MarkedTodayCache
+
+MONDAY, TUESDAY = datetime(2025, 1, 6, 8, 30), datetime(2025, 1, 7, 8, 30)
+
+
+def test_warm_loads_who_is_already_marked(fresh_db):
+    db.log_attendance_batch([(1, "2025-01-06", "08:00:00"), (2, "2025-01-06", "08:05:00"),
+                             (3, "2025-01-05", "08:00:00")])
+    cache = MarkedTodayCache()
+    assert cache.warm(MONDAY) == 2
+    assert not cache.mark(1, MONDAY)
+    assert cache.mark(3, MONDAY)
+    assert not cache.mark(3, MONDAY)
+
+
+def test_date_rollover_starts_a_new_day(fresh_db):
+    cache = MarkedTodayCache()
+    assert cache.mark(1, MONDAY)
+    assert not cache.mark(1, MONDAY)
+    assert cache.mark(1, TUESDAY)  # reloaded for tuesday, monday's sightings don't carry over
+    assert cache.attendance_date == "2025-01-07" and len(cache) == 1
+
+
+def test_forget_lets_the_next_sighting_through(fresh_db):
+    cache = MarkedTodayCache()
+    cache.mark(1, MONDAY)
+    cache.mark(2, MONDAY)
+    cache.forget(1, "2025-01-06")
+    cache.forget(2, "2025-01-05")  # another day, nothing to forget
+    assert cache.mark(1, MONDAY)
+    assert not cache.mark(2, MONDAY)
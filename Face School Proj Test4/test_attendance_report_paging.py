@@ -0,0 +1,45 @@
+import sqlite3
+import database_ops as db
+
+
+def fill(path):
+    # dates logged out of order, several students on the same date so pages split inside a date
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO students(roll_no, name, face_encoding) VALUES (?, ?, ?)",
+                     [(i, f"Student {i}", b"") for i in range(1, 6)])
+    days = ["2025-01-08", "2025-01-06", "2025-01-09", "2025-01-07"]
+    conn.executemany(db.INSERT_ATTENDANCE_SQL, [(roll_no, day, f"08:{roll_no:02d}:00")
+                                                for day in days for roll_no in range(1, 6)])
+    conn.commit()
+    conn.close()
+
+
+def all_pages(page_size, **filters):
+    rows, cursor, pages = [], None, 0
+    while True:
+        page, cursor = db.fetch_attendance_report_page(cursor, page_size, **filters)
+        assert len(page) <= page_size
+        rows += page
+        pages += 1
+        if cursor is None:
+            return rows, pages
+
+
+def test_pages_add_up_to_the_full_report(fresh_db):
+    fill(fresh_db)
+    # newest date first, newest record first within a date (sort is stable, the full report is record_id DESC)
+    expected = sorted(db.fetch_full_attendance_report(), key=lambda row: row[2], reverse=True)
+    assert len(expected) == 20
+    for page_size in (1, 3, 5, 7, 20, 50):
+        rows, pages = all_pages(page_size)
+        assert rows == expected, page_size
+        assert pages == len(expected) // page_size + 1  # an exact fit ends on one empty page
+    assert list(db.iter_attendance_report(page_size=3)) == expected
+
+
+def test_filtered_pages(fresh_db):
+    fill(fresh_db)
+    rows, _ = all_pages(2, roll_no=3, date_from="2025-01-07")
+    assert [(row[0], row[2]) for row in rows] == [(3, "2025-01-09"), (3, "2025-01-08"), (3, "2025-01-07")]
+    rows, _ = all_pages(4, date_to="2025-01-06", name_prefix="Student 1")
+    assert [(row[0], row[2]) for row in rows] == [(1, "2025-01-06")]
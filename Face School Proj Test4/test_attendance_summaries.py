@@ -0,0 +1,120 @@
+import pickle, sqlite3
+import numpy as np
+import database_ops as db
+
+
+def log(rows):
+    # rows of (roll_no, "YYYY-MM-DD")
+    return db.log_attendance_batch([(roll_no, day, "08:30:00") for roll_no, day in rows])
+
+
+def baseline_db(path):
+    # the schema + pickled encodings the app shipped with (user_version 0), duplicate sightings included
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE students (roll_no INTEGER PRIMARY KEY, name TEXT NOT NULL, face_encoding array NOT NULL)")
+    conn.execute("""CREATE TABLE attendance_records (record_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    roll_no INTEGER NOT NULL, attendance_date TEXT NOT NULL, attendance_time TEXT NOT NULL,
+                    FOREIGN KEY (roll_no) REFERENCES students (roll_no) ON DELETE CASCADE)""")
+    for roll_no in (1, 2):
+        conn.execute("INSERT INTO students VALUES (?, ?, ?)",
+                     (roll_no, f"Student {roll_no}", pickle.dumps(np.full(128, roll_no / 10))))
+    conn.executemany("INSERT INTO attendance_records(roll_no, attendance_date, attendance_time) VALUES (?, ?, ?)",
+                     [(1, "2025-01-06", "08:30:00"), (1, "2025-01-06", "08:31:00"), (1, "2025-02-03", "08:30:00"),
+                      (2, "2025-01-06", "08:40:00")])
+    conn.commit()
+    conn.close()
+
+
+def summaries_from_records(conn):
+    daily = conn.execute("""SELECT attendance_date, COUNT(*) FROM attendance_records
+                            GROUP BY 1 ORDER BY 1""").fetchall()
+    monthly = conn.execute("""SELECT roll_no, substr(attendance_date, 1, 7), COUNT(*) FROM attendance_records
+                              GROUP BY 1, 2 ORDER BY 1, 2""").fetchall()
+    return daily, monthly
+
+
+def summary_tables(conn):
+    # rows that dropped to 0 are left in place by the triggers, they mean the same as no row
+    daily = conn.execute("SELECT attendance_date, present FROM attendance_daily WHERE present > 0 ORDER BY 1").fetchall()
+    monthly = conn.execute("""SELECT roll_no, month, days_present FROM attendance_monthly
+                              WHERE days_present > 0 ORDER BY 1, 2""").fetchall()
+    return daily, monthly
+
+
+def test_migrates_a_baseline_database(tmp_path, monkeypatch):
+    path = str(tmp_path / "attendance.db")
+    baseline_db(path)
+    monkeypatch.setattr(db, "DB_FILE", path)
+    db.setup_database_tables_if_needed()
+    try:
+        conn = db.get_connection_to_database()
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == db.SCHEMA_VERSION
+        students = db.load_all_registered_students_from_db()
+        assert [s["roll_no"] for s in students] == [1, 2]
+        assert np.allclose(students[1]["face_encoding"], 0.2, atol=1e-6)  # unpickled into the binary format
+        # one record per student per day, the earliest kept
+        assert conn.execute("SELECT roll_no, attendance_date, attendance_time FROM attendance_records "
+                            "ORDER BY record_id").fetchall() == \
+            [(1, "2025-01-06", "08:30:00"), (1, "2025-02-03", "08:30:00"), (2, "2025-01-06", "08:40:00")]
+        # summaries backfilled from what was already logged
+        assert summary_tables(conn) == summaries_from_records(conn)
+        assert summary_tables(conn)[0] == [("2025-01-06", 2), ("2025-02-03", 1)]
+        # the change feed picks up edits from now on
+        before = db.fetch_student_change_range()[1] or 0
+        db.update_face_data_for_student(2, np.full(128, 0.3))
+        assert db.fetch_student_changes(before, db.fetch_student_change_range()[1])[0][0] == 2
+        # running setup again is a no-op
+        db.setup_database_tables_if_needed()
+        assert summary_tables(conn) == summaries_from_records(conn)
+        db.release_connection(conn)
+    finally:
+        db.close_thread_connections()
+
+
+def test_summary_tables_follow_the_records(fresh_db):
+    assert log([(1, "2025-01-06"), (2, "2025-01-06"), (1, "2025-01-07"), (3, "2025-02-03")]) == 4
+    assert log([(1, "2025-01-06")]) == 0  # already marked, the summaries must not count it again
+    conn = sqlite3.connect(fresh_db)
+    assert summary_tables(conn) == summaries_from_records(conn)
+    assert summary_tables(conn)[0] == [("2025-01-06", 2), ("2025-01-07", 1), ("2025-02-03", 1)]
+
+    conn.execute("DELETE FROM attendance_records WHERE roll_no = 1 AND attendance_date = '2025-01-06'")
+    conn.execute("UPDATE attendance_records SET attendance_date = '2025-03-03' WHERE roll_no = 3")
+    conn.execute("UPDATE attendance_records SET roll_no = 4 WHERE roll_no = 2")
+    conn.commit()
+    assert summary_tables(conn) == summaries_from_records(conn)
+    assert summary_tables(conn)[1] == [(1, "2025-01", 1), (3, "2025-03", 1), (4, "2025-01", 1)]
+
+    conn.execute("DELETE FROM attendance_records")
+    conn.commit()
+    assert summary_tables(conn) == ([], [])
+    conn.close()
+    assert db.fetch_daily_present_counts() == []
+    assert db.fetch_days_present_per_student() == {}
+
+
+def test_days_present_without_a_student_filter(fresh_db):
+    log([(1, "2025-01-20"), (1, "2025-02-03"), (2, "2025-02-03"), (2, "2025-02-04"), (3, "2025-03-31")])
+    assert db.fetch_days_present_per_student() == {1: 2, 2: 2, 3: 1}
+    assert db.fetch_days_present_per_student("2025-02-01", "2025-02-28") == {1: 1, 2: 2}
+    assert db.fetch_days_present_per_student("2025-01-25", "2025-03-30") == {1: 1, 2: 2}
+    assert db.fetch_days_present_per_student("2025-02-04", "2025-02-04") == {2: 1}
+    assert db.fetch_daily_present_counts("2025-02-01", "2025-02-28") == [("2025-02-03", 2), ("2025-02-04", 1)]
+    assert db.fetch_monthly_attendance(2) == [("2025-02", 2)]
+
+
+def test_days_present_filtered_by_student_and_range(fresh_db):
+    # student 1: 2 days in january, 3 in february, 1 in march. student 2 is there to be filtered out
+    log([(1, "2025-01-20"), (1, "2025-01-21"), (1, "2025-02-03"), (1, "2025-02-04"), (1, "2025-02-05"),
+         (1, "2025-03-10"), (2, "2025-01-20"), (2, "2025-02-03"), (2, "2025-03-10")])
+
+    assert db.fetch_days_present_per_student(roll_no=1) == {1: 6}
+    # whole months only
+    assert db.fetch_days_present_per_student("2025-02-01", "2025-03-31", roll_no=1) == {1: 4}
+    # partial edge days only
+    assert db.fetch_days_present_per_student("2025-01-21", "2025-01-31", roll_no=1) == {1: 1}
+    # edges on both sides of a whole month
+    assert db.fetch_days_present_per_student("2025-01-21", "2025-03-15", roll_no=1) == {1: 5}
+    # open ends
+    assert db.fetch_days_present_per_student("2025-02-04", None, roll_no=1) == {1: 3}
+    assert db.fetch_days_present_per_student(None, "2025-02-28", roll_no=2) == {2: 2}
@@ -0,0 +1,58 @@
+import sqlite3
+from datetime import datetime, timedelta
+import attendance_writer
+import database_ops as db
+from attendance_cache import MarkedTodayCache
+from attendance_writer import AttendanceWriteQueue
+
+
+def records(path):
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT roll_no, attendance_date FROM attendance_records ORDER BY roll_no").fetchall()
+    conn.close()
+    return rows
+
+
+def test_stop_writes_everything_pushed_before_it(fresh_db):
+    writer = AttendanceWriteQueue(max_batch_size=7, flush_interval=5.0, marked_cache=MarkedTodayCache()).start()
+    for roll_no in range(50):
+        writer.push(roll_no, datetime(2025, 1, 6, 8, 30))
+    writer.push(3, datetime(2025, 1, 6, 8, 45))  # already marked, not counted twice
+    writer.stop()
+
+    assert records(fresh_db) == [(roll_no, "2025-01-06") for roll_no in range(50)]
+    stats = writer.stats()
+    assert (stats["pushed"], stats["written"], stats["already_marked"], stats["dropped"]) == (51, 50, 1, 0)
+    assert stats["queue_depth"] == 0
+
+
+def test_failed_write_is_retried(fresh_db, monkeypatch):
+    monkeypatch.setattr(attendance_writer, "RETRY_DELAY_SECONDS", 0)
+    real_log, calls = db.log_attendance_batch, []
+
+    def flaky_log(rows):
+        calls.append(list(rows))
+        return None if len(calls) == 1 else real_log(rows)  # db locked the first time
+
+    monkeypatch.setattr(db, "log_attendance_batch", flaky_log)
+    writer = AttendanceWriteQueue(marked_cache=MarkedTodayCache()).start()
+    writer.push(1, datetime(2025, 1, 6, 8, 30))
+    writer.stop()
+
+    assert len(calls) == 2 and calls[0] == calls[1]
+    assert records(fresh_db) == [(1, "2025-01-06")]
+    assert writer.stats()["written"] == 1
+
+
+def test_batch_given_up_on_is_forgotten_by_the_cache(fresh_db, monkeypatch):
+    monkeypatch.setattr(attendance_writer, "RETRY_DELAY_SECONDS", 0)
+    monkeypatch.setattr(db, "log_attendance_batch", lambda rows: None)
+    cache, today = MarkedTodayCache(), datetime.now()
+    assert cache.mark(1, today)
+    writer = AttendanceWriteQueue(marked_cache=cache).start()
+    writer.push(1, today)
+    writer.push(2, today - timedelta(days=1))
+    writer.stop()
+
+    assert writer.stats()["dropped"] == 2
+    assert cache.mark(1, today)  # the next sighting tries again
@@ -0,0 +1,101 @@
+import sqlite3
+import numpy as np
+import pytest
+import database_ops as db
+
+
+@pytest.fixture(autouse=True)
+def use_sidecar(monkeypatch):
+    monkeypatch.setattr(db, "USE_ENCODING_SIDECAR", True)
+
+
+def encoding(value):
+    return np.full(db.ENCODING_SIZE, value, dtype=np.float64)
+
+
+def sidecar_students():
+    info, encodings, _ = db.load_student_encodings_from_sidecar()
+    return {row["roll_no"]: (row["name"], float(encodings[i][0])) for i, row in enumerate(info)}
+
+
+def test_sidecar_follows_edits_made_through_database_ops(fresh_db):
+    db.save_new_student_to_db(1, "Asha", encoding(0.1))
+    db.save_new_student_to_db(2, "Ben", encoding(0.2))
+    assert sidecar_students() == {1: ("Asha", pytest.approx(0.1)), 2: ("Ben", pytest.approx(0.2))}
+    db.update_face_data_for_student(2, encoding(0.3))
+    db.delete_student_from_db(1)
+    assert sidecar_students() == {2: ("Ben", pytest.approx(0.3))}
+
+
+def test_sidecar_rebuilt_after_an_outside_update(fresh_db):
+    db.save_new_student_to_db(1, "Asha", encoding(0.1))
+    db.save_new_student_to_db(2, "Ben", encoding(0.2))
+    sidecar_students()  # built and stamped
+
+    # another tool edits the db directly: same row count, new name and encoding
+    conn = sqlite3.connect(fresh_db)
+    conn.execute("UPDATE students SET name = 'Benjamin', face_encoding = ? WHERE roll_no = 2",
+                 (db.adapt_array(encoding(0.5)),))
+    conn.commit()
+    conn.close()
+
+    assert sidecar_students()[2] == ("Benjamin", pytest.approx(0.5))
+
+
+def test_in_place_update_doesnt_hide_an_outside_edit(fresh_db):
+    db.save_new_student_to_db(1, "Asha", encoding(0.1))
+    db.save_new_student_to_db(2, "Ben", encoding(0.2))
+    sidecar_students()
+
+    conn = sqlite3.connect(fresh_db)
+    conn.execute("UPDATE students SET name = 'Benjamin' WHERE roll_no = 2")
+    conn.commit()
+    conn.close()
+    db.update_face_data_for_student(1, encoding(0.4))  # must not stamp the store as current
+
+    assert sidecar_students() == {1: ("Asha", pytest.approx(0.4)), 2: ("Benjamin", pytest.approx(0.2))}
+
+
+def test_gallery_change_id_matches_what_it_was_loaded_from(fresh_db):
+    from face_gallery import FaceGallery
+    from gallery_sync import GalleryWatcher
+    db.save_new_student_to_db(1, "Asha", encoding(0.1))
+    sidecar_students()
+    conn = sqlite3.connect(fresh_db)
+    conn.execute("UPDATE students SET name = 'Asha K' WHERE roll_no = 1")
+    conn.commit()
+
+    gallery = FaceGallery.load_from_db()  # stale sidecar: rebuilt, stamped with the current feed id
+    assert gallery.student_info[0]["name"] == "Asha K"
+    assert gallery.change_id == db.fetch_student_change_range()[1]
+
+    conn.execute("UPDATE students SET name = 'Asha Kumar' WHERE roll_no = 1")
+    conn.commit()
+    conn.close()
+    watcher = GalleryWatcher(gallery, FaceGallery.load_from_db)
+    assert watcher.poll()
+    assert watcher.gallery.student_info[0]["name"] == "Asha Kumar"
+
+
+def test_replacing_students_in_bulk_drops_their_running_stats(fresh_db):
+    db.save_new_student_to_db(1, "Asha", encoding(0.1), sample_encodings=[encoding(0.1)] * 4)
+    db.save_new_student_to_db(2, "Ben", encoding(0.2), sample_encodings=[encoding(0.2)] * 4)
+    assert db.save_students_batch([(1, "Asha", encoding(0.7))], replace_existing=True) == 1
+
+    conn = sqlite3.connect(fresh_db)
+    kept = [row[0] for row in conn.execute("SELECT roll_no FROM student_encoding_stats ORDER BY roll_no")]
+    conn.close()
+    assert kept == [2]
+
+
+def test_rebuild_after_a_discard_leaves_mapped_generations_alone(fresh_db):
+    db.save_new_student_to_db(1, "Asha", encoding(0.1))
+    db.save_new_student_to_db(2, "Ben", encoding(0.2))
+    db.save_new_student_to_db(3, "Chen", encoding(0.3))
+    info, encodings, _ = db.load_student_encodings_from_sidecar()  # a running recognizer's snapshot
+
+    assert db.delete_students_from_db([1, 2]) == 2  # discards the sidecar
+    assert sidecar_students() == {3: ("Chen", pytest.approx(0.3))}
+
+    assert [row["roll_no"] for row in info] == [1, 2, 3]
+    assert encodings[:, 0].tolist() == pytest.approx([0.1, 0.2, 0.3])
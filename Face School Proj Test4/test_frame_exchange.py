@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from frame_exchange import FrameRing
+
+
+class CountingSource:
+    # frame n is filled with n, decoded into the buffer it's handed like a camera source
+    def __init__(self, frames=1000):
+        self.n, self.frames = 0, frames
+
+    def read(self, frame=None):
+        if self.n == self.frames:
+            return False, None
+        if frame is None:
+            frame = np.empty((4, 4, 3), dtype=np.uint8)
+        frame[:] = self.n
+        self.n += 1
+        return True, frame
+
+
+def test_pinned_frame_is_not_overwritten_until_released():
+    ring, source = FrameRing(slots=3), CountingSource()
+    ring.capture_from(source)
+    pinned = ring.acquire()
+    assert pinned.seq == 0
+
+    for _ in range(10):  # the other two slots take turns
+        ring.capture_from(source)
+    again = ring.acquire(0)
+    assert again.slot == pinned.slot
+    ring.release(again)
+    assert (pinned.image == 0).all()
+
+    ring.release(pinned)
+    for _ in range(2):
+        ring.capture_from(source)
+    assert ring.acquire(0) is None
+    assert not (pinned.image == 0).all()  # buffer reused
+
+
+def test_every_slot_pinned_is_an_error():
+    ring, source = FrameRing(slots=2), CountingSource()
+    ring.capture_from(source)
+    first = ring.acquire()
+    ring.capture_from(source)
+    ring.acquire()
+    with pytest.raises(RuntimeError):
+        ring.capture_from(source)
+    ring.release(first)
+    assert ring.capture_from(source) == 2
+
+
+def test_acquire_newer_and_close():
+    ring, source = FrameRing(), CountingSource(frames=2)
+    assert ring.capture_from(source) == 0
+    assert ring.capture_from(source) == 1
+    assert ring.capture_from(source) is None  # source ran out
+    newest = ring.acquire_newer(0)
+    assert newest.seq == 1 and (newest.image == 1).all()
+    ring.close()
+    assert ring.acquire_newer(1) is None